@@ -1,8 +1,10 @@
 """Agent package - Orchestrator and specialist agents"""
 from .orchestrator import OrchestratorAgent
 from .incident_agent import IncidentAgent
+from .monitoring_agent import MonitoringAgent
 
 __all__ = [
     'OrchestratorAgent',
     'IncidentAgent',
+    'MonitoringAgent',
 ]
@@ -1,6 +1,19 @@
 """Incident Response Agent - Analyzes and resolves incidents"""
-from typing import Dict, Any, Optional
-from tools import analyze_cloudwatch_metrics, query_client_inventory, execute_remediation_action
+import asyncio
+import time
+from typing import Dict, Any, AsyncIterator, Optional, Callable, List, Tuple
+from config import config
+from tools import (
+    analyze_cloudwatch_metrics,
+    analyze_cloudwatch_metrics_batch,
+    query_client_inventory,
+    execute_remediation_action,
+)
+from bedrock.bedrock_model import estimate_tokens
+from bedrock.streaming import model_stream
+from .keyword_router import keyword_router
+from .prompt_budget import PromptBudget, rank_metrics, top_instances, metric_line, instance_line
+from .root_cause_batcher import RootCauseBatcher
 
 class IncidentAgent:
     """
@@ -8,22 +21,41 @@ class IncidentAgent:
     Analyzes root causes, proposes fixes, and executes approved remediations.
     """
     
-    def __init__(self, model, tools: Optional[Dict] = None):
+    def __init__(
+        self,
+        model,
+        tools: Optional[Dict] = None,
+        tool_concurrency: Optional[int] = None,
+        tool_timeout: Optional[float] = None,
+        prompt_token_budget: Optional[int] = None,
+        analysis_max_tokens: Optional[int] = None
+    ):
         """
         Initialize the incident agent
         
         Args:
             model: Bedrock model instance
             tools: Optional tool registry
+            tool_concurrency: Max tool calls in flight while gathering context (defaults to config)
+            tool_timeout: Per-tool timeout in seconds (defaults to config)
+            prompt_token_budget: Estimated input tokens a root cause prompt may use (defaults to config)
+            analysis_max_tokens: Output token limit for root cause analysis (defaults to config)
         """
         self.model = model
         self.tools = tools or {}
+        self.tool_concurrency = tool_concurrency or config.INCIDENT_TOOL_CONCURRENCY
+        self.tool_timeout = tool_timeout if tool_timeout is not None else config.INCIDENT_TOOL_TIMEOUT
+        self.prompt_token_budget = prompt_token_budget or config.INCIDENT_PROMPT_TOKEN_BUDGET
+        self.prompt_top_instances = config.INCIDENT_PROMPT_TOP_INSTANCES
+        self.analysis_max_tokens = analysis_max_tokens or config.INCIDENT_ANALYSIS_MAX_TOKENS
+        self.batcher = RootCauseBatcher(model)
         self._register_tools()
     
     def _register_tools(self):
         """Register available tools for incident response"""
         self.tools = {
             "analyze_cloudwatch_metrics": analyze_cloudwatch_metrics,
+            "analyze_cloudwatch_metrics_batch": analyze_cloudwatch_metrics_batch,
             "query_client_inventory": query_client_inventory,
             "execute_remediation_action": execute_remediation_action,
         }
@@ -60,7 +92,8 @@ class IncidentAgent:
         # Step 2: Analyze root cause using model
         root_cause_analysis = await self._analyze_root_cause(
             incident_context=incident_context,
-            prompt=prompt
+            prompt=prompt,
+            use_cache=(context or {}).get("use_cache", True)
         )
         
         # Step 3: Propose remediation actions
@@ -70,6 +103,122 @@ class IncidentAgent:
         )
         
         # Step 4: Return comprehensive response
+        return self._build_response(
+            incident_id=incident_id,
+            client_id=client_id,
+            incident_context=incident_context,
+            root_cause_analysis=root_cause_analysis,
+            remediation_plan=remediation_plan
+        )
+    
+    async def invoke_stream(
+        self,
+        prompt: str,
+        incident_id: Optional[str] = None,
+        client_id: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process an incident response request, emitting events as each stage finishes
+        
+        Args:
+            prompt: User's request or incident description
+            incident_id: Optional incident ID for context
+            client_id: MSP client identifier
+            context: Additional context
+        
+        Yields:
+            {"type": "tool", ...} as each context tool starts and completes
+            {"type": "token", "content": str} for tool summaries, root-cause
+                tokens streamed from the model, and the remediation plan
+            {"type": "incident_result", "data": dict} last, with the same
+                payload invoke() returns
+        """
+        if not client_id:
+            client_id = "demo-client-001"
+        
+        # Step 1: Gather incident context, reporting each tool as it returns
+        incident_context = self._new_context(incident_id, client_id)
+        semaphore = asyncio.Semaphore(self.tool_concurrency)
+        calls = self._context_tool_calls(client_id, prompt)
+        
+        for tool_name, _ in calls:
+            yield {"type": "tool", "tool_name": tool_name, "status": "running"}
+        
+        async def run(tool_name: str, kwargs: Dict[str, Any]):
+            return tool_name, await self._run_tool(semaphore, tool_name, **kwargs)
+        
+        tasks = [asyncio.ensure_future(run(tool_name, kwargs)) for tool_name, kwargs in calls]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                tool_name, (result, record) = await finished
+                self._record_tool_result(incident_context, tool_name, result, record)
+                summary = self._summarize_tool_result(tool_name, result, record)
+                yield {
+                    "type": "tool",
+                    "tool_name": tool_name,
+                    "status": record["status"],
+                    "latency_ms": record["latency_ms"],
+                    "summary": summary
+                }
+                yield {"type": "token", "content": f"📊 {summary}\n"}
+        finally:
+            # The consumer may stop early (e.g. WebSocket disconnect); don't leave tools running
+            for task in tasks:
+                task.cancel()
+        
+        # Step 2: Stream root cause analysis straight from the model
+        system_prompt, analysis_prompt, evidence, budget = self._build_root_cause_prompt(incident_context, prompt)
+        yield {"type": "token", "content": "\n**Root Cause Analysis:**\n"}
+        
+        analysis_tokens = []
+        usage: Dict[str, Any] = {}
+        fallback = None
+        async for event in model_stream(self.model, analysis_prompt, system_prompt, self.analysis_max_tokens):
+            if event.get("type") == "token":
+                analysis_tokens.append(event.get("content", ""))
+                yield event
+            elif event.get("type") in ("tool_use_start", "fallback"):
+                yield event
+            elif event.get("type") == "complete":
+                usage = event.get("usage", {})
+                fallback = event.get("fallback")
+        
+        root_cause_analysis = {
+            "analysis": "".join(analysis_tokens) or "Unable to analyze",
+            "confidence": 0.85,
+            "evidence": evidence,
+            "model_used": getattr(self.model, "model_id", None),
+            "usage": {**usage, "budget": budget}
+        }
+        if fallback:
+            root_cause_analysis["fallback"] = fallback
+        
+        # Step 3: Remediation plan
+        remediation_plan = self._propose_remediation(
+            root_cause=root_cause_analysis,
+            incident_context=incident_context
+        )
+        response = self._build_response(
+            incident_id=incident_id,
+            client_id=client_id,
+            incident_context=incident_context,
+            root_cause_analysis=root_cause_analysis,
+            remediation_plan=remediation_plan
+        )
+        yield {"type": "token", "content": "\n\n" + self.format_remediation_plan(response)}
+        
+        yield {"type": "incident_result", "data": response}
+    
+    def _build_response(
+        self,
+        incident_id: Optional[str],
+        client_id: str,
+        incident_context: Dict[str, Any],
+        root_cause_analysis: Dict[str, Any],
+        remediation_plan: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Assemble the incident response payload"""
         return {
             "status": "analyzed",
             "incident_id": incident_id or f"INC-{self._generate_id()}",
@@ -78,7 +227,7 @@ class IncidentAgent:
             "remediation_plan": remediation_plan,
             "incident_context": incident_context,
             "requires_approval": remediation_plan.get("risk") in ["medium", "high"],
-            "tools_used": list(incident_context.get("tools_invoked", [])),
+            "tools_used": [call["tool"] for call in incident_context.get("tools_invoked", [])],
             "confidence": root_cause_analysis.get("confidence", 0.85),
             "estimated_resolution_time": remediation_plan.get("estimated_time", "15 minutes")
         }
@@ -90,100 +239,251 @@ class IncidentAgent:
         prompt: str
     ) -> Dict[str, Any]:
         """Gather context about the incident from various sources"""
-        context = {
+        context = self._new_context(incident_id, client_id)
+        
+        # Fan out inventory and the batched metric query concurrently
+        semaphore = asyncio.Semaphore(self.tool_concurrency)
+        calls = self._context_tool_calls(client_id, prompt)
+        results = await asyncio.gather(*[
+            self._run_tool(semaphore, tool_name, **kwargs) for tool_name, kwargs in calls
+        ])
+        
+        for (tool_name, _), (result, record) in zip(calls, results):
+            self._record_tool_result(context, tool_name, result, record)
+        
+        return context
+    
+    def _new_context(self, incident_id: Optional[str], client_id: str) -> Dict[str, Any]:
+        return {
             "incident_id": incident_id,
             "client_id": client_id,
+            "inventory": {},
+            "metrics": [],
             "tools_invoked": []
         }
-        
-        # Check if prompt mentions specific metrics or systems
-        prompt_lower = prompt.lower()
-        
-        # Query inventory
-        inventory = query_client_inventory(client_id)
-        context["inventory"] = inventory
-        context["tools_invoked"].append("query_client_inventory")
-        
-        # Analyze relevant metrics
-        metrics_to_check = []
-        if any(word in prompt_lower for word in ["cpu", "processor", "high load"]):
-            metrics_to_check.append("CPUUtilization")
-        if any(word in prompt_lower for word in ["memory", "ram", "oom"]):
-            metrics_to_check.append("MemoryUtilization")
-        if any(word in prompt_lower for word in ["network", "bandwidth", "latency"]):
-            metrics_to_check.append("NetworkIn")
-        if any(word in prompt_lower for word in ["disk", "storage", "io"]):
-            metrics_to_check.append("DiskReadOps")
+    
+    def _context_tool_calls(self, client_id: str, prompt: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Decide which tools to call (and with what arguments) for an incident"""
+        # Metrics the prompt mentions, in one pass of the compiled router
+        metrics_to_check = list(keyword_router.match(prompt)["metric"])
         
         # Default to checking all critical metrics if none specified
         if not metrics_to_check:
             metrics_to_check = ["CPUUtilization", "MemoryUtilization"]
         
-        metrics_data = []
-        for metric_name in metrics_to_check:
-            metric_result = analyze_cloudwatch_metrics(
-                client_id=client_id,
-                metric_name=metric_name,
-                time_range="1h"
+        return [
+            ("query_client_inventory", {"client_id": client_id}),
+            ("analyze_cloudwatch_metrics_batch", {
+                "client_ids": [client_id],
+                "metric_names": metrics_to_check,
+                "time_range": "1h"
+            }),
+        ]
+    
+    def _record_tool_result(
+        self,
+        context: Dict[str, Any],
+        tool_name: str,
+        result: Optional[Dict[str, Any]],
+        record: Dict[str, Any]
+    ):
+        """Merge one tool result into the incident context"""
+        context["tools_invoked"].append(record)
+        if result is None:
+            return
+        
+        if tool_name == "query_client_inventory":
+            context["inventory"] = result
+        elif tool_name == "analyze_cloudwatch_metrics_batch":
+            context["metrics"] = result.get(context["client_id"], [])
+    
+    def _summarize_tool_result(
+        self,
+        tool_name: str,
+        result: Optional[Dict[str, Any]],
+        record: Dict[str, Any]
+    ) -> str:
+        """One-line human readable summary of a tool result"""
+        if result is None or record["status"] not in ("success", "partial"):
+            return f"{tool_name}: {record['status']} after {record['latency_ms']} ms"
+        
+        if tool_name == "query_client_inventory":
+            return (
+                f"Inventory: {result.get('total_instances', 0)} instances "
+                f"({result.get('running_instances', 0)} running)"
             )
-            metrics_data.append(metric_result)
-            context["tools_invoked"].append("analyze_cloudwatch_metrics")
         
-        context["metrics"] = metrics_data
+        if tool_name == "analyze_cloudwatch_metrics_batch":
+            metrics = [metric for entries in result.values() for metric in entries]
+            parts = [
+                f"{metric['metric_name']} {metric['current_value']} ({metric['severity']})"
+                for metric in metrics
+                if "error" not in metric
+            ]
+            summary = "Metrics: " + (", ".join(parts) if parts else "no data")
+            if len(parts) < len(metrics):
+                summary += f" ({len(metrics) - len(parts)} unavailable)"
+            return summary
         
-        return context
+        return f"{tool_name}: {record['status']}"
     
-    async def _analyze_root_cause(
+    @staticmethod
+    def _result_status(tool_name: str, result: Dict[str, Any]) -> str:
+        """
+        Outcome of a completed tool call, judged by that tool's result shape
+        
+        Returns:
+            "success", "partial" (some entries failed) or "error"
+        """
+        if tool_name == "analyze_cloudwatch_metrics_batch":
+            # Keyed by client id; failures sit on the per-metric entries
+            metrics = [metric for entries in result.values() for metric in entries]
+            failed = sum(1 for metric in metrics if "error" in metric)
+            if metrics and failed == len(metrics):
+                return "error"
+            return "partial" if failed else "success"
+        
+        return "error" if "error" in result else "success"
+    
+    async def _run_tool(
         self,
-        incident_context: Dict[str, Any],
-        prompt: str
-    ) -> Dict[str, Any]:
-        """Use Bedrock model to analyze root cause"""
+        semaphore: asyncio.Semaphore,
+        tool_name: str,
+        **kwargs
+    ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Run a blocking tool off the event loop with a concurrency limit and timeout
+        
+        Returns:
+            (tool result or None if it failed/timed out, invocation record with latency)
+        """
+        tool: Callable = self.tools[tool_name]
+        record = {"tool": tool_name, "arguments": kwargs}
         
-        # Build context for model
-        metrics_summary = []
-        for metric in incident_context.get("metrics", []):
-            if metric.get("anomaly_detected"):
-                metrics_summary.append(
-                    f"- {metric['metric_name']}: {metric['current_value']} "
-                    f"(avg: {metric['average']}, severity: {metric['severity']})"
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(
+                    asyncio.to_thread(tool, **kwargs),
+                    timeout=self.tool_timeout
                 )
+                record["status"] = self._result_status(tool_name, result)
+            except asyncio.TimeoutError:
+                result = None
+                record["status"] = "timeout"
+            except Exception as e:
+                result = None
+                record["status"] = "error"
+                record["error"] = str(e)
+            record["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
         
-        inventory_summary = incident_context.get("inventory", {})
+        return result, record
+    
+    def _build_root_cause_prompt(
+        self,
+        incident_context: Dict[str, Any],
+        prompt: str
+    ) -> Tuple[str, str, List[str], Dict[str, Any]]:
+        """
+        Build the root cause prompts within the prompt token budget
+        
+        Evidence is admitted by priority until the budget runs out:
+        anomalous metrics, then the top instances of the fleet, then the
+        remaining metrics. Anything left out is summarized as a count.
         
+        Returns:
+            (system prompt, analysis prompt, evidence lines, budget report)
+        """
         system_prompt = """You are an expert incident response agent for IT infrastructure.
 Analyze the provided metrics and context to determine the root cause of issues.
 Be concise, specific, and provide actionable insights."""
         
-        analysis_prompt = f"""Incident Analysis Request:
-{prompt}
-
-System Context:
-- Total instances: {inventory_summary.get('total_instances', 'unknown')}
-- Running instances: {inventory_summary.get('running_instances', 'unknown')}
-
-Metrics Anomalies Detected:
-{chr(10).join(metrics_summary) if metrics_summary else 'No critical anomalies'}
-
-Based on this data, provide:
+        instructions = """Based on this data, provide:
 1. Most likely root cause
 2. Confidence level (0-1)
 3. Supporting evidence
 4. Potential impact if not resolved"""
         
-        # Invoke model
-        response = self.model.invoke(
+        inventory_summary = incident_context.get("inventory", {})
+        context_lines = (
+            f"- Total instances: {inventory_summary.get('total_instances', 'unknown')}\n"
+            f"- Running instances: {inventory_summary.get('running_instances', 'unknown')}"
+        )
+        
+        budget = PromptBudget(self.prompt_token_budget)
+        budget.reserve(
+            system_prompt, instructions, context_lines,
+            "Incident Analysis Request:", "System Context:", "Metrics Anomalies Detected:",
+            "Other Metrics:", "Instances (0000 of 000000):"
+        )
+        # Leave the request at most a quarter of the budget; evidence needs the rest
+        request = budget.truncate(prompt, self.prompt_token_budget // 4)
+        
+        ranked = rank_metrics(incident_context.get("metrics", []))
+        anomalies = [metric_line(metric) for metric in ranked if metric.get("anomaly_detected")]
+        normal = [metric_line(metric) for metric in ranked if not metric.get("anomaly_detected")]
+        instances = inventory_summary.get("instances") or []
+        
+        metrics_summary = budget.take("anomalies", anomalies)
+        instance_lines = budget.take(
+            "instances",
+            [instance_line(instance) for instance in top_instances(instances, self.prompt_top_instances)],
+            total=len(instances)
+        )
+        normal_lines = budget.take("metrics", normal)
+        
+        sections = [
+            f"Incident Analysis Request:\n{request}",
+            f"System Context:\n{context_lines}",
+            "Metrics Anomalies Detected:\n"
+            + ("\n".join(metrics_summary) if metrics_summary else "No critical anomalies")
+        ]
+        if normal_lines:
+            sections.append("Other Metrics:\n" + "\n".join(normal_lines))
+        if instance_lines:
+            shown = budget.sections["instances"]["included"]
+            sections.append(f"Instances ({shown} of {len(instances)}):\n" + "\n".join(instance_lines))
+        sections.append(instructions)
+        analysis_prompt = "\n\n".join(sections)
+        
+        report = budget.report(
+            prompt_tokens=estimate_tokens(system_prompt) + estimate_tokens(analysis_prompt),
+            max_output_tokens=self.analysis_max_tokens
+        )
+        evidence = metrics_summary[:budget.sections["anomalies"]["included"]]
+        return system_prompt, analysis_prompt, evidence, report
+    
+    async def _analyze_root_cause(
+        self,
+        incident_context: Dict[str, Any],
+        prompt: str,
+        use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """Use Bedrock model to analyze root cause"""
+        system_prompt, analysis_prompt, metrics_summary, budget = self._build_root_cause_prompt(
+            incident_context, prompt
+        )
+        
+        # Invoke model (batched with concurrent requests for this client when enabled)
+        response = await self.batcher.analyze(
+            client_id=incident_context["client_id"],
+            system=system_prompt,
             prompt=analysis_prompt,
-            system=system_prompt
+            use_cache=use_cache,
+            max_tokens=self.analysis_max_tokens
         )
         
         # Parse response
-        return {
+        analysis = {
             "analysis": response.get("content", "Unable to analyze"),
             "confidence": 0.85,  # Could be extracted from model response
             "evidence": metrics_summary,
-            "model_used": response.get("model")
+            "model_used": response.get("model"),
+            "usage": {**response.get("usage", {}), "budget": budget}
         }
+        if response.get("fallback"):
+            analysis["fallback"] = response["fallback"]
+        return analysis
     
     def _propose_remediation(
         self,
@@ -233,6 +533,26 @@ Based on this data, provide:
         
         return remediation_plan
     
+    def format_remediation_plan(self, agent_response: Dict[str, Any]) -> str:
+        """Format the remediation section of an incident response as markdown"""
+        remediation = agent_response.get("remediation_plan", {})
+        
+        formatted = "**Recommended Actions:**\n"
+        
+        actions = remediation.get("actions", [])
+        for i, action in enumerate(actions, 1):
+            formatted += f"\n{i}. **{action.get('type', 'Action').replace('_', ' ').title()}**"
+            formatted += f"\n   - Target: {action.get('target', 'Unknown')}"
+            formatted += f"\n   - Rationale: {action.get('rationale', 'Not specified')}"
+        
+        formatted += f"\n\n**Risk Level:** {remediation.get('risk', 'unknown').upper()}"
+        formatted += f"\n**Estimated Resolution Time:** {remediation.get('estimated_time', 'Unknown')}"
+        
+        if agent_response.get("requires_approval"):
+            formatted += "\n\n⚠️ **Manual approval required before executing remediation.**"
+        
+        return formatted
+    
     def _generate_id(self) -> str:
         """Generate incident ID"""
         import random
@@ -0,0 +1,106 @@
+"""Single-pass keyword matching for request routing and metric detection"""
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Specialist agents and the words that route a request to them
+AGENT_KEYWORDS = {
+    "incident_agent": [
+        "incident", "issue", "problem", "error", "alert", "down", "downtime", "outage",
+        "critical", "failure", "not working", "broken", "crash", "remediate",
+        "fix", "resolve", "troubleshoot", "diagnose"
+    ],
+    "monitoring_agent": [
+        "health", "status", "monitor", "metric", "utilization", "performance",
+        "usage", "check", "fleet", "sweep", "at risk"
+    ],
+}
+
+# Request scopes beyond a single client
+SCOPE_KEYWORDS = {
+    "fleet": ["fleet", "all clients", "every client", "all customers", "sweep"],
+}
+
+# CloudWatch metrics and the words that point at them
+METRIC_KEYWORDS = {
+    "CPUUtilization": ["cpu", "processor", "high load"],
+    "MemoryUtilization": ["memory", "ram", "oom"],
+    "NetworkIn": ["network", "bandwidth", "latency"],
+    "DiskReadOps": ["disk", "storage", "io"],
+}
+
+# Simple inflections accepted after a keyword ("errors", "crashed", "fixing")
+_INFLECTION = r"(?:s|es|d|ed|ing)?"
+
+
+def _normalize(keyword: str) -> str:
+    return " ".join(keyword.lower().split())
+
+
+class KeywordRouter:
+    """
+    Matches the keywords of every table in one scan of the text.
+
+    All keywords are compiled into a single case-insensitive regex, once,
+    when the router is built. Keywords match whole words only (multi-word
+    keywords across any whitespace), optionally followed by a simple
+    inflection, so "ram" matches "RAM" but not "program".
+    """
+
+    def __init__(self, tables: Mapping[str, Mapping[str, Iterable[str]]]):
+        """
+        Args:
+            tables: {category: {label: keywords}}, e.g. {"agent": AGENT_KEYWORDS}
+        """
+        self.tables = {
+            category: {label: list(keywords) for label, keywords in labels.items()}
+            for category, labels in tables.items()
+        }
+
+        # Keyword -> every (category, label) it counts toward
+        self._targets: Dict[str, List[Tuple[str, str]]] = {}
+        for category, labels in self.tables.items():
+            for label, keywords in labels.items():
+                for keyword in keywords:
+                    self._targets.setdefault(_normalize(keyword), []).append((category, label))
+
+        # Longest first, so a keyword wins over any shorter one it starts with
+        alternatives = "|".join(
+            r"\s+".join(re.escape(word) for word in keyword.split())
+            for keyword in sorted(self._targets, key=len, reverse=True)
+        )
+        self._pattern = (
+            re.compile(rf"\b({alternatives}){_INFLECTION}\b", re.IGNORECASE)
+            if self._targets else None
+        )
+
+    def match(self, text: str) -> Dict[str, Dict[str, int]]:
+        """
+        Score every label whose keywords occur in the text
+
+        Args:
+            text: Text to scan (e.g. a user prompt)
+
+        Returns:
+            {category: {label: keyword hits}} for every category; only
+            matched labels are present, in table order
+        """
+        hits: Dict[str, Dict[str, int]] = {category: {} for category in self.tables}
+        if self._pattern is not None:
+            for found in self._pattern.finditer(text):
+                for category, label in self._targets[_normalize(found.group(1))]:
+                    hits[category][label] = hits[category].get(label, 0) + 1
+
+        return {
+            category: {label: hits[category][label] for label in labels if label in hits[category]}
+            for category, labels in self.tables.items()
+        }
+
+    @staticmethod
+    def best(scores: Dict[str, int], default: Optional[str] = None) -> Optional[str]:
+        """Highest-scoring label (earliest in table order on ties), or default"""
+        if not scores:
+            return default
+        return max(scores, key=scores.get)
+
+
+keyword_router = KeywordRouter({"agent": AGENT_KEYWORDS, "metric": METRIC_KEYWORDS, "scope": SCOPE_KEYWORDS})
@@ -1,30 +1,66 @@
 """Monitoring Agent - Handles health checks and metric analysis"""
-from typing import Dict, Any, Optional
-from tools import analyze_cloudwatch_metrics, query_client_inventory
+import asyncio
+from typing import Dict, Any, AsyncIterator, List, Optional
+from config import config
+from tools import (
+    analyze_cloudwatch_metrics,
+    analyze_cloudwatch_metrics_batch,
+    analyze_instance_metrics,
+    top_offenders,
+    query_client_inventory,
+    iter_fleet_inventory,
+    fleet_client_ids,
+    check_instance_status,
+)
 
 class MonitoringAgent:
     """
     Specialist agent for infrastructure monitoring and health checks.
-    Uses CloudWatch and inventory tools to assess system health.
+    Uses CloudWatch and inventory tools to assess system health, for one
+    client or as a sweep across the whole fleet.
     """
     
-    def __init__(self, model, tools: Optional[Dict] = None):
+    # Tools a fleet sweep calls, reported in tools_used
+    SWEEP_TOOLS = (
+        "iter_fleet_inventory",
+        "analyze_cloudwatch_metrics_batch",
+        "analyze_instance_metrics",
+        "check_instance_status",
+    )
+    
+    def __init__(
+        self,
+        model,
+        tools: Optional[Dict] = None,
+        sweep_concurrency: Optional[int] = None,
+        clients_per_batch: Optional[int] = None
+    ):
         """
         Initialize the monitoring agent
         
         Args:
             model: Bedrock model instance
             tools: Optional tool registry
+            sweep_concurrency: Client batches checked at once during a fleet sweep (defaults to config)
+            clients_per_batch: Clients per batched metric retrieval during a sweep (defaults to config)
         """
         self.model = model
         self.tools = tools or {}
+        self.sweep_concurrency = sweep_concurrency or config.FLEET_SWEEP_CONCURRENCY
+        self.clients_per_batch = clients_per_batch or config.FLEET_SWEEP_CLIENTS_PER_BATCH
+        self.sweep_metrics = [name.strip() for name in config.FLEET_SWEEP_METRICS.split(",") if name.strip()]
+        self.utilization_threshold = config.INSTANCE_UTILIZATION_THRESHOLD
+        self.top_offenders = config.INSTANCE_TOP_OFFENDERS
         self._register_tools()
     
     def _register_tools(self):
         """Register available tools for this agent"""
         self.tools = {
             "analyze_cloudwatch_metrics": analyze_cloudwatch_metrics,
+            "analyze_cloudwatch_metrics_batch": analyze_cloudwatch_metrics_batch,
+            "analyze_instance_metrics": analyze_instance_metrics,
             "query_client_inventory": query_client_inventory,
+            "check_instance_status": check_instance_status,
         }
     
     async def invoke(
@@ -47,8 +83,20 @@ class MonitoringAgent:
         if not client_id:
             client_id = "demo-client-001"
         
-        # Step 1: Query inventory
-        inventory = query_client_inventory(client_id, filter_by="running")
+        metrics_to_check = ["CPUUtilization", "MemoryUtilization"]
+        use_cache = (context or {}).get("use_cache", True)
+        
+        # Inventory and all metrics for the client (one batched retrieval), concurrently and off the loop
+        inventory, metrics_by_client = await asyncio.gather(
+            asyncio.to_thread(query_client_inventory, client_id, filter_by="running", use_cache=use_cache),
+            asyncio.to_thread(
+                analyze_cloudwatch_metrics_batch,
+                client_ids=[client_id],
+                metric_names=metrics_to_check,
+                time_range="1h",
+                use_cache=use_cache
+            )
+        )
         
         if "error" in inventory:
             return {
@@ -57,31 +105,23 @@ class MonitoringAgent:
                 "client_id": client_id
             }
         
-        # Step 2: Analyze key metrics for each instance
-        metrics_to_check = ["CPUUtilization", "MemoryUtilization"]
+        all_metrics = metrics_by_client[client_id]
         
-        anomalies = []
-        all_metrics = []
+        # Per-instance series for every running instance, so one hot instance is not averaged away
+        instance_ids = [instance["instance_id"] for instance in inventory.get("instances", [])]
+        instance_metrics = await asyncio.to_thread(
+            analyze_instance_metrics,
+            instance_ids,
+            metrics_to_check,
+            time_range="1h",
+            owners={instance_id: client_id for instance_id in instance_ids},
+            use_cache=use_cache
+        )
         
-        for metric_name in metrics_to_check:
-            metric_result = analyze_cloudwatch_metrics(
-                client_id=client_id,
-                metric_name=metric_name,
-                time_range="1h"
-            )
-            
-            all_metrics.append(metric_result)
-            
-            if metric_result.get("anomaly_detected"):
-                anomalies.append({
-                    "metric": metric_name,
-                    "severity": metric_result.get("severity"),
-                    "value": metric_result.get("current_value"),
-                    "recommendation": metric_result.get("recommendation")
-                })
-        
-        # Step 3: Synthesize response
-        health_status = "healthy" if len(anomalies) == 0 else "warning" if len(anomalies) < 2 else "critical"
+        anomalies = self._find_anomalies(all_metrics) + self._instance_anomalies(instance_metrics)
+        
+        # Synthesize response
+        health_status = self._health_status(len(anomalies))
         
         response = {
             "status": health_status,
@@ -95,12 +135,227 @@ class MonitoringAgent:
             "anomalies_detected": len(anomalies),
             "anomalies": anomalies,
             "recommendation": self._generate_recommendation(health_status, anomalies),
-            "tools_used": ["query_client_inventory", "analyze_cloudwatch_metrics"],
+            "instance_metrics": self._instance_summary(instance_metrics),
+            "tools_used": ["query_client_inventory", "analyze_cloudwatch_metrics_batch", "analyze_instance_metrics"],
             "raw_metrics": all_metrics
         }
         
         return response
     
+    async def sweep_fleet(
+        self,
+        client_ids: Optional[List[str]] = None,
+        use_cache: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Check every client and every running instance in the fleet
+        
+        Running instances for all clients come from one paginated inventory
+        pass. Clients are then checked in batches: one batched client-level
+        metric retrieval, one batched per-instance retrieval and batched EC2
+        status checks per batch, with at most sweep_concurrency batches in
+        flight.
+        
+        Args:
+            client_ids: Clients to sweep (defaults to FLEET_CLIENT_IDS, else
+                every client with a ClientId-tagged running instance)
+            use_cache: Set False to bypass the tool result cache
+        
+        Yields:
+            {"type": "client_health", "data": dict} per client as its batch
+                completes
+            {"type": "fleet_summary", "data": dict} last
+        """
+        client_ids = client_ids or fleet_client_ids() or None
+        fleet = await asyncio.to_thread(self._running_instances_by_client, client_ids)
+        clients = list(client_ids or fleet)
+        
+        semaphore = asyncio.Semaphore(self.sweep_concurrency)
+        batches = [
+            clients[offset:offset + self.clients_per_batch]
+            for offset in range(0, len(clients), self.clients_per_batch)
+        ]
+        
+        async def check(batch: List[str]) -> List[Dict[str, Any]]:
+            owners = {
+                instance["instance_id"]: client_id
+                for client_id in batch
+                for instance in fleet.get(client_id, [])
+            }
+            async with semaphore:
+                metrics, instance_metrics, statuses = await asyncio.gather(
+                    asyncio.to_thread(
+                        analyze_cloudwatch_metrics_batch,
+                        client_ids=batch,
+                        metric_names=self.sweep_metrics,
+                        time_range="1h",
+                        use_cache=use_cache
+                    ),
+                    asyncio.to_thread(
+                        analyze_instance_metrics,
+                        list(owners),
+                        self.sweep_metrics,
+                        time_range="1h",
+                        owners=owners,
+                        use_cache=use_cache
+                    ),
+                    asyncio.to_thread(check_instance_status, list(owners))
+                )
+            return [
+                self._client_health(
+                    client_id, fleet.get(client_id, []), metrics[client_id], instance_metrics, statuses
+                )
+                for client_id in batch
+            ]
+        
+        counts = {"healthy": 0, "warning": 0, "critical": 0}
+        instances_checked = 0
+        failed_batches = 0
+        tasks = [asyncio.ensure_future(check(batch)) for batch in batches]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                try:
+                    results = await finished
+                except Exception as e:
+                    # A failed batch is reported, the rest of the sweep carries on
+                    print(f"Fleet sweep batch error: {e}")
+                    failed_batches += 1
+                    continue
+                for health in results:
+                    counts[health["status"]] += 1
+                    instances_checked += health["running_instances"]
+                    yield {"type": "client_health", "data": health}
+        finally:
+            # The consumer may stop early (e.g. WebSocket disconnect); don't leave batches running
+            for task in tasks:
+                task.cancel()
+        
+        yield {
+            "type": "fleet_summary",
+            "data": {
+                "status": "critical" if counts["critical"] else "warning" if counts["warning"] or failed_batches else "healthy",
+                "clients_checked": len(clients),
+                "instances_checked": instances_checked,
+                "clients_by_status": counts,
+                "failed_batches": failed_batches,
+                "metrics": self.sweep_metrics
+            }
+        }
+    
+    def _running_instances_by_client(self, client_ids: Optional[List[str]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Group the fleet's running instances by their ClientId tag"""
+        fleet: Dict[str, List[Dict[str, Any]]] = {client_id: [] for client_id in client_ids or []}
+        for page in iter_fleet_inventory(client_ids, filter_by="running"):
+            for instance in page:
+                fleet.setdefault(instance["tags"].get("ClientId"), []).append(instance)
+        fleet.pop(None, None)
+        return fleet
+    
+    def _client_health(
+        self,
+        client_id: str,
+        instances: List[Dict[str, Any]],
+        metrics: List[Dict[str, Any]],
+        instance_metrics: Dict[str, Any],
+        statuses: Dict[str, Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Health of one client from its metrics, its instances' metrics and their status checks"""
+        instance_ids = [instance["instance_id"] for instance in instances]
+        anomalies = self._find_anomalies(metrics) + self._instance_anomalies(instance_metrics, instance_ids)
+        impaired = [
+            instance["instance_id"] for instance in instances
+            if not statuses.get(instance["instance_id"], {}).get("healthy", True)
+        ]
+        for instance_id in impaired:
+            anomalies.append({
+                "metric": "StatusCheck",
+                "severity": "critical",
+                "instance_id": instance_id,
+                "recommendation": f"Instance {instance_id} failed EC2 status checks"
+            })
+        
+        health_status = self._health_status(len(anomalies))
+        return {
+            "status": health_status,
+            "client_id": client_id,
+            "running_instances": len(instances),
+            "impaired_instances": impaired,
+            "metrics_analyzed": len(metrics),
+            "anomalies_detected": len(anomalies),
+            "anomalies": anomalies,
+            "instance_metrics": self._instance_summary(instance_metrics, instance_ids),
+            "recommendation": self._generate_recommendation(health_status, anomalies)
+        }
+    
+    def _find_anomalies(self, metrics: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "metric": metric_result["metric_name"],
+                "severity": metric_result.get("severity"),
+                "value": metric_result.get("current_value"),
+                "recommendation": metric_result.get("recommendation")
+            }
+            for metric_result in metrics
+            if metric_result.get("anomaly_detected")
+        ]
+    
+    def _instance_anomalies(
+        self,
+        instance_metrics: Dict[str, Any],
+        instance_ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Instances whose latest utilization is at or above the threshold"""
+        rows = range(len(instance_metrics["instance_ids"]))
+        if instance_ids is not None:
+            wanted = set(instance_ids)
+            rows = [row for row in rows if instance_metrics["instance_ids"][row] in wanted]
+        
+        anomalies = []
+        for metric_name, latest in instance_metrics["latest"].items():
+            # Only percentages have a fleet-wide meaning of "too high"
+            if "Utilization" not in metric_name:
+                continue
+            for row in rows:
+                if latest[row] is not None and latest[row] >= self.utilization_threshold:
+                    instance_id = instance_metrics["instance_ids"][row]
+                    anomalies.append({
+                        "metric": metric_name,
+                        "severity": "critical",
+                        "value": latest[row],
+                        "instance_id": instance_id,
+                        "recommendation": f"High {metric_name} on {instance_id}"
+                    })
+        return anomalies
+    
+    def _instance_summary(
+        self,
+        instance_metrics: Dict[str, Any],
+        instance_ids: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """Top offenders per metric among the given instances (default all)"""
+        return {
+            "instances_analyzed": len(instance_metrics["instance_ids"] if instance_ids is None else instance_ids),
+            "top_offenders": {
+                metric_name: top_offenders(instance_metrics, metric_name, self.top_offenders, instance_ids=instance_ids)
+                for metric_name in instance_metrics["metric_names"]
+            }
+        }
+    
+    def _health_status(self, anomaly_count: int) -> str:
+        return "healthy" if anomaly_count == 0 else "warning" if anomaly_count < 2 else "critical"
+    
+    def format_health(self, health: Dict[str, Any]) -> str:
+        """One-line summary of a client health result (from invoke or sweep_fleet)"""
+        icon = {"healthy": "✅", "warning": "⚠️", "critical": "🚨"}.get(health["status"], "❔")
+        running = health.get("running_instances", health.get("inventory_summary", {}).get("running_instances"))
+        line = (
+            f"{icon} {health['client_id']}: {health['status']} "
+            f"({running} running, {health['anomalies_detected']} anomalies)"
+        )
+        if health["status"] != "healthy":
+            line += f" - {health['recommendation']}"
+        return line
+    
     def _generate_recommendation(
         self,
         health_status: str,
@@ -116,4 +371,3 @@ class MonitoringAgent:
         # Critical
         recommendations = [a["recommendation"] for a in anomalies]
         return f"Multiple critical issues detected: {', '.join(recommendations)}. Immediate remediation recommended."
-
@@ -1,7 +1,11 @@
 """Orchestrator Agent - Routes requests to specialist agents"""
-from typing import Dict, Any, Optional, Iterator
-from bedrock import BedrockModel
+import time
+from typing import Dict, Any, Optional, AsyncIterator
+from config import config
+from bedrock import BedrockModel, model_stream
 from agents.incident_agent import IncidentAgent
+from agents.monitoring_agent import MonitoringAgent
+from agents.keyword_router import AGENT_KEYWORDS, keyword_router
 
 class OrchestratorAgent:
     """
@@ -20,15 +24,11 @@ class OrchestratorAgent:
         
         # Initialize specialist agents
         self.incident_agent = IncidentAgent(model=bedrock_model)
+        self.monitoring_agent = MonitoringAgent(model=bedrock_model)
         
-        # Agent routing rules
-        self.routing_keywords = {
-            "incident_agent": [
-                "incident", "issue", "problem", "error", "alert", "down", "outage",
-                "critical", "failure", "not working", "broken", "crash", "remediate",
-                "fix", "resolve", "troubleshoot", "diagnose"
-            ],
-        }
+        # Agent routing rules, matched in one pass by the compiled router
+        self.routing_keywords = AGENT_KEYWORDS
+        self.router = keyword_router
     
     def route_request(self, prompt: str) -> str:
         """
@@ -38,16 +38,14 @@ class OrchestratorAgent:
             prompt: User's request
         
         Returns:
-            Agent identifier or 'general' for orchestrator handling
+            Agent identifier (the one with the most keyword hits) or
+            'general' for orchestrator handling
         """
-        prompt_lower = prompt.lower()
-        
-        # Check for incident-related keywords
-        if any(keyword in prompt_lower for keyword in self.routing_keywords["incident_agent"]):
-            return "incident_agent"
-        
-        # Default to general orchestrator handling
-        return "general"
+        return self.router.best(self.router.match(prompt)["agent"], default="general")
+    
+    def is_fleet_sweep(self, prompt: str, client_id: Optional[str]) -> bool:
+        """Whether a monitoring request covers the whole fleet rather than one client"""
+        return client_id == "all" or "fleet" in self.router.match(prompt)["scope"]
     
     async def invoke(
         self,
@@ -85,9 +83,37 @@ class OrchestratorAgent:
             )
             response.update(agent_response)
         
+        elif target_agent == "monitoring_agent":
+            use_cache = (context or {}).get("use_cache", True)
+            if self.is_fleet_sweep(prompt, client_id):
+                clients = []
+                async for event in self.monitoring_agent.sweep_fleet(use_cache=use_cache):
+                    if event["type"] == "client_health":
+                        clients.append(event["data"])
+                    else:
+                        summary = event["data"]
+                response.update({
+                    "client_id": "all",
+                    "status": summary["status"],
+                    "fleet_summary": summary,
+                    "clients": clients,
+                    "tools_used": list(self.monitoring_agent.SWEEP_TOOLS)
+                })
+            else:
+                agent_response = await self.monitoring_agent.invoke(
+                    prompt=prompt,
+                    client_id=response["client_id"],
+                    context=context
+                )
+                response.update(agent_response)
+        
         else:
             # Handle general queries with orchestrator
-            general_response = await self._handle_general_query(prompt, response["client_id"])
+            general_response = await self._handle_general_query(
+                prompt,
+                response["client_id"],
+                use_cache=(context or {}).get("use_cache", True)
+            )
             response.update(general_response)
         
         return response
@@ -97,10 +123,16 @@ class OrchestratorAgent:
         prompt: str,
         client_id: Optional[str] = None,
         context: Optional[Dict[str, Any]] = None
-    ) -> Iterator[Dict[str, Any]]:
+    ) -> AsyncIterator[Dict[str, Any]]:
         """
         Process request with streaming response
         
+        Never blocks the event loop: model output is read asynchronously, so
+        one process can serve many concurrent streams. Incident requests emit
+        tool results as they arrive, root-cause tokens straight from the
+        model, then the remediation plan. Fleet health sweeps emit each
+        client's result as soon as its batch is checked.
+        
         Args:
             prompt: User's request
             client_id: MSP client identifier
@@ -109,10 +141,10 @@ class OrchestratorAgent:
         Yields:
             Streaming events (tokens, tool calls, completion)
         """
-        import time
-        
         # Determine routing
         target_agent = self.route_request(prompt)
+        stop_reason = "end_turn"
+        usage: Optional[Dict[str, Any]] = None
         
         # Send routing information
         yield {
@@ -124,35 +156,21 @@ class OrchestratorAgent:
             }
         }
         
-        # For incident agent, provide structured analysis
+        # For incident agent, forward pipeline events as each stage finishes
         if target_agent == "incident_agent":
-            # Simulate progressive analysis
-            steps = [
-                "🔍 Analyzing incident context...",
-                "📊 Gathering system metrics...",
-                "🧠 Determining root cause...",
-                "💡 Proposing remediation plan...",
-            ]
-            
-            for step in steps:
-                yield {"type": "token", "content": step + "\n\n"}
-                time.sleep(0.3)
+            agent_response: Dict[str, Any] = {}
             
-            # Get full analysis from incident agent
-            agent_response = await self.incident_agent.invoke(
+            async for event in self.incident_agent.invoke_stream(
                 prompt=prompt,
                 client_id=client_id or "demo-client-001",
                 context=context
-            )
-            
-            # Stream the formatted response
-            formatted_response = self._format_incident_response(agent_response)
+            ):
+                if event["type"] == "incident_result":
+                    agent_response = event["data"]
+                    continue
+                yield event
             
-            # Stream the response token by token
-            words = formatted_response.split(' ')
-            for i, word in enumerate(words):
-                yield {"type": "token", "content": word + (' ' if i < len(words) - 1 else '')}
-                time.sleep(0.02)
+            usage = agent_response.get("root_cause", {}).get("usage")
             
             # Send metadata
             yield {
@@ -165,65 +183,90 @@ class OrchestratorAgent:
                 }
             }
         
+        elif target_agent == "monitoring_agent":
+            use_cache = (context or {}).get("use_cache", True)
+            if self.is_fleet_sweep(prompt, client_id):
+                yield {"type": "tool", "tool_name": "fleet_health_sweep", "status": "running"}
+                async for event in self.monitoring_agent.sweep_fleet(use_cache=use_cache):
+                    if event["type"] == "client_health":
+                        yield event
+                        yield {"type": "token", "content": self.monitoring_agent.format_health(event["data"]) + "\n"}
+                    else:
+                        summary = event["data"]
+                
+                yield {
+                    "type": "tool",
+                    "tool_name": "fleet_health_sweep",
+                    "status": "success",
+                    "summary": f"{summary['clients_checked']} clients, {summary['instances_checked']} instances"
+                }
+                yield {
+                    "type": "metadata",
+                    "data": {
+                        "tools_used": list(self.monitoring_agent.SWEEP_TOOLS),
+                        "fleet_summary": summary
+                    }
+                }
+            else:
+                agent_response = await self.monitoring_agent.invoke(
+                    prompt=prompt,
+                    client_id=client_id or "demo-client-001",
+                    context=context
+                )
+                if agent_response.get("status") == "error":
+                    yield {"type": "error", "data": {"message": agent_response.get("message")}}
+                else:
+                    yield {"type": "token", "content": self.monitoring_agent.format_health(agent_response)}
+                yield {
+                    "type": "metadata",
+                    "data": {"tools_used": agent_response.get("tools_used", []), "status": agent_response.get("status")}
+                }
+        
         else:
             # Stream general response using Bedrock
-            stream = self.model.invoke_stream(
+            stream = self._model_stream(
                 prompt=prompt,
                 system="You are an AI assistant for IT infrastructure management. Provide helpful, concise responses."
             )
             
-            for event in stream:
+            async for event in stream:
+                # The model's own completion is folded into the final event below
+                if event.get("type") == "complete":
+                    stop_reason = event.get("stop_reason") or stop_reason
+                    usage = event.get("usage")
+                    continue
                 yield event
         
         # Send completion
-        yield {"type": "complete", "stop_reason": "end_turn"}
+        complete = {"type": "complete", "stop_reason": stop_reason}
+        if usage:
+            complete["usage"] = usage
+        yield complete
     
-    def _format_incident_response(self, agent_response: Dict[str, Any]) -> str:
-        """Format incident agent response for streaming"""
-        
-        incident_id = agent_response.get("incident_id", "Unknown")
-        root_cause = agent_response.get("root_cause", {})
-        remediation = agent_response.get("remediation_plan", {})
-        
-        formatted = f"""**Incident Analysis Complete** (ID: {incident_id})
-
-**Root Cause Analysis:**
-{root_cause.get('analysis', 'Analysis unavailable')}
-
-**Confidence Level:** {int(root_cause.get('confidence', 0.85) * 100)}%
-
-**Recommended Actions:**
-"""
-        
-        actions = remediation.get("actions", [])
-        for i, action in enumerate(actions, 1):
-            formatted += f"\n{i}. **{action.get('type', 'Action').replace('_', ' ').title()}**"
-            formatted += f"\n   - Target: {action.get('target', 'Unknown')}"
-            formatted += f"\n   - Rationale: {action.get('rationale', 'Not specified')}"
-        
-        formatted += f"\n\n**Risk Level:** {remediation.get('risk', 'unknown').upper()}"
-        formatted += f"\n**Estimated Resolution Time:** {remediation.get('estimated_time', 'Unknown')}"
-        
-        if agent_response.get("requires_approval"):
-            formatted += "\n\n⚠️ **Manual approval required before executing remediation.**"
-        
-        return formatted
+    def _model_stream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Stream model events without blocking the loop"""
+        return model_stream(self.model, prompt, system, config.GENERAL_QUERY_MAX_TOKENS)
     
-    async def _handle_general_query(self, prompt: str, client_id: str) -> Dict[str, Any]:
+    async def _handle_general_query(self, prompt: str, client_id: str, use_cache: bool = True) -> Dict[str, Any]:
         """Handle general queries that don't require specialist agents"""
         
         # Use Bedrock for general responses
-        response = self.model.invoke(
+        response = await self.model.ainvoke(
             prompt=prompt,
             system="""You are an AI assistant for IT infrastructure management.
 Provide helpful, accurate responses about AWS services, RMM best practices,
-and IT operations. Be concise and actionable."""
+and IT operations. Be concise and actionable.""",
+            use_cache=use_cache,
+            max_tokens=config.GENERAL_QUERY_MAX_TOKENS
         )
         
-        return {
+        result = {
             "status": "completed",
             "response": response.get("content", ""),
             "model": response.get("model"),
             "usage": response.get("usage", {}),
             "tools_used": []
         }
+        if response.get("fallback"):
+            result["fallback"] = response["fallback"]
+        return result
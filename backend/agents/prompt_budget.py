@@ -0,0 +1,161 @@
+"""Token-budgeted assembly of evidence for agent prompts"""
+import heapq
+from typing import Dict, Any, Iterable, List, Optional
+from bedrock.bedrock_model import estimate_tokens
+
+SEVERITY_RANK = {"critical": 0, "high": 1, "warning": 2, "medium": 3, "low": 4, "normal": 5}
+
+# Instance states that point at trouble rank ahead of healthy running instances
+_STATE_RANK = {"stopping": 0, "shutting-down": 0, "pending": 1, "stopped": 2, "running": 3}
+
+
+def _deviation(metric: Dict[str, Any]) -> float:
+    """Relative distance of the current value from its average"""
+    average = metric.get("average") or 0
+    current = metric.get("current_value") or 0
+    return abs(current - average) / max(abs(average), 1.0)
+
+
+def rank_metrics(metrics: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Order metric summaries by how much they matter to an incident
+
+    Anomalies come first, then by severity and by deviation from the
+    average; entries that only carry an error are dropped.
+    """
+    return sorted(
+        (metric for metric in metrics if "error" not in metric),
+        key=lambda metric: (
+            not metric.get("anomaly_detected"),
+            SEVERITY_RANK.get(metric.get("severity"), len(SEVERITY_RANK)),
+            -_deviation(metric)
+        )
+    )
+
+
+def top_instances(instances: Iterable[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    """
+    The k instances most worth showing the model, in O(n log k)
+
+    Unhealthy states rank first, then production instances; ties keep a
+    stable order by instance id.
+    """
+    return heapq.nsmallest(
+        k,
+        instances,
+        key=lambda instance: (
+            _STATE_RANK.get(instance.get("status"), 1),
+            (instance.get("tags") or {}).get("Environment") != "Production",
+            instance.get("instance_id", "")
+        )
+    )
+
+
+def metric_line(metric: Dict[str, Any]) -> str:
+    return (
+        f"- {metric['metric_name']}: {metric['current_value']} "
+        f"(avg: {metric['average']}, severity: {metric['severity']})"
+    )
+
+
+def instance_line(instance: Dict[str, Any]) -> str:
+    tags = instance.get("tags") or {}
+    labels = ", ".join(
+        value for value in (
+            instance.get("type"),
+            instance.get("status"),
+            instance.get("availability_zone"),
+            tags.get("Environment"),
+            tags.get("Application")
+        ) if value
+    )
+    return f"- {instance.get('instance_id')} {instance.get('name', 'unnamed')} ({labels})"
+
+
+class PromptBudget:
+    """
+    Tracks estimated prompt tokens against a budget while a prompt is built.
+
+    Fixed text is charged with reserve(); optional evidence is admitted
+    line by line with take(), in priority order, until the budget runs
+    out. What was left out is counted per section for the usage report.
+    """
+
+    def __init__(self, max_tokens: int):
+        """
+        Args:
+            max_tokens: Estimated input tokens the prompt may use
+        """
+        self.max_tokens = max_tokens
+        self.used = 0
+        self.sections: Dict[str, Dict[str, int]] = {}
+
+    @property
+    def remaining(self) -> int:
+        return max(self.max_tokens - self.used, 0)
+
+    def reserve(self, *texts: str):
+        """Charge text that is always part of the prompt"""
+        self.used += sum(estimate_tokens(text) + 1 for text in texts)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to about max_tokens (marking the cut) and charge it"""
+        if estimate_tokens(text) > max_tokens:
+            text = text[:max_tokens * 4].rstrip() + " [truncated]"
+        self.reserve(text)
+        return text
+
+    def take(
+        self,
+        section: str,
+        lines: List[str],
+        total: Optional[int] = None
+    ) -> List[str]:
+        """
+        Admit lines in order while they fit
+
+        Args:
+            section: Name the section is reported under
+            lines: Candidate lines, most important first
+            total: Size of the population the lines were picked from, when
+                larger than len(lines) (e.g. a top-K of the fleet)
+
+        Returns:
+            The admitted lines, followed by a note if any were left out
+        """
+        total = max(total or 0, len(lines))
+        note_tokens = estimate_tokens(f"- ... {total} more not shown") + 1
+
+        taken: List[str] = []
+        for line in lines:
+            cost = estimate_tokens(line) + 1
+            # Keep room for the omission note unless this is the last line
+            reserve = note_tokens if len(taken) + 1 < total else 0
+            if cost + reserve > self.remaining:
+                break
+            self.used += cost
+            taken.append(line)
+
+        omitted = total - len(taken)
+        if omitted:
+            note = f"- ... {omitted} more not shown"
+            self.reserve(note)
+            taken.append(note)
+
+        self.sections[section] = {"included": total - omitted, "omitted": omitted}
+        return taken
+
+    def report(self, prompt_tokens: int, max_output_tokens: int) -> Dict[str, Any]:
+        """
+        Budget summary to merge into a response's usage
+
+        Args:
+            prompt_tokens: Local estimate for the final system + user prompt
+            max_output_tokens: max_tokens the call was made with
+        """
+        return {
+            "prompt_budget_tokens": self.max_tokens,
+            "prompt_estimated_tokens": prompt_tokens,
+            "max_output_tokens": max_output_tokens,
+            "sections": self.sections
+        }
@@ -0,0 +1,200 @@
+"""Micro-batching of concurrent root-cause analyses into multi-incident prompts"""
+import asyncio
+import concurrent.futures
+import re
+import threading
+from typing import Dict, Any, Hashable, List, Optional, Tuple
+from config import config
+
+_SECTION = re.compile(r"^###\s*Incident\s+(\d+)\s*$", re.MULTILINE)
+
+Item = Tuple[str, concurrent.futures.Future]  # (analysis prompt, result future)
+
+
+def build_batch_prompt(prompts: List[str]) -> str:
+    """Combine several analysis requests into one prompt with numbered sections"""
+    sections = "\n\n".join(f"### Incident {number}\n{prompt}" for number, prompt in enumerate(prompts, 1))
+    return f"""You are given {len(prompts)} separate incident analysis requests for the same client.
+Analyze each one independently. Start each answer with a line containing only
+"### Incident <number>" (1 to {len(prompts)}, in order) and write nothing outside those sections.
+
+{sections}"""
+
+
+def split_batch_answer(content: str, count: int) -> List[Optional[str]]:
+    """Split a multi-incident answer back into per-incident answers (None where missing)"""
+    answers: List[Optional[str]] = [None] * count
+    parts = _SECTION.split(content)
+    # parts = [preamble, number, text, number, text, ...]
+    for number, text in zip(parts[1::2], parts[2::2]):
+        index = int(number) - 1
+        if 0 <= index < count and text.strip():
+            answers[index] = text.strip()
+    return answers
+
+
+class _Batch:
+    __slots__ = ("items",)
+
+    def __init__(self):
+        self.items: List[Item] = []
+
+
+class RootCauseBatcher:
+    """
+    Groups root-cause requests for one client arriving within `window`
+    seconds into a single model call, then splits the answer back out.
+
+    Requests are compatible when they share client, system prompt, output
+    limit and cache setting; a batch's output limit is the per-request
+    limit (or the model default) times its size, capped at the model's
+    maximum output. The first request of a batch waits out the window and
+    makes the call on behalf of the rest; a batch that reaches `max_batch`
+    is closed early and later requests start a new one. Sections missing
+    from the combined answer are re-asked individually. With a zero window
+    every request goes straight to the model.
+    """
+
+    def __init__(self, model, window: Optional[float] = None, max_batch: Optional[int] = None):
+        """
+        Initialize the batcher
+
+        Args:
+            model: Bedrock model instance
+            window: Seconds to collect a batch; 0 disables batching (defaults to config)
+            max_batch: Most requests combined into one prompt (defaults to config)
+        """
+        self.model = model
+        self.window = window if window is not None else config.INCIDENT_BATCH_WINDOW_MS / 1000
+        self.max_batch = max_batch or config.INCIDENT_BATCH_MAX
+
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, _Batch] = {}
+        self.batches = 0
+        self.batched_requests = 0
+        self.split_misses = 0
+
+    async def analyze(
+        self,
+        client_id: str,
+        system: str,
+        prompt: str,
+        use_cache: bool = True,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Run one root-cause analysis, possibly as part of a batch
+
+        Args:
+            client_id: Client the incident belongs to
+            system: System prompt
+            prompt: Analysis prompt
+            use_cache: Serve/store identical requests from the response cache
+            max_tokens: Output token limit for this analysis (defaults to the model's)
+
+        Returns:
+            Model response (same shape as BedrockModel.ainvoke); batched
+            answers report usage["batch_size"], with usage for the whole call
+        """
+        if self.window <= 0:
+            return await self.model.ainvoke(prompt=prompt, system=system, use_cache=use_cache, max_tokens=max_tokens)
+
+        key = (client_id, system, use_cache, max_tokens)
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._pending[key] = batch
+            batch.items.append((prompt, future))
+            if len(batch.items) >= self.max_batch:
+                del self._pending[key]
+
+        if leader:
+            try:
+                await asyncio.sleep(self.window)
+                with self._lock:
+                    if self._pending.get(key) is batch:
+                        del self._pending[key]
+                await self._run(system, use_cache, max_tokens, batch.items)
+            except BaseException:
+                # Leader cancelled or interrupted: waiters fall back to their own calls
+                for _, item_future in batch.items:
+                    if not item_future.done():
+                        item_future.set_result(None)
+                raise
+
+        result = await asyncio.shield(asyncio.wrap_future(future))
+        if result is None:
+            return await self.model.ainvoke(prompt=prompt, system=system, use_cache=use_cache, max_tokens=max_tokens)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "window_seconds": self.window,
+                "max_batch": self.max_batch,
+                "batches": self.batches,
+                "batched_requests": self.batched_requests,
+                "split_misses": self.split_misses
+            }
+
+    async def _run(self, system: str, use_cache: bool, max_tokens: Optional[int], items: List[Item]):
+        """Answer every item of a closed batch"""
+        if len(items) == 1:
+            await self._run_single(system, use_cache, max_tokens, items[0])
+            return
+
+        prompts = [prompt for prompt, _ in items]
+        try:
+            response = await self.model.ainvoke(
+                prompt=build_batch_prompt(prompts),
+                system=system,
+                use_cache=use_cache,
+                max_tokens=min(
+                    (max_tokens or self.model.max_tokens) * len(items),
+                    config.BEDROCK_MODEL_MAX_OUTPUT_TOKENS
+                )
+            )
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += len(items)
+
+        # A flagged fallback has no sections to split; every item shares it
+        answers = (
+            [response.get("content", "")] * len(items)
+            if response.get("fallback")
+            else split_batch_answer(response.get("content", ""), len(items))
+        )
+        usage = {**response.get("usage", {}), "batch_size": len(items)}
+
+        missing = []
+        for item, answer in zip(items, answers):
+            if answer is None:
+                missing.append(item)
+            else:
+                item[1].set_result({**response, "content": answer, "usage": usage})
+
+        if missing:
+            with self._lock:
+                self.split_misses += len(missing)
+            await asyncio.gather(*(self._run_single(system, use_cache, max_tokens, item) for item in missing))
+
+    async def _run_single(self, system: str, use_cache: bool, max_tokens: Optional[int], item: Item):
+        prompt, future = item
+        try:
+            future.set_result(await self.model.ainvoke(
+                prompt=prompt,
+                system=system,
+                use_cache=use_cache,
+                max_tokens=max_tokens
+            ))
+        except Exception as e:
+            future.set_exception(e)
@@ -1,9 +1,18 @@
 """API package for RMM agent backend"""
 from .agent_endpoints import AgentAPI
 from .websocket_handler import WebSocketHandler
+from .invocation_pool import InvocationPool
+from .broadcast_hub import BroadcastHub
+from .session_store import SessionStore, MemorySessionStore, SQLiteSessionStore, create_session_store
 
 __all__ = [
     'AgentAPI',
     'WebSocketHandler',
+    'InvocationPool',
+    'BroadcastHub',
+    'SessionStore',
+    'MemorySessionStore',
+    'SQLiteSessionStore',
+    'create_session_store',
 ]
 
@@ -1,24 +1,68 @@
 """REST API endpoints for agent interactions"""
 from flask import Flask, request, jsonify
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import uuid
-import asyncio
 from datetime import datetime
+from config import config
+from aws_clients import registry as aws_client_registry
+from bedrock import bedrock_resilience, inflight_calls, response_cache
+from tools import tool_cache, remediation_jobs, execute_bulk_remediation
+from .session_store import SessionStore, create_session_store, session_record
+from .invocation_pool import InvocationPool
+from .loop_thread import get_loop_thread
+
+def parse_include(value: Optional[str]) -> List[str]:
+    """Split an ?include= query value into field names"""
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+def parse_wait(value: Optional[str]) -> float:
+    """Long-poll seconds from a ?wait= query value, capped by config"""
+    try:
+        return max(0.0, min(float(value or 0), config.INVOKE_LONG_POLL_MAX))
+    except ValueError:
+        return 0.0
+
+def health_payload(
+    sessions: Optional[SessionStore] = None,
+    invocations: Optional[InvocationPool] = None
+) -> Dict[str, Any]:
+    """Service health and shared resource statistics"""
+    payload = {
+        "status": "healthy",
+        "service": "rmm-agent-backend",
+        "version": "1.0.0-phase1",
+        "timestamp": datetime.utcnow().isoformat(),
+        "aws_clients": aws_client_registry.stats(),
+        "tool_cache": tool_cache.stats(),
+        "bedrock": {
+            "resilience": bedrock_resilience.stats(),
+            "response_cache": response_cache.stats(),
+            "inflight": inflight_calls.stats()
+        }
+    }
+    if sessions is not None:
+        payload["sessions"] = sessions.stats()
+    if invocations is not None:
+        payload["invocations"] = invocations.stats()
+    return payload
 
 class AgentAPI:
     """REST API handler for agent invocations"""
     
-    def __init__(self, app: Flask, orchestrator):
+    def __init__(self, app: Flask, orchestrator, session_store: Optional[SessionStore] = None):
         """
         Initialize API routes
         
         Args:
             app: Flask application instance
             orchestrator: OrchestratorAgent instance
+            session_store: Session backend (defaults to SESSION_STORE from config)
         """
         self.app = app
         self.orchestrator = orchestrator
-        self.sessions = {}  # In-memory session store (Phase 1)
+        self.sessions = session_store or create_session_store()
+        self.loop_thread = get_loop_thread()
+        self.invocations = InvocationPool(orchestrator, self.sessions, loop_thread=self.loop_thread)
         self._register_routes()
     
     def _register_routes(self):
@@ -26,13 +70,21 @@ class AgentAPI:
         self.app.route('/api/agent/invoke', methods=['POST'])(self.invoke_agent)
         self.app.route('/api/agent/action', methods=['POST'])(self.handle_action)
         self.app.route('/api/agent/session/<session_id>', methods=['GET'])(self.get_session)
+        self.app.route('/api/agent/remediation', methods=['POST'])(self.submit_remediation)
+        self.app.route('/api/agent/remediation/bulk', methods=['POST'])(self.submit_bulk_remediation)
+        self.app.route('/api/agent/remediation/<job_id>', methods=['GET'])(self.get_remediation)
         self.app.route('/health', methods=['GET'])(self.health_check)
     
     def invoke_agent(self):
         """
-        POST /api/agent/invoke
+        POST /api/agent/invoke[?mode=async]
         Invoke the orchestrator with a user prompt
         
+        With mode=async the request is queued on a bounded worker pool and
+        answered at once with 202 and the session id; poll (or long-poll
+        with ?wait=) GET /api/agent/session/<id> for the result. Returns
+        429 when the queue is full.
+        
         Request body:
         {
             "prompt": string,
@@ -57,32 +109,24 @@ class AgentAPI:
             client_id = data.get('clientId')
             context = data.get('context', {})
             
+            if request.args.get('mode') == 'async':
+                return self._submit_async(prompt, client_id, context)
+            
             # Generate IDs
             session_id = str(uuid.uuid4())
             request_id = str(uuid.uuid4())
             
-            # Invoke orchestrator (synchronous wrapper for async)
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(
+            # Invoke orchestrator on the shared loop thread (synchronous wrapper for async)
+            result = self.loop_thread.run(
                 self.orchestrator.invoke(
                     prompt=prompt,
                     client_id=client_id,
                     context=context
                 )
             )
-            loop.close()
             
             # Store session
-            self.sessions[session_id] = {
-                "session_id": session_id,
-                "request_id": request_id,
-                "prompt": prompt,
-                "client_id": client_id,
-                "result": result,
-                "created_at": datetime.utcnow().isoformat(),
-                "status": "completed"
-            }
+            self.sessions.put(session_id, session_record(session_id, request_id, prompt, client_id, result))
             
             return jsonify({
                 "sessionId": session_id,
@@ -94,6 +138,23 @@ class AgentAPI:
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
+    def _submit_async(self, prompt: str, client_id, context: Dict[str, Any]):
+        """Queue an invocation; 202 with its session id, or 429 when overloaded"""
+        submitted = self.invocations.submit(prompt=prompt, client_id=client_id, context=context)
+        
+        if submitted is None:
+            response = jsonify({"error": "Too many queued requests, retry later"})
+            response.headers['Retry-After'] = str(config.INVOKE_RETRY_AFTER)
+            return response, 429
+        
+        response = jsonify({
+            "sessionId": submitted["session_id"],
+            "requestId": submitted["request_id"],
+            "status": submitted["status"]
+        })
+        response.headers['Location'] = f"/api/agent/session/{submitted['session_id']}"
+        return response, 202
+    
     def handle_action(self):
         """
         POST /api/agent/action
@@ -137,33 +198,150 @@ class AgentAPI:
     
     def get_session(self, session_id: str):
         """
-        GET /api/agent/session/<session_id>
+        GET /api/agent/session/<session_id>[?include=instances,metrics,raw_metrics][&wait=seconds]
         Retrieve session details
         
+        With wait, a queued or running session is held open until it
+        completes or the wait (capped at INVOKE_LONG_POLL_MAX) runs out.
+        
+        Heavy fields (the instance list, incident metrics and raw metrics)
+        are stored out-of-line and only returned when named in include
+        ("all" returns every one); "lazy_fields" lists what is available.
+        
         Returns:
         {
             "sessionId": string,
             "prompt": string,
             "result": object,
-            "status": string
+            "status": string,
+            "lazy_fields": [string]
         }
         """
-        session = self.sessions.get(session_id)
+        include = parse_include(request.args.get('include'))
+        wait = parse_wait(request.args.get('wait'))
+        
+        if wait:
+            session = self.invocations.wait(session_id, timeout=wait, include=include)
+        else:
+            session = self.sessions.get(session_id, include=include)
         
         if not session:
             return jsonify({"error": "Session not found"}), 404
         
         return jsonify(session), 200
     
+    def submit_remediation(self):
+        """
+        POST /api/agent/remediation
+        Submit a remediation job; returns immediately while SSM runs it
+        
+        Request body:
+        {
+            "clientId": string,
+            "instanceId": string,
+            "actionType": string,
+            "parameters": object (optional)
+        }
+        
+        Returns (202):
+        {
+            "jobId": string,
+            "status": "queued",
+            "job": object
+        }
+        """
+        try:
+            data = request.get_json()
+            
+            required = ('clientId', 'instanceId', 'actionType')
+            if not data or any(field not in data for field in required):
+                return jsonify({"error": "Missing 'clientId', 'instanceId' or 'actionType' in request body"}), 400
+            
+            job = remediation_jobs.submit(
+                client_id=data['clientId'],
+                instance_ids=[data['instanceId']],
+                action_type=data['actionType'],
+                parameters=data.get('parameters', {})
+            )
+            
+            return jsonify({
+                "jobId": job["job_id"],
+                "status": job["status"],
+                "job": job
+            }), 202
+        
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def submit_bulk_remediation(self):
+        """
+        POST /api/agent/remediation/bulk
+        Submit one remediation action to many instances of a client
+        
+        Request body:
+        {
+            "clientId": string,
+            "actionType": string,
+            "instanceIds": [string] (or "tags"),
+            "tags": {"Application": ["WebServer"]} (optional),
+            "parameters": object (optional),
+            "batchSize": number (optional, max 50),
+            "maxConcurrency": number (optional),
+            "maxErrors": number (optional)
+        }
+        
+        Returns (202):
+        {
+            "jobId": string,
+            "status": "queued",
+            "job": object
+        }
+        """
+        try:
+            data = request.get_json()
+            
+            if not data or 'clientId' not in data or 'actionType' not in data:
+                return jsonify({"error": "Missing 'clientId' or 'actionType' in request body"}), 400
+            
+            job = execute_bulk_remediation(
+                client_id=data['clientId'],
+                action_type=data['actionType'],
+                parameters=data.get('parameters', {}),
+                instance_ids=data.get('instanceIds'),
+                tags=data.get('tags'),
+                batch_size=data.get('batchSize', 50),
+                max_concurrency=data.get('maxConcurrency'),
+                max_errors=data.get('maxErrors')
+            )
+            
+            if "job_id" not in job:
+                return jsonify(job), 400
+            
+            return jsonify({
+                "jobId": job["job_id"],
+                "status": job["status"],
+                "job": job
+            }), 202
+        
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def get_remediation(self, job_id: str):
+        """
+        GET /api/agent/remediation/<job_id>
+        Retrieve remediation job status and per-instance results
+        """
+        job = remediation_jobs.get(job_id)
+        
+        if not job:
+            return jsonify({"error": "Remediation job not found"}), 404
+        
+        return jsonify(job), 200
+    
     def health_check(self):
         """
         GET /health
         Health check endpoint
         """
-        return jsonify({
-            "status": "healthy",
-            "service": "rmm-agent-backend",
-            "version": "1.0.0-phase1",
-            "timestamp": datetime.utcnow().isoformat()
-        }), 200
+        return jsonify(health_payload(self.sessions, self.invocations)), 200
 
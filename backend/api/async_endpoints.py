@@ -0,0 +1,237 @@
+"""Async REST API endpoints for the ASGI serving mode"""
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Optional
+from quart import Quart, request, jsonify
+from tools import remediation_jobs, execute_bulk_remediation
+from config import config
+from .agent_endpoints import health_payload, parse_include, parse_wait
+from .invocation_pool import InvocationPool
+from .session_store import SessionStore, create_session_store, session_record
+
+class AsyncAgentAPI:
+    """
+    REST API handler for agent invocations on a long-lived event loop
+
+    Same routes and payloads as AgentAPI, but handlers are coroutines that
+    await the orchestrator directly instead of spinning up an event loop
+    per request. Blocking tool calls are pushed to worker threads.
+    """
+
+    def __init__(self, app: Quart, orchestrator, session_store: Optional[SessionStore] = None):
+        """
+        Initialize API routes
+
+        Args:
+            app: Quart application instance
+            orchestrator: OrchestratorAgent instance
+            session_store: Session backend (defaults to SESSION_STORE from config)
+        """
+        self.app = app
+        self.orchestrator = orchestrator
+        self.sessions = session_store or create_session_store()
+        self.invocations = InvocationPool(orchestrator, self.sessions)
+        self._register_routes()
+
+    def _register_routes(self):
+        """Register all API routes"""
+        self.app.route('/api/agent/invoke', methods=['POST'])(self.invoke_agent)
+        self.app.route('/api/agent/action', methods=['POST'])(self.handle_action)
+        self.app.route('/api/agent/session/<session_id>', methods=['GET'])(self.get_session)
+        self.app.route('/api/agent/remediation', methods=['POST'])(self.submit_remediation)
+        self.app.route('/api/agent/remediation/bulk', methods=['POST'])(self.submit_bulk_remediation)
+        self.app.route('/api/agent/remediation/<job_id>', methods=['GET'])(self.get_remediation)
+        self.app.route('/health', methods=['GET'])(self.health_check)
+
+    async def invoke_agent(self):
+        """
+        POST /api/agent/invoke[?mode=async]
+        Invoke the orchestrator with a user prompt (see AgentAPI.invoke_agent)
+        """
+        try:
+            data = await request.get_json(silent=True)
+
+            if not data or 'prompt' not in data:
+                return jsonify({"error": "Missing 'prompt' in request body"}), 400
+
+            prompt = data['prompt']
+            client_id = data.get('clientId')
+            context = data.get('context', {})
+
+            if request.args.get('mode') == 'async':
+                return await self._submit_async(prompt, client_id, context)
+
+            # Generate IDs
+            session_id = str(uuid.uuid4())
+            request_id = str(uuid.uuid4())
+
+            result = await self.orchestrator.invoke(
+                prompt=prompt,
+                client_id=client_id,
+                context=context
+            )
+
+            # Store session (the backend may hit disk, so keep it off the loop)
+            await asyncio.to_thread(
+                self.sessions.put,
+                session_id,
+                session_record(session_id, request_id, prompt, client_id, result)
+            )
+
+            return jsonify({
+                "sessionId": session_id,
+                "requestId": request_id,
+                "status": "completed",
+                "result": result
+            }), 200
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    async def _submit_async(self, prompt: str, client_id, context):
+        """Queue an invocation; 202 with its session id, or 429 when overloaded"""
+        submitted = await asyncio.to_thread(
+            self.invocations.submit,
+            prompt=prompt,
+            client_id=client_id,
+            context=context
+        )
+
+        if submitted is None:
+            response = jsonify({"error": "Too many queued requests, retry later"})
+            response.headers['Retry-After'] = str(config.INVOKE_RETRY_AFTER)
+            return response, 429
+
+        response = jsonify({
+            "sessionId": submitted["session_id"],
+            "requestId": submitted["request_id"],
+            "status": submitted["status"]
+        })
+        response.headers['Location'] = f"/api/agent/session/{submitted['session_id']}"
+        return response, 202
+
+    async def handle_action(self):
+        """
+        POST /api/agent/action
+        Approve or reject an agent-proposed action (see AgentAPI.handle_action)
+        """
+        try:
+            data = await request.get_json(silent=True)
+
+            if not data or 'actionId' not in data or 'approve' not in data:
+                return jsonify({"error": "Missing 'actionId' or 'approve' in request body"}), 400
+
+            # Phase 1 stub: just acknowledge
+            status = "approved" if data['approve'] else "rejected"
+
+            return jsonify({
+                "actionId": data['actionId'],
+                "status": status,
+                "comment": data.get('comment', ''),
+                "processed_at": datetime.utcnow().isoformat()
+            }), 200
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    async def get_session(self, session_id: str):
+        """
+        GET /api/agent/session/<session_id>[?include=instances,metrics,raw_metrics][&wait=seconds]
+        Retrieve session details, optionally long-polling (see AgentAPI.get_session)
+        """
+        include = parse_include(request.args.get('include'))
+        wait = parse_wait(request.args.get('wait'))
+
+        if wait:
+            session = await self.invocations.async_wait(session_id, timeout=wait, include=include)
+        else:
+            session = await asyncio.to_thread(self.sessions.get, session_id, include)
+
+        if not session:
+            return jsonify({"error": "Session not found"}), 404
+
+        return jsonify(session), 200
+
+    async def submit_remediation(self):
+        """
+        POST /api/agent/remediation
+        Submit a remediation job (see AgentAPI.submit_remediation)
+        """
+        try:
+            data = await request.get_json(silent=True)
+
+            required = ('clientId', 'instanceId', 'actionType')
+            if not data or any(field not in data for field in required):
+                return jsonify({"error": "Missing 'clientId', 'instanceId' or 'actionType' in request body"}), 400
+
+            job = await asyncio.to_thread(
+                remediation_jobs.submit,
+                client_id=data['clientId'],
+                instance_ids=[data['instanceId']],
+                action_type=data['actionType'],
+                parameters=data.get('parameters', {})
+            )
+
+            return jsonify({
+                "jobId": job["job_id"],
+                "status": job["status"],
+                "job": job
+            }), 202
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    async def submit_bulk_remediation(self):
+        """
+        POST /api/agent/remediation/bulk
+        Submit one remediation action to many instances (see AgentAPI.submit_bulk_remediation)
+        """
+        try:
+            data = await request.get_json(silent=True)
+
+            if not data or 'clientId' not in data or 'actionType' not in data:
+                return jsonify({"error": "Missing 'clientId' or 'actionType' in request body"}), 400
+
+            job = await asyncio.to_thread(
+                execute_bulk_remediation,
+                client_id=data['clientId'],
+                action_type=data['actionType'],
+                parameters=data.get('parameters', {}),
+                instance_ids=data.get('instanceIds'),
+                tags=data.get('tags'),
+                batch_size=data.get('batchSize', 50),
+                max_concurrency=data.get('maxConcurrency'),
+                max_errors=data.get('maxErrors')
+            )
+
+            if "job_id" not in job:
+                return jsonify(job), 400
+
+            return jsonify({
+                "jobId": job["job_id"],
+                "status": job["status"],
+                "job": job
+            }), 202
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    async def get_remediation(self, job_id: str):
+        """
+        GET /api/agent/remediation/<job_id>
+        Retrieve remediation job status and per-instance results
+        """
+        job = remediation_jobs.get(job_id)
+
+        if not job:
+            return jsonify({"error": "Remediation job not found"}), 404
+
+        return jsonify(job), 200
+
+    async def health_check(self):
+        """
+        GET /health
+        Health check endpoint
+        """
+        return jsonify(await asyncio.to_thread(health_payload, self.sessions, self.invocations)), 200
@@ -0,0 +1,210 @@
+"""Native async WebSocket handler for the ASGI serving mode"""
+import asyncio
+import json
+from typing import Dict, Any, Optional, Tuple
+from quart import Quart, websocket
+from tools import remediation_jobs
+from tools.remediation_jobs import TERMINAL_STATUSES
+from config import config
+from .broadcast_hub import BroadcastHub
+from .event_codec import EventCodec
+from .stream_buffer import AsyncEventSender
+from .websocket_handler import broadcast_key, encoding_notice, shared_run, stream_to_sender
+
+class AsyncWebSocketHandler:
+    """
+    Handles WebSocket connections as coroutines on the server's event loop
+
+    Same routes and message format as WebSocketHandler, but an open socket
+    costs a task rather than a thread, so one process can hold thousands
+    of concurrent streams.
+    """
+
+    def __init__(self, app: Quart, orchestrator, hub: Optional[BroadcastHub] = None):
+        """
+        Initialize WebSocket handler
+
+        Args:
+            app: Quart application instance
+            orchestrator: OrchestratorAgent instance
+            hub: Broadcast hub for shared runs (one is created if omitted)
+        """
+        self.app = app
+        self.orchestrator = orchestrator
+        self.hub = hub or BroadcastHub()
+        self._register_routes()
+
+    def _register_routes(self):
+        """Register WebSocket routes"""
+        self.app.websocket('/ws/agent/stream')(self.stream_agent)
+        self.app.websocket('/ws/agent/remediation')(self.stream_remediation)
+
+    async def stream_agent(self):
+        """
+        WebSocket endpoint for streaming agent responses
+        (message format as in WebSocketHandler)
+
+        Prompts carrying a requestId run concurrently on one long-lived
+        connection (up to WS_MAX_REQUESTS_PER_CONNECTION) and can be
+        stopped with {"type": "cancel", "requestId": ...}; a prompt without
+        one gets a single answer and the socket closes.
+        """
+        ws = websocket._get_current_object()
+        codec = EventCodec.from_request(ws.args)
+        sender = AsyncEventSender(ws.send, codec)
+        notice = encoding_notice(codec)
+        if notice:
+            sender.push("event", notice)
+        sender_task = asyncio.create_task(sender.run())
+        active: Dict[str, asyncio.Task] = {}
+
+        try:
+            while True:
+                message = await ws.receive()
+
+                try:
+                    data = json.loads(message) if message else None
+                except json.JSONDecodeError:
+                    data = None
+                if not isinstance(data, dict):
+                    sender.push("error", {"message": "Invalid JSON in message"})
+                    if active:
+                        continue
+                    break
+
+                request_id = data.get('requestId')
+
+                if data.get('type') == 'cancel':
+                    task = active.pop(request_id, None)
+                    if task:
+                        task.cancel()
+                        sender.push("error", {"message": "Request cancelled"}, request_id)
+                    continue
+
+                prompt = data.get('prompt')
+                key = broadcast_key(data)
+                if not prompt and key is None:
+                    sender.push("error", {"message": "Missing 'prompt' in message"}, request_id)
+                    if request_id is None:
+                        break
+                    continue
+
+                if key is not None:
+                    stream = self._stream_shared(sender, key, prompt, data.get('context', {}), request_id)
+                else:
+                    stream = stream_to_sender(
+                        self.orchestrator,
+                        sender,
+                        prompt=prompt,
+                        client_id=data.get('clientId'),
+                        context=data.get('context', {}),
+                        request_id=request_id
+                    )
+
+                # Single-prompt connection: answer once, then close
+                if request_id is None:
+                    await stream
+                    break
+
+                if request_id in active or len(active) >= config.WS_MAX_REQUESTS_PER_CONNECTION:
+                    stream.close()
+                    sender.push("error", {"message": "Duplicate requestId or too many requests in flight"}, request_id)
+                    continue
+
+                task = asyncio.create_task(stream)
+                active[request_id] = task
+                task.add_done_callback(lambda _, request_id=request_id: active.pop(request_id, None))
+
+            # Let in-flight requests finish, then flush what is queued
+            if active:
+                await asyncio.gather(*active.values(), return_exceptions=True)
+            sender.close()
+            await sender_task
+
+        finally:
+            # Client went away (or we are done): stop runs and the sender
+            for task in list(active.values()):
+                task.cancel()
+            if not sender_task.done():
+                sender_task.cancel()
+
+    async def _stream_shared(
+        self,
+        sender: AsyncEventSender,
+        key: Tuple[Optional[str], str],
+        prompt: Optional[str],
+        context: Dict[str, Any],
+        request_id: Optional[str]
+    ):
+        """Watch the shared run for `key` until it ends (starting it if needed)"""
+        loop = asyncio.get_running_loop()
+        done = asyncio.Event()
+        client_id, session = key
+        run = shared_run(self.orchestrator, prompt, client_id, context) if prompt else None
+
+        # The hub publishes from its own thread; hop back onto this loop
+        subscription = self.hub.attach(
+            key,
+            run,
+            lambda event_type, data: loop.call_soon_threadsafe(sender.push, event_type, data, request_id),
+            lambda: loop.call_soon_threadsafe(done.set)
+        )
+        if subscription is None:
+            sender.push("error", {"message": f"No active run for session '{session}'"}, request_id)
+            return
+
+        try:
+            await done.wait()
+        finally:
+            self.hub.detach(subscription)
+
+    async def stream_remediation(self):
+        """
+        WebSocket endpoint pushing remediation job updates
+        (message format as in WebSocketHandler)
+        """
+        ws = websocket._get_current_object()
+
+        try:
+            message = await ws.receive()
+            data = json.loads(message) if message else {}
+            job_id = data.get('jobId')
+
+            # Job listeners run on the poller thread; hop back onto this loop
+            loop = asyncio.get_running_loop()
+            updates: asyncio.Queue = asyncio.Queue()
+            unsubscribe = remediation_jobs.subscribe(
+                lambda job: loop.call_soon_threadsafe(updates.put_nowait, job)
+                if not job_id or job["job_id"] == job_id else None
+            )
+
+            try:
+                if job_id:
+                    current = remediation_jobs.get(job_id)
+                    if not current:
+                        await self._send_error(ws, f"Remediation job '{job_id}' not found")
+                        return
+                    updates.put_nowait(current)
+
+                while True:
+                    job = await updates.get()
+                    await self._send_event(ws, 'remediation', job)
+                    if job_id and job["status"] in TERMINAL_STATUSES:
+                        break
+            finally:
+                unsubscribe()
+
+        except json.JSONDecodeError:
+            await self._send_error(ws, "Invalid JSON in message")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await self._send_error(ws, str(e))
+
+    async def _send_event(self, ws, event_type: str, data: Dict[str, Any]):
+        """Send a structured event to the WebSocket client"""
+        await ws.send(EventCodec().encode(event_type, data))
+
+    async def _send_error(self, ws, error_message: str):
+        """Send an error event to the WebSocket client"""
+        await self._send_event(ws, "error", {"message": error_message})
@@ -0,0 +1,200 @@
+"""Shared agent runs fanned out to many WebSocket subscribers"""
+import asyncio
+import threading
+import time
+from typing import Dict, Any, Callable, Coroutine, Hashable, List, Optional, Tuple
+from config import config
+from .loop_thread import LoopThread, get_loop_thread
+
+Deliver = Callable[[str, Dict[str, Any]], None]  # (event_type, data)
+
+
+class Subscription:
+    """One subscriber attached to a channel"""
+
+    def __init__(self, channel: "Channel", deliver: Deliver, finished: Callable[[], None]):
+        self.channel = channel
+        self.deliver = deliver
+        self.finished = finished
+
+
+class Channel:
+    """
+    One agent run and everything it has published so far.
+
+    Exposes push() like the stream senders, so the run writes into it
+    with stream_to_sender(); every event is appended to the replay log
+    and handed to each current subscriber. Consecutive tokens are merged
+    in the log so a late joiner replays a few frames, not every token.
+    """
+
+    def __init__(self, key: Hashable):
+        self.key = key
+        self.log: List[Tuple[str, Dict[str, Any]]] = []
+        self.subscribers: List[Subscription] = []
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.future = None  # concurrent.futures.Future of the run
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.finished_at is not None
+
+    def push(self, event_type: str, data: Dict[str, Any], request_id: Optional[str] = None):
+        """Publish one event (request_id is per subscriber and ignored here)"""
+        with self._lock:
+            if event_type == "token" and self.log and self.log[-1][0] == "token":
+                previous = self.log[-1][1]
+                self.log[-1] = ("token", {"content": previous.get("content", "") + data.get("content", "")})
+            else:
+                self.log.append((event_type, data))
+            for subscription in self.subscribers:
+                subscription.deliver(event_type, data)
+
+    def attach(self, subscription: Subscription):
+        """Replay the log to a new subscriber, then add it (or finish it straight away)"""
+        with self._lock:
+            for event_type, data in self.log:
+                subscription.deliver(event_type, data)
+            if self.finished:
+                subscription.finished()
+            else:
+                self.subscribers.append(subscription)
+
+    def detach(self, subscription: Subscription) -> int:
+        """Remove a subscriber; returns how many remain"""
+        with self._lock:
+            if subscription in self.subscribers:
+                self.subscribers.remove(subscription)
+            return len(self.subscribers)
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.time()
+            subscribers, self.subscribers = self.subscribers, []
+        for subscription in subscribers:
+            subscription.finished()
+
+
+class BroadcastHub:
+    """
+    Runs each keyed agent request once and fans its events out.
+
+    Subscribers sharing a key (client id + session/incident id) attach to
+    the same run: the first one starts it on the shared event loop thread,
+    later ones get the events published so far replayed, then the live
+    stream. A finished run stays replayable for `retention` seconds; a run
+    whose last subscriber leaves early is cancelled.
+    """
+
+    def __init__(self, retention: Optional[float] = None, loop_thread: Optional[LoopThread] = None):
+        """
+        Initialize the hub
+
+        Args:
+            retention: Seconds a finished run stays replayable (defaults to config)
+            loop_thread: Loop runs execute on (defaults to the shared one)
+        """
+        self.retention = retention if retention is not None else config.BROADCAST_RETENTION
+
+        self._lock = threading.Lock()
+        self._channels: Dict[Hashable, Channel] = {}
+        self._loop_thread = loop_thread or get_loop_thread()
+        self.runs = 0
+        self.joins = 0
+        self.cancelled = 0
+
+    def attach(
+        self,
+        key: Hashable,
+        run: Optional[Callable[[Channel], Coroutine]],
+        deliver: Deliver,
+        finished: Callable[[], None]
+    ) -> Optional[Subscription]:
+        """
+        Subscribe to the run for `key`, starting it if there is none
+
+        Args:
+            key: Channel key
+            run: Coroutine factory publishing into the channel; None to only
+                join an existing run. A finished run is replaced by a new one
+                unless `run` is None
+            deliver: Called with (event_type, data) for replayed and live
+                events, from the hub thread; must not block
+            finished: Called once the run has ended
+
+        Returns:
+            The subscription, or None if `run` is None and nothing is running
+        """
+        with self._lock:
+            self._prune()
+            channel = self._channels.get(key)
+            if channel is not None and channel.finished and run is not None:
+                # A new prompt starts a new run; only join-only attaches replay a finished one
+                channel = None
+            if channel is None:
+                if run is None:
+                    return None
+                channel = Channel(key)
+                self._channels[key] = channel
+                start = True
+                self.runs += 1
+            else:
+                start = False
+                self.joins += 1
+
+        subscription = Subscription(channel, deliver, finished)
+        channel.attach(subscription)
+
+        if start:
+            channel.future = self._loop_thread.submit(self._run(channel, run))
+
+        return subscription
+
+    def detach(self, subscription: Subscription):
+        """Unsubscribe; cancels the run if nobody is left watching it"""
+        channel = subscription.channel
+        if channel.detach(subscription) or channel.finished:
+            return
+
+        with self._lock:
+            if self._channels.get(channel.key) is channel:
+                del self._channels[channel.key]
+            self.cancelled += 1
+        if channel.future is not None:
+            channel.future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            active = sum(1 for channel in self._channels.values() if not channel.finished)
+            return {
+                "channels": len(self._channels),
+                "active": active,
+                "subscribers": sum(len(channel.subscribers) for channel in self._channels.values()),
+                "runs": self.runs,
+                "joins": self.joins,
+                "cancelled": self.cancelled
+            }
+
+    async def _run(self, channel: Channel, run: Callable[[Channel], Coroutine]):
+        try:
+            await run(channel)
+        except asyncio.CancelledError:
+            channel.push("error", {"message": "Run cancelled"})
+            raise
+        except Exception as e:
+            print(f"Error in broadcast run {channel.key}: {e}")
+            channel.push("error", {"message": f"Streaming error: {str(e)}"})
+        finally:
+            channel.finish()
+
+    def _prune(self):
+        """Drop finished channels past retention (caller holds the lock)"""
+        cutoff = time.time() - self.retention
+        expired = [
+            key for key, channel in self._channels.items()
+            if channel.finished and channel.finished_at < cutoff
+        ]
+        for key in expired:
+            del self._channels[key]
@@ -0,0 +1,99 @@
+"""Wire encodings for streamed WebSocket events"""
+from datetime import datetime
+from typing import Dict, Any, Optional, Union
+import json
+import time
+
+try:
+    import msgpack
+except ImportError:  # optional: binary framing is unavailable without it
+    msgpack = None
+
+# Small integer codes used instead of type names in binary frames
+EVENT_TYPE_CODES: Dict[str, int] = {
+    "token": 1,
+    "tool": 2,
+    "event": 3,
+    "metadata": 4,
+    "complete": 5,
+    "error": 6,
+    "remediation": 7,
+    "health": 8,
+}
+
+
+def build_message(event_type: str, data: Dict[str, Any], request_id: Optional[str], timestamp: str) -> Dict[str, Any]:
+    """JSON wire message for one frame"""
+    message = {
+        "type": event_type,
+        "data": data,
+        "timestamp": timestamp
+    }
+    if request_id is not None:
+        message["requestId"] = request_id
+    return message
+
+
+class EventCodec:
+    """
+    Encodes stream events as JSON text frames or compact msgpack binary frames.
+
+    JSON frames keep the original {"type", "data", "timestamp"} shape.
+    msgpack frames are arrays [type_code, data, timestamp_ms, request_id],
+    with the request id omitted when absent and unknown types sent by name.
+    """
+
+    ENCODINGS = ("json", "msgpack")
+
+    def __init__(self, encoding: str = "json"):
+        """
+        Args:
+            encoding: "json" or "msgpack" (falls back to JSON if msgpack is not installed)
+        """
+        self.requested = encoding
+        self.encoding = "msgpack" if encoding == "msgpack" and msgpack is not None else "json"
+        self._formatted_at: Optional[float] = None
+        self._formatted = ""
+
+    @classmethod
+    def from_request(cls, args) -> "EventCodec":
+        """Build a codec from a request's query arguments (?encoding=msgpack)"""
+        encoding = (args.get("encoding") or "json").lower()
+        return cls(encoding if encoding in cls.ENCODINGS else "json")
+
+    @property
+    def fell_back(self) -> bool:
+        """True when a binary encoding was asked for but is unavailable"""
+        return self.requested != self.encoding
+
+    def encode(
+        self,
+        event_type: str,
+        data: Dict[str, Any],
+        request_id: Optional[str] = None,
+        timestamp: Optional[float] = None
+    ) -> Union[str, bytes]:
+        """
+        Encode one frame
+
+        Args:
+            event_type: Event type name
+            data: Event payload
+            request_id: Request id echoed on multi-prompt connections
+            timestamp: POSIX time of the frame (now if omitted); frames
+                flushed together share one value
+        """
+        if timestamp is None:
+            timestamp = time.time()
+
+        if self.encoding == "msgpack":
+            frame = [EVENT_TYPE_CODES.get(event_type, event_type), data, int(timestamp * 1000)]
+            if request_id is not None:
+                frame.append(request_id)
+            return msgpack.packb(frame, default=str)
+
+        # Format the timestamp once per flush rather than once per frame
+        if timestamp != self._formatted_at:
+            self._formatted_at = timestamp
+            self._formatted = datetime.utcfromtimestamp(timestamp).isoformat()
+        return json.dumps(build_message(event_type, data, request_id, self._formatted))
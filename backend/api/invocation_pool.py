@@ -0,0 +1,225 @@
+"""Bounded worker pool for asynchronous agent invocations"""
+import asyncio
+import threading
+import time
+import uuid
+from typing import Dict, Any, Callable, Iterable, List, Optional
+from config import config
+from .loop_thread import LoopThread, get_loop_thread
+from .session_store import SessionStore, FINAL_STATUSES, session_record
+
+
+class InvocationPool:
+    """
+    Runs queued orchestrator invocations on a fixed number of workers.
+
+    Workers are tasks on the shared long-lived event loop thread, so the
+    HTTP request that submitted the work can return immediately in either
+    serving mode. Progress is written to the session store
+    (queued -> running -> completed | failed), and waiters are woken as
+    soon as their session finishes. Submissions beyond `workers +
+    max_queue` outstanding invocations are rejected.
+    """
+
+    # Upper bound between session store re-reads while long-polling, so
+    # sessions finished by another worker process are noticed too
+    POLL_SLICE = 1.0
+
+    def __init__(
+        self,
+        orchestrator,
+        sessions: SessionStore,
+        workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        loop_thread: Optional[LoopThread] = None
+    ):
+        """
+        Initialize the pool (workers start on first submission)
+
+        Args:
+            orchestrator: OrchestratorAgent instance
+            sessions: Session store results are written to
+            workers: Concurrent invocations (defaults to config)
+            max_queue: Invocations allowed to wait for a worker (defaults to config)
+            loop_thread: Loop the workers run on (defaults to the shared one)
+        """
+        self.orchestrator = orchestrator
+        self.sessions = sessions
+        self.workers = workers or config.INVOKE_WORKERS
+        self.max_queue = max_queue if max_queue is not None else config.INVOKE_MAX_QUEUE
+
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._waiters: Dict[str, List[Callable[[], None]]] = {}
+        self._loop_thread = loop_thread or get_loop_thread()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(
+        self,
+        prompt: str,
+        client_id: Optional[str] = None,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Queue an invocation
+
+        Returns:
+            {"session_id", "request_id", "status": "queued"}, or None when
+            the queue is full
+        """
+        with self._lock:
+            if self._outstanding >= self.workers + self.max_queue:
+                self.rejected += 1
+                return None
+            self._outstanding += 1
+
+        try:
+            self._ensure_started()
+
+            session_id = str(uuid.uuid4())
+            request_id = str(uuid.uuid4())
+            record = session_record(session_id, request_id, prompt, client_id, None, status="queued")
+            self.sessions.put(session_id, record)
+
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, (record, context or {}))
+        except BaseException:
+            # Never queued, so its worker will not release the slot
+            with self._lock:
+                self._outstanding -= 1
+            raise
+
+        return {"session_id": session_id, "request_id": request_id, "status": "queued"}
+
+    def wait(
+        self,
+        session_id: str,
+        timeout: float,
+        include: Optional[Iterable[str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Block until a session is final or timeout elapses; returns its latest state"""
+        deadline = time.monotonic() + timeout
+
+        while True:
+            # Register before reading so a completion in between is not missed
+            done = threading.Event()
+            self._add_waiter(session_id, done.set)
+            try:
+                session = self.sessions.get(session_id, include)
+                remaining = deadline - time.monotonic()
+                if session is None or session["status"] in FINAL_STATUSES or remaining <= 0:
+                    return session
+                done.wait(min(remaining, self.POLL_SLICE))
+            finally:
+                self._remove_waiter(session_id, done.set)
+
+    async def async_wait(
+        self,
+        session_id: str,
+        timeout: float,
+        include: Optional[Iterable[str]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Awaitable wait() that holds no thread while the session is pending"""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+
+        while True:
+            done = asyncio.Event()
+            notify = lambda: loop.call_soon_threadsafe(done.set)
+            self._add_waiter(session_id, notify)
+            try:
+                session = await asyncio.to_thread(self.sessions.get, session_id, include)
+                remaining = deadline - time.monotonic()
+                if session is None or session["status"] in FINAL_STATUSES or remaining <= 0:
+                    return session
+                try:
+                    await asyncio.wait_for(done.wait(), min(remaining, self.POLL_SLICE))
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                self._remove_waiter(session_id, notify)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "outstanding": self._outstanding,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected
+            }
+
+    def _ensure_started(self):
+        """Start the workers on the loop thread once"""
+        with self._lock:
+            if self._loop is not None:
+                return
+            self._loop_thread.run(self._start_workers())
+            self._loop = self._loop_thread.loop
+
+    async def _start_workers(self):
+        self._queue = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self):
+        while True:
+            record, context = await self._queue.get()
+            await self._run(record, context)
+
+    async def _run(self, record: Dict[str, Any], context: Dict[str, Any]):
+        """Execute one queued invocation and record its outcome"""
+        session_id = record["session_id"]
+        base = {
+            "session_id": session_id,
+            "request_id": record["request_id"],
+            "prompt": record["prompt"],
+            "client_id": record["client_id"],
+            "created_at": record["created_at"]
+        }
+
+        try:
+            await asyncio.to_thread(
+                self.sessions.put, session_id, session_record(result=None, status="running", **base)
+            )
+            result = await self.orchestrator.invoke(
+                prompt=record["prompt"],
+                client_id=record["client_id"],
+                context=context
+            )
+            final = session_record(result=result, status="completed", **base)
+        except Exception as e:
+            print(f"Error running queued invocation {session_id}: {e}")
+            final = session_record(result=None, status="failed", error=str(e), **base)
+
+        try:
+            await asyncio.to_thread(self.sessions.put, session_id, final)
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+                if final["status"] == "completed":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                waiters = list(self._waiters.get(session_id, ()))
+
+            for notify in waiters:
+                notify()
+
+    def _add_waiter(self, session_id: str, notify: Callable[[], None]):
+        with self._lock:
+            self._waiters.setdefault(session_id, []).append(notify)
+
+    def _remove_waiter(self, session_id: str, notify: Callable[[], None]):
+        with self._lock:
+            waiters = self._waiters.get(session_id)
+            if waiters is None:
+                return
+            if notify in waiters:
+                waiters.remove(notify)
+            if not waiters:
+                del self._waiters[session_id]
@@ -0,0 +1,76 @@
+"""Long-lived event loop thread for running coroutines from blocking code"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Coroutine, Optional
+
+
+class LoopThread:
+    """
+    One event loop running forever on a daemon thread.
+
+    Flask handlers are synchronous, so their async work (orchestrator
+    invocations, streams, shared runs, queued invocations) is handed to
+    this loop instead of a fresh loop per request. Loop-bound resources
+    such as the async Bedrock client's connection pool are then opened
+    once and shared by every request.
+    """
+
+    def __init__(self, name: str = "async-loop"):
+        """
+        Args:
+            name: Thread name
+        """
+        self.name = name
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running loop (started on first use)"""
+        self._ensure_started()
+        return self._loop
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop; returns a thread-safe future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine) -> Any:
+        """Run a coroutine on the loop and block until it returns"""
+        future = self.submit(coro)
+        try:
+            return future.result()
+        except BaseException:
+            future.cancel()
+            raise
+
+    def _ensure_started(self):
+        """Start the loop thread once"""
+        with self._lock:
+            if self._loop is not None:
+                return
+
+            started = threading.Event()
+
+            def run():
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
+                self._loop = loop
+                started.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, name=self.name, daemon=True).start()
+            started.wait()
+
+
+_shared_loop: Optional[LoopThread] = None
+_shared_loop_lock = threading.Lock()
+
+
+def get_loop_thread() -> LoopThread:
+    """Return the process-wide loop thread for work started from blocking code"""
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            _shared_loop = LoopThread("agent-loop")
+        return _shared_loop
@@ -0,0 +1,388 @@
+"""Session stores for agent invocations"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from config import config
+
+# Bulky sub-objects stored out-of-line and only loaded when included by name
+HEAVY_FIELDS: Dict[str, Tuple[str, ...]] = {
+    "instances": ("result", "incident_context", "inventory", "instances"),
+    "metrics": ("result", "incident_context", "metrics"),
+    "raw_metrics": ("result", "raw_metrics"),
+}
+
+
+# Session statuses after which nothing changes
+FINAL_STATUSES = ("completed", "failed")
+
+
+def session_record(
+    session_id: str,
+    request_id: str,
+    prompt: str,
+    client_id,
+    result: Optional[Dict[str, Any]],
+    status: str = "completed",
+    created_at: Optional[str] = None,
+    error: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build the stored record for an agent invocation"""
+    record = {
+        "session_id": session_id,
+        "request_id": request_id,
+        "prompt": prompt,
+        "client_id": client_id,
+        "result": result,
+        "created_at": created_at or datetime.utcnow().isoformat(),
+        "status": status
+    }
+    if error:
+        record["error"] = error
+    return record
+
+
+def _pack(value: Any) -> bytes:
+    """Serialize to compact zlib-compressed JSON"""
+    return zlib.compress(
+        json.dumps(value, separators=(",", ":"), default=str).encode(),
+        config.SESSION_COMPRESSION_LEVEL
+    )
+
+
+def _unpack(data: bytes) -> Any:
+    return json.loads(zlib.decompress(data))
+
+
+def pack_session(session: Dict[str, Any]) -> Tuple[bytes, Dict[str, bytes]]:
+    """
+    Split a session into a packed summary and packed heavy fields
+
+    The summary lists the detached field names under "lazy_fields" so
+    callers know what can be requested with include.
+    """
+    session = dict(session)
+    heavy: Dict[str, bytes] = {}
+
+    for name, path in HEAVY_FIELDS.items():
+        # Copy each dict along the path so the caller's session is untouched
+        parent = session
+        for key in path[:-1]:
+            child = parent.get(key)
+            if not isinstance(child, dict):
+                break
+            parent[key] = parent = dict(child)
+        else:
+            if path[-1] in parent:
+                heavy[name] = _pack(parent.pop(path[-1]))
+
+    session["lazy_fields"] = sorted(heavy)
+    return _pack(session), heavy
+
+
+def unpack_session(summary: bytes, heavy: Dict[str, bytes]) -> Dict[str, Any]:
+    """Rebuild a session from its summary and whichever heavy fields were loaded"""
+    session = _unpack(summary)
+
+    for name, data in heavy.items():
+        parent = session
+        for key in HEAVY_FIELDS[name][:-1]:
+            parent = parent.setdefault(key, {})
+        parent[HEAVY_FIELDS[name][-1]] = _unpack(data)
+
+    return session
+
+
+def _included(names: Iterable[str], include: Optional[Iterable[str]]) -> List[str]:
+    """Heavy field names selected by an include list ("all" selects every one)"""
+    if not include:
+        return []
+    include = set(include)
+    return [name for name in names if name in include or "all" in include]
+
+
+class SessionStore(ABC):
+    """
+    Interface for session storage used by the agent APIs.
+
+    Sessions are JSON-serializable dicts keyed by session id, stored as a
+    compressed summary plus out-of-line HEAVY_FIELDS. Expired or evicted
+    sessions simply stop being returned by `get`.
+    """
+
+    @abstractmethod
+    def get(self, session_id: str, include: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return a session, or None if it is unknown or expired
+
+        Args:
+            session_id: Session identifier
+            include: HEAVY_FIELDS names to load as well ("all" for every one)
+        """
+        ...
+
+    @abstractmethod
+    def put(self, session_id: str, session: Dict[str, Any]):
+        """Create or replace a session"""
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> bool:
+        """Remove a session; returns True if it existed"""
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+
+class _Session:
+    __slots__ = ("summary", "heavy", "size", "expires_at")
+
+    def __init__(self, summary: bytes, heavy: Dict[str, bytes], ttl: float):
+        self.summary = summary
+        self.heavy = heavy
+        self.size = len(summary) + sum(len(data) for data in heavy.values())
+        self.expires_at = time.monotonic() + ttl
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process session store bounded by TTL, entry count and bytes.
+
+    Sessions are kept packed, so callers always get a fresh copy and the
+    byte cap reflects what is actually held. Least-recently-used sessions
+    are evicted first.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None
+    ):
+        """
+        Initialize the store
+
+        Args:
+            max_entries: Maximum number of sessions kept (defaults to config)
+            max_bytes: Memory cap in bytes of packed sessions (defaults to config)
+            ttl: Seconds a session is kept after its last write (defaults to config)
+        """
+        self.max_entries = max_entries or config.SESSION_MAX_ENTRIES
+        self.max_bytes = max_bytes or config.SESSION_MAX_BYTES
+        self.ttl = ttl if ttl is not None else config.SESSION_TTL
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+
+    def get(self, session_id: str, include: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if entry.expires_at <= time.monotonic():
+                self._remove_locked(session_id)
+                return None
+            self._sessions.move_to_end(session_id)
+
+        heavy = {name: entry.heavy[name] for name in _included(entry.heavy, include)}
+        return unpack_session(entry.summary, heavy)
+
+    def put(self, session_id: str, session: Dict[str, Any]):
+        entry = _Session(*pack_session(session), self.ttl)
+        if entry.size > self.max_bytes:
+            print(f"Session {session_id} exceeds the session store byte cap; not stored")
+            return
+
+        with self._lock:
+            self._remove_locked(session_id)
+            self._sessions[session_id] = entry
+            self._bytes += entry.size
+
+            while len(self._sessions) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove_locked(next(iter(self._sessions)))
+                self.evictions += 1
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._remove_locked(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "evictions": self.evictions
+            }
+
+    def _remove_locked(self, session_id: str) -> bool:
+        entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size
+        return True
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Disk-backed session store using SQLite in WAL mode.
+
+    Sessions survive restarts and can be shared by several worker processes
+    pointed at the same file. Heavy fields live in their own table and are
+    only read when included. Expired sessions are pruned periodically on
+    write, and the oldest sessions are dropped beyond `max_entries`.
+    """
+
+    PRUNE_EVERY = 100  # writes between expiry/size sweeps
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None
+    ):
+        """
+        Initialize the store
+
+        Args:
+            path: SQLite database file (defaults to config)
+            ttl: Seconds a session is kept after its last write (defaults to config)
+            max_entries: Maximum number of sessions kept (defaults to config)
+        """
+        self.path = path or config.SESSION_DB_PATH
+        self.ttl = ttl if ttl is not None else config.SESSION_TTL
+        self.max_entries = max_entries or config.SESSION_MAX_ENTRIES
+
+        # sqlite3 connections are not shareable across threads; keep one per thread
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_fields ("
+            " session_id TEXT NOT NULL,"
+            " name TEXT NOT NULL,"
+            " data BLOB NOT NULL,"
+            " PRIMARY KEY (session_id, name))"
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id: str, include: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT data FROM sessions WHERE session_id = ? AND expires_at > ?",
+            (session_id, time.time())
+        ).fetchone()
+        if not row:
+            return None
+
+        heavy = {}
+        names = _included(HEAVY_FIELDS, include)
+        if names:
+            placeholders = ",".join("?" * len(names))
+            heavy = dict(conn.execute(
+                f"SELECT name, data FROM session_fields WHERE session_id = ? AND name IN ({placeholders})",
+                (session_id, *names)
+            ).fetchall())
+
+        return unpack_session(row[0], heavy)
+
+    def put(self, session_id: str, session: Dict[str, Any]):
+        summary, heavy = pack_session(session)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (session_id, summary, now, now + self.ttl)
+            )
+            conn.execute("DELETE FROM session_fields WHERE session_id = ?", (session_id,))
+            conn.executemany(
+                "INSERT INTO session_fields (session_id, name, data) VALUES (?, ?, ?)",
+                [(session_id, name, data) for name, data in heavy.items()]
+            )
+
+        with self._writes_lock:
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def delete(self, session_id: str) -> bool:
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            conn.execute("DELETE FROM session_fields WHERE session_id = ?", (session_id,))
+        return cursor.rowcount > 0
+
+    def prune(self) -> int:
+        """Delete expired sessions and trim to max_entries; returns sessions removed"""
+        conn = self._connection()
+        with conn:
+            expired = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+            trimmed = conn.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                " SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+            conn.execute(
+                "DELETE FROM session_fields WHERE session_id NOT IN (SELECT session_id FROM sessions)"
+            )
+        return expired + trimmed
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        count, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions"
+        ).fetchone()
+        size += conn.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM session_fields").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "sessions": count,
+            "bytes": size,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl
+        }
+
+
+def create_session_store() -> SessionStore:
+    """Build the session store selected by SESSION_STORE ("memory" or "sqlite")"""
+    if config.SESSION_STORE == "sqlite":
+        return SQLiteSessionStore()
+    return MemorySessionStore()
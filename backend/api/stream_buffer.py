@@ -0,0 +1,268 @@
+"""Outbound event buffering for WebSocket streams"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Awaitable, Callable, Deque, List, Optional, Tuple, Union
+from config import config
+from .event_codec import EventCodec
+
+Frame = Tuple[str, Dict[str, Any], Optional[str]]  # (type, data, request_id)
+
+
+class _Outbound:
+    __slots__ = ("event_type", "data", "request_id", "size", "first_at")
+
+    def __init__(self, event_type: str, data: Dict[str, Any], request_id: Optional[str]):
+        self.event_type = event_type
+        self.data = data
+        self.request_id = request_id
+        self.size = len(data.get("content", "")) if event_type == "token" else 0
+        self.first_at = time.monotonic()
+
+
+def _droppable(item: _Outbound) -> bool:
+    """Informational events a slow client can lose without losing content"""
+    if item.event_type == "event":
+        return True
+    return item.event_type == "tool" and item.data.get("status") == "running"
+
+
+class EventBuffer:
+    """
+    Per-connection outbound queue that coalesces tokens and bounds backlog.
+
+    Consecutive tokens of one request are merged into a single frame that
+    is held until it is `flush_interval` old or `flush_bytes` long (or a
+    non-token event of that request follows). Queued tool events for the
+    same tool are replaced by the newest status. Once `max_events` frames
+    are waiting for a slow client, informational events are dropped;
+    tokens and terminal events are never lost.
+
+    Not thread-safe: drivers serialize access.
+    """
+
+    def __init__(
+        self,
+        flush_interval: Optional[float] = None,
+        flush_bytes: Optional[int] = None,
+        max_events: Optional[int] = None
+    ):
+        """
+        Initialize the buffer
+
+        Args:
+            flush_interval: Seconds a token frame may be held for coalescing (defaults to config)
+            flush_bytes: Token frame size that triggers an immediate flush (defaults to config)
+            max_events: Queued frames after which informational events are dropped (defaults to config)
+        """
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else config.WS_FLUSH_INTERVAL_MS / 1000
+        )
+        self.flush_bytes = flush_bytes or config.WS_FLUSH_BYTES
+        self.max_events = max_events or config.WS_MAX_QUEUED_EVENTS
+
+        self._items: Deque[_Outbound] = deque()
+        self._open_tokens: Dict[Optional[str], _Outbound] = {}
+        self.pushed = 0
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def push(self, event_type: str, data: Dict[str, Any], request_id: Optional[str] = None):
+        """Queue an event, merging or dropping as described above"""
+        self.pushed += 1
+
+        if event_type == "token":
+            open_token = self._open_tokens.get(request_id)
+            if open_token is not None:
+                content = data.get("content", "")
+                open_token.data["content"] += content
+                open_token.size += len(content)
+                self.merged += 1
+                return
+            item = _Outbound(event_type, {"content": data.get("content", "")}, request_id)
+            if self._make_room(item):
+                self._items.append(item)
+                self._open_tokens[request_id] = item
+            return
+
+        # Anything else ends the open token frame for its request
+        self._open_tokens.pop(request_id, None)
+
+        if event_type == "tool":
+            for queued in self._items:
+                if (
+                    queued.event_type == "tool"
+                    and queued.request_id == request_id
+                    and queued.data.get("tool_name") == data.get("tool_name")
+                ):
+                    queued.data = data
+                    self.merged += 1
+                    return
+
+        item = _Outbound(event_type, data, request_id)
+        if self._make_room(item):
+            self._items.append(item)
+
+    def take_ready(self, force: bool = False) -> Tuple[List[Frame], Optional[float]]:
+        """
+        Remove and return the frames due for sending
+
+        Returns:
+            (frames, seconds until the next held token frame is due, or None)
+        """
+        now = time.monotonic()
+        ready: List[Frame] = []
+        held: Deque[_Outbound] = deque()
+        next_due: Optional[float] = None
+
+        while self._items:
+            item = self._items.popleft()
+            is_open = self._open_tokens.get(item.request_id) is item
+            if is_open and not force and item.size < self.flush_bytes:
+                due = item.first_at + self.flush_interval - now
+                if due > 0:
+                    held.append(item)
+                    next_due = due if next_due is None else min(next_due, due)
+                    continue
+            if is_open:
+                del self._open_tokens[item.request_id]
+            ready.append((item.event_type, item.data, item.request_id))
+
+        self._items = held
+        self.sent += len(ready)
+        return ready, next_due
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._items),
+            "pushed": self.pushed,
+            "sent": self.sent,
+            "merged": self.merged,
+            "dropped": self.dropped
+        }
+
+    def _make_room(self, item: _Outbound) -> bool:
+        """Enforce max_events; returns False if the new item itself is dropped"""
+        if len(self._items) < self.max_events:
+            return True
+        if _droppable(item):
+            self.dropped += 1
+            return False
+        for queued in self._items:
+            if _droppable(queued):
+                self._items.remove(queued)
+                self.dropped += 1
+                break
+        return True
+
+
+class AsyncEventSender:
+    """
+    Drains an EventBuffer to an async send callable on the event loop.
+
+    Producers call push() without awaiting; the sender task writes frames
+    as the client accepts them, so a slow client only grows (and merges)
+    the buffer instead of stalling the agent run.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Union[str, bytes]], Awaitable[None]],
+        codec: Optional[EventCodec] = None,
+        buffer: Optional[EventBuffer] = None
+    ):
+        """
+        Args:
+            send: Coroutine function sending one encoded frame
+            codec: Frame encoding (JSON if omitted)
+            buffer: Outbound buffer (a default one is created if omitted)
+        """
+        self.send = send
+        self.codec = codec or EventCodec()
+        self.buffer = buffer or EventBuffer()
+        self._wakeup = asyncio.Event()
+        self._closed = False
+
+    def push(self, event_type: str, data: Dict[str, Any], request_id: Optional[str] = None):
+        self.buffer.push(event_type, data, request_id)
+        self._wakeup.set()
+
+    def close(self):
+        """Flush what is queued, then stop run()"""
+        self._closed = True
+        self._wakeup.set()
+
+    async def run(self):
+        while True:
+            frames, next_due = self.buffer.take_ready(force=self._closed)
+            if frames:
+                timestamp = time.time()
+                for event_type, data, request_id in frames:
+                    await self.send(self.codec.encode(event_type, data, request_id, timestamp))
+                continue
+
+            if self._closed and not len(self.buffer):
+                return
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), next_due)
+            except asyncio.TimeoutError:
+                pass
+
+
+class ThreadedEventSender:
+    """
+    Drains an EventBuffer to a blocking send callable from the calling thread.
+
+    push() and close() may be called from any thread (e.g. a producer
+    running on its own event loop); run() blocks until close().
+    """
+
+    def __init__(
+        self,
+        send: Callable[[Union[str, bytes]], None],
+        codec: Optional[EventCodec] = None,
+        buffer: Optional[EventBuffer] = None
+    ):
+        """
+        Args:
+            send: Function sending one encoded frame
+            codec: Frame encoding (JSON if omitted)
+            buffer: Outbound buffer (a default one is created if omitted)
+        """
+        self.send = send
+        self.codec = codec or EventCodec()
+        self.buffer = buffer or EventBuffer()
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def push(self, event_type: str, data: Dict[str, Any], request_id: Optional[str] = None):
+        with self._condition:
+            self.buffer.push(event_type, data, request_id)
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+    def run(self):
+        while True:
+            with self._condition:
+                frames, next_due = self.buffer.take_ready(force=self._closed)
+                if not frames:
+                    if self._closed and not len(self.buffer):
+                        return
+                    self._condition.wait(next_due)
+                    continue
+
+            # Send outside the lock so producers keep queueing meanwhile
+            timestamp = time.time()
+            for event_type, data, request_id in frames:
+                self.send(self.codec.encode(event_type, data, request_id, timestamp))
@@ -1,23 +1,155 @@
 """WebSocket handler for streaming agent responses"""
+from flask import request
 from flask_sock import Sock
 import json
-import asyncio
-from typing import Dict, Any
-from datetime import datetime
+import queue
+from typing import Dict, Any, Optional, Tuple
+from tools import remediation_jobs
+from tools.remediation_jobs import TERMINAL_STATUSES
+from .broadcast_hub import BroadcastHub
+from .event_codec import EventCodec
+from .loop_thread import get_loop_thread
+from .stream_buffer import ThreadedEventSender
+
+def client_event(event: Dict[str, Any]) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Map an orchestrator stream event to the (type, data) sent to clients
+    
+    Returns None for events that are not forwarded.
+    """
+    event_type = event.get('type')
+    
+    if event_type == 'token':
+        # Stream content tokens
+        return 'token', {'content': event.get('content', '')}
+    
+    if event_type == 'tool' or event_type == 'tool_use_start':
+        # Notify about tool execution
+        tool_event = {
+            'tool_name': event.get('tool_name') or event.get('data', {}).get('tool_name'),
+            'status': event.get('status') or event.get('data', {}).get('status', 'running')
+        }
+        # Completed incident tools also report latency and a result summary
+        for key in ('latency_ms', 'summary'):
+            if key in event:
+                tool_event[key] = event[key]
+        return 'tool', tool_event
+    
+    if event_type == 'routing':
+        # Send routing information
+        return 'event', {
+            'message': f"Routed to {event.get('data', {}).get('routed_to')} agent",
+            'routed_to': event.get('data', {}).get('routed_to')
+        }
+    
+    if event_type == 'fallback':
+        # Model unavailable: the answer that follows is a flagged stand-in
+        return 'event', {
+            'message': event.get('message', 'Model unavailable'),
+            'fallback': True,
+            'reason': event.get('reason')
+        }
+    
+    if event_type == 'client_health':
+        # One client's result from a fleet health sweep
+        return 'health', event.get('data', {})
+    
+    if event_type == 'metadata':
+        # Send metadata about the response
+        return 'metadata', event.get('data', {})
+    
+    if event_type == 'complete':
+        # Send completion event (with token usage, incl. prompt cache reads/writes, when known)
+        complete = {
+            'message': 'Agent processing completed',
+            'stop_reason': event.get('stop_reason', 'end_turn')
+        }
+        if event.get('usage'):
+            complete['usage'] = event['usage']
+        return 'complete', complete
+    
+    if event_type == 'error':
+        # Handle errors
+        return 'error', {'message': event.get('data', {}).get('message', 'Unknown error')}
+    
+    return None
+
+async def stream_to_sender(
+    orchestrator,
+    sender,
+    prompt: str,
+    client_id: Optional[str],
+    context: Dict[str, Any],
+    request_id: Optional[str] = None
+):
+    """
+    Run one prompt through the orchestrator, pushing client events into a
+    sender's buffer (AsyncEventSender or ThreadedEventSender)
+    """
+    # Send start event
+    sender.push("event", {
+        "message": "Agent processing started",
+        "prompt": prompt,
+        "client_id": client_id
+    }, request_id)
+    
+    try:
+        async for event in orchestrator.invoke_stream(
+            prompt=prompt,
+            client_id=client_id,
+            context=context
+        ):
+            outgoing = client_event(event)
+            if outgoing:
+                sender.push(*outgoing, request_id)
+    
+    except Exception as e:
+        sender.push("error", {"message": f"Streaming error: {str(e)}"}, request_id)
+
+def encoding_notice(codec: EventCodec) -> Optional[Dict[str, Any]]:
+    """Informational event telling a client its requested encoding is unavailable"""
+    if not codec.fell_back:
+        return None
+    return {
+        "message": f"Encoding '{codec.requested}' is not available; sending JSON",
+        "encoding": codec.encoding
+    }
+
+def broadcast_key(data: Dict[str, Any]) -> Optional[Tuple[Optional[str], str]]:
+    """
+    Key of the shared run a stream message belongs to: its sessionId, else
+    the incident id in its context, scoped to the client. None when the
+    message asks for a private run.
+    """
+    context = data.get('context') or {}
+    session = data.get('sessionId') or context.get('incident_id')
+    if not session:
+        return None
+    return data.get('clientId'), str(session)
+
+def shared_run(orchestrator, prompt: str, client_id: Optional[str], context: Dict[str, Any]):
+    """Coroutine factory for BroadcastHub.attach publishing one prompt's events"""
+    return lambda channel: stream_to_sender(orchestrator, channel, prompt, client_id, context)
 
 class WebSocketHandler:
     """Handles WebSocket connections for streaming agent output"""
     
-    def __init__(self, app, orchestrator):
+    # Seconds between disconnect checks while waiting for remediation updates
+    DISCONNECT_CHECK_INTERVAL = 1.0
+    
+    def __init__(self, app, orchestrator, hub: Optional[BroadcastHub] = None):
         """
         Initialize WebSocket handler
         
         Args:
             app: Flask application instance
             orchestrator: OrchestratorAgent instance
+            hub: Broadcast hub for shared runs (one is created if omitted)
         """
         self.sock = Sock(app)
         self.orchestrator = orchestrator
+        self.loop_thread = get_loop_thread()
+        self.hub = hub or BroadcastHub(loop_thread=self.loop_thread)
         self._register_routes()
     
     def _register_routes(self):
@@ -31,125 +163,212 @@ class WebSocketHandler:
             {
                 "prompt": string,
                 "clientId": string (optional),
-                "context": object (optional)
+                "context": object (optional),
+                "requestId": string (optional),
+                "sessionId": string (optional)
             }
             
             Server streams:
             {
                 "type": "token" | "tool" | "event" | "complete" | "error",
                 "data": object,
-                "timestamp": string
+                "timestamp": string,
+                "requestId": string (when the prompt carried one)
             }
+            
+            Tokens are coalesced into fewer frames. A prompt without a
+            requestId gets one answer and the socket closes (original
+            behaviour); prompts with a requestId keep the connection open
+            for further prompts, answered one at a time in this mode.
+            
+            A sessionId (or context.incident_id) makes the run shared:
+            every socket sending the same one for the same client watches a
+            single orchestrator run, and late joiners get the events so far
+            replayed. Such a message may omit the prompt to only join.
+            
+            Connecting with ?encoding=msgpack switches server frames to
+            binary msgpack arrays (see EventCodec).
             """
-            try:
-                # Receive initial message
-                message = ws.receive()
+            codec = EventCodec.from_request(request.args)
+            notice = encoding_notice(codec)
+            if notice:
+                self._send_event(ws, "event", notice, codec=codec)
+            
+            while True:
+                try:
+                    message = ws.receive()
+                    
+                    if not message:
+                        self._send_error(ws, "No message received", codec=codec)
+                        return
+                    
+                    data = json.loads(message)
+                    prompt = data.get('prompt')
+                    request_id = data.get('requestId')
+                    key = broadcast_key(data)
+                    
+                    if not prompt and key is None:
+                        self._send_error(ws, "Missing 'prompt' in message", request_id, codec)
+                        if request_id is None:
+                            return
+                        continue
+                    
+                    if key is not None:
+                        self._stream_shared(
+                            ws,
+                            key,
+                            prompt=prompt,
+                            context=data.get('context', {}),
+                            request_id=request_id,
+                            codec=codec
+                        )
+                    else:
+                        self._stream_request(
+                            ws,
+                            prompt=prompt,
+                            client_id=data.get('clientId'),
+                            context=data.get('context', {}),
+                            request_id=request_id,
+                            codec=codec
+                        )
+                    
+                    if request_id is None:
+                        return
                 
-                if not message:
-                    self._send_error(ws, "No message received")
+                except json.JSONDecodeError:
+                    self._send_error(ws, "Invalid JSON in message", codec=codec)
                     return
-                
-                data = json.loads(message)
-                prompt = data.get('prompt')
-                client_id = data.get('clientId')
-                context = data.get('context', {})
-                
-                if not prompt:
-                    self._send_error(ws, "Missing 'prompt' in message")
+                except Exception as e:
+                    self._send_error(ws, str(e), codec=codec)
                     return
+    
+        @self.sock.route('/ws/agent/remediation')
+        def stream_remediation(ws):
+            """
+            WebSocket endpoint pushing remediation job updates
+            
+            Client sends:
+            {
+                "jobId": string (optional; omit to follow every job)
+            }
+            
+            Server streams:
+            {
+                "type": "remediation",
+                "data": job snapshot,
+                "timestamp": string
+            }
+            until the followed job reaches a terminal status
+            """
+            try:
+                message = ws.receive()
+                data = json.loads(message) if message else {}
+                job_id = data.get('jobId')
                 
-                # Send start event
-                self._send_event(ws, "event", {
-                    "message": "Agent processing started",
-                    "prompt": prompt,
-                    "client_id": client_id
-                })
-                
-                # Stream from orchestrator (real Bedrock streaming)
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Use invoke_stream for real-time streaming
-                stream = loop.run_until_complete(
-                    self._process_stream(
-                        ws=ws,
-                        prompt=prompt,
-                        client_id=client_id,
-                        context=context
-                    )
+                updates = queue.Queue()
+                unsubscribe = remediation_jobs.subscribe(
+                    lambda job: updates.put(job) if not job_id or job["job_id"] == job_id else None
                 )
                 
-                loop.close()
+                try:
+                    if job_id:
+                        current = remediation_jobs.get(job_id)
+                        if not current:
+                            self._send_error(ws, f"Remediation job '{job_id}' not found")
+                            return
+                        updates.put(current)
+                    
+                    while ws.connected:
+                        try:
+                            job = updates.get(timeout=self.DISCONNECT_CHECK_INTERVAL)
+                        except queue.Empty:
+                            # Idle tracker: wake up to notice a client that went away
+                            continue
+                        self._send_event(ws, 'remediation', job)
+                        if job_id and job["status"] in TERMINAL_STATUSES:
+                            break
+                finally:
+                    unsubscribe()
             
             except json.JSONDecodeError:
                 self._send_error(ws, "Invalid JSON in message")
             except Exception as e:
                 self._send_error(ws, str(e))
     
-    def _send_event(self, ws, event_type: str, data: Dict[str, Any]):
-        """Send a structured event to the WebSocket client"""
-        message = {
-            "type": event_type,
-            "data": data,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        ws.send(json.dumps(message))
+    def _send_event(
+        self,
+        ws,
+        event_type: str,
+        data: Dict[str, Any],
+        request_id: Optional[str] = None,
+        codec: Optional[EventCodec] = None
+    ):
+        """Send a structured event to the WebSocket client (JSON unless a codec is given)"""
+        ws.send((codec or EventCodec()).encode(event_type, data, request_id))
     
-    def _send_error(self, ws, error_message: str):
+    def _send_error(
+        self,
+        ws,
+        error_message: str,
+        request_id: Optional[str] = None,
+        codec: Optional[EventCodec] = None
+    ):
         """Send an error event to the WebSocket client"""
-        self._send_event(ws, "error", {"message": error_message})
+        self._send_event(ws, "error", {"message": error_message}, request_id, codec)
     
-    async def _process_stream(self, ws, prompt: str, client_id: str, context: Dict[str, Any]):
+    def _stream_request(
+        self,
+        ws,
+        prompt: str,
+        client_id,
+        context: Dict[str, Any],
+        request_id: Optional[str],
+        codec: EventCodec
+    ):
         """
-        Process streaming response from orchestrator
+        Run one prompt: the orchestrator streams on the shared loop thread
+        into a coalescing buffer that this thread drains to the socket
         """
+        sender = ThreadedEventSender(ws.send, codec)
+        
+        producer = self.loop_thread.submit(
+            stream_to_sender(self.orchestrator, sender, prompt, client_id, context, request_id)
+        )
+        producer.add_done_callback(lambda _: sender.close())
         try:
-            # Get streaming generator from orchestrator
-            stream_generator = self.orchestrator.invoke_stream(
-                prompt=prompt,
-                client_id=client_id,
-                context=context
-            )
-            
-            # Process each event from the stream
-            async for event in stream_generator:
-                event_type = event.get('type')
-                
-                if event_type == 'token':
-                    # Stream content tokens
-                    self._send_event(ws, 'token', {
-                        'content': event.get('content', '')
-                    })
-                
-                elif event_type == 'tool' or event_type == 'tool_use_start':
-                    # Notify about tool execution
-                    self._send_event(ws, 'tool', {
-                        'tool_name': event.get('tool_name') or event.get('data', {}).get('tool_name'),
-                        'status': event.get('status') or event.get('data', {}).get('status', 'running')
-                    })
-                
-                elif event_type == 'routing':
-                    # Send routing information
-                    self._send_event(ws, 'event', {
-                        'message': f"Routed to {event.get('data', {}).get('routed_to')} agent",
-                        'routed_to': event.get('data', {}).get('routed_to')
-                    })
-                
-                elif event_type == 'metadata':
-                    # Send metadata about the response
-                    self._send_event(ws, 'metadata', event.get('data', {}))
-                
-                elif event_type == 'complete':
-                    # Send completion event
-                    self._send_event(ws, 'complete', {
-                        'message': 'Agent processing completed',
-                        'stop_reason': event.get('stop_reason', 'end_turn')
-                    })
-                
-                elif event_type == 'error':
-                    # Handle errors
-                    self._send_error(ws, event.get('data', {}).get('message', 'Unknown error'))
+            sender.run()
+        finally:
+            # Stop the run if the socket went away before it finished
+            producer.cancel()
+    
+    def _stream_shared(
+        self,
+        ws,
+        key: Tuple[Optional[str], str],
+        prompt: Optional[str],
+        context: Dict[str, Any],
+        request_id: Optional[str],
+        codec: EventCodec
+    ):
+        """
+        Watch the shared run for `key` (starting it if there is none and a
+        prompt was given); this thread drains its events to the socket
+        """
+        client_id, session = key
+        sender = ThreadedEventSender(ws.send, codec)
+        run = shared_run(self.orchestrator, prompt, client_id, context) if prompt else None
         
-        except Exception as e:
-            self._send_error(ws, f"Streaming error: {str(e)}")
-
+        subscription = self.hub.attach(
+            key,
+            run,
+            lambda event_type, data: sender.push(event_type, data, request_id),
+            sender.close
+        )
+        if subscription is None:
+            self._send_error(ws, f"No active run for session '{session}'", request_id, codec)
+            return
+        
+        try:
+            sender.run()
+        finally:
+            self.hub.detach(subscription)
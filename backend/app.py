@@ -14,16 +14,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def create_app():
-    """Application factory"""
-    app = Flask(__name__)
-    
-    # Configure CORS
-    CORS(app, resources={
-        r"/api/*": {"origins": config.CORS_ORIGINS},
-        r"/ws/*": {"origins": config.CORS_ORIGINS}
-    })
-    
+def _create_orchestrator() -> OrchestratorAgent:
+    """Build the Bedrock model and orchestrator shared by both serving modes"""
     # Initialize Bedrock Model (Phase 2)
     logger.info("Initializing Bedrock model...")
     bedrock_model = BedrockModel(
@@ -34,22 +26,85 @@ def create_app():
     logger.info(f"AWS Region: {config.AWS_REGION}")
     
     # Initialize Orchestrator with Bedrock model
-    orchestrator = OrchestratorAgent(bedrock_model=bedrock_model)
-    
-    # Initialize API endpoints and WebSocket handler
-    agent_api = AgentAPI(app, orchestrator)
-    websocket_handler = WebSocketHandler(app, orchestrator)
-    
+    return OrchestratorAgent(bedrock_model=bedrock_model)
+
+def _log_startup():
     logger.info("✅ RMM Agent Backend initialized")
     logger.info(f"🔧 MOCK_MODE: {config.MOCK_MODE}")
     logger.info(f"🌐 API Host: {config.API_HOST}:{config.API_PORT}")
     logger.info(f"🔒 CORS Origins: {config.CORS_ORIGINS}")
     logger.info(f"🛡️ Guardrails: {config.BEDROCK_GUARDRAIL_ID or 'Not configured'}")
+
+def create_app():
+    """Application factory"""
+    app = Flask(__name__)
+    
+    # Configure CORS
+    CORS(app, resources={
+        r"/api/*": {"origins": config.CORS_ORIGINS},
+        r"/ws/*": {"origins": config.CORS_ORIGINS}
+    })
+    
+    orchestrator = _create_orchestrator()
+    
+    # Initialize API endpoints and WebSocket handler
+    agent_api = AgentAPI(app, orchestrator)
+    websocket_handler = WebSocketHandler(app, orchestrator)
+    
+    _log_startup()
+    
+    return app
+
+def create_asgi_app():
+    """
+    ASGI application factory
+    
+    Serves the same routes as create_app() from one long-lived event loop
+    with native async WebSockets, e.g.:
+        hypercorn "app:create_asgi_app()" --bind 0.0.0.0:8080
+    """
+    from quart import Quart
+    from quart_cors import cors
+    from api.async_endpoints import AsyncAgentAPI
+    from api.async_websocket_handler import AsyncWebSocketHandler
+    
+    app = cors(Quart(__name__), allow_origin=config.CORS_ORIGINS)
+    
+    orchestrator = _create_orchestrator()
+    
+    # Initialize API endpoints and WebSocket handler
+    agent_api = AsyncAgentAPI(app, orchestrator)
+    websocket_handler = AsyncWebSocketHandler(app, orchestrator)
+    
+    _log_startup()
+    logger.info("⚡ Serving mode: ASGI")
     
     return app
 
+def _serve_asgi():
+    """Run the ASGI app under Hypercorn on a single event loop"""
+    import asyncio
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config as HypercornConfig
+    
+    app = create_asgi_app()
+    
+    hypercorn_config = HypercornConfig()
+    hypercorn_config.bind = [f"{config.API_HOST}:{config.API_PORT}"]
+    hypercorn_config.loglevel = config.LOG_LEVEL
+    
+    logger.info("Starting RMM Agent Backend (ASGI)...")
+    logger.info(f"Access at: http://{config.API_HOST}:{config.API_PORT}")
+    logger.info(f"Health check: http://{config.API_HOST}:{config.API_PORT}/health")
+    
+    asyncio.run(serve(app, hypercorn_config))
+
 def main():
     """Main entry point"""
+    if config.SERVER_MODE == "asgi":
+        _serve_asgi()
+        return
+    
     app = create_app()
     
     logger.info("Starting RMM Agent Backend...")
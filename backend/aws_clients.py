@@ -0,0 +1,183 @@
+"""Process-wide boto3 client registry shared by tools and Bedrock integration"""
+import threading
+from typing import Dict, Any, Optional, Tuple
+import boto3
+from botocore.config import Config as BotocoreConfig
+from config import config
+
+# Per-service botocore overrides. Bedrock retries are handled by
+# bedrock.resilience (rate limit, jittered backoff, circuit breaker), so
+# botocore must not retry underneath it.
+SERVICE_CONFIG: Dict[str, Dict[str, Any]] = {
+    "bedrock-runtime": {"retries": {"max_attempts": 1, "mode": "standard"}},
+}
+
+
+class _ClientStats:
+    """Per-client call counters used to report connection pool pressure"""
+
+    def __init__(self, max_pool_connections: int):
+        self.max_pool_connections = max_pool_connections
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.calls = 0
+        self.saturation_events = 0
+        self._lock = threading.Lock()
+
+    def on_call_start(self, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.in_flight > self.max_pool_connections:
+                self.saturation_events += 1
+
+    def on_call_end(self, **kwargs):
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "max_pool_connections": self.max_pool_connections,
+            "pool_utilization": round(self.peak_in_flight / self.max_pool_connections, 2),
+            "saturation_events": self.saturation_events
+        }
+
+
+class ClientRegistry:
+    """
+    Thread-safe cache of boto3 sessions and clients.
+
+    Clients are keyed by (service, region, access key) and reused across tool
+    invocations, so credential resolution, endpoint loading and TLS handshakes
+    happen once per key instead of once per call. boto3 clients are
+    thread-safe; only session/client construction is serialized.
+    """
+
+    def __init__(self, max_pool_connections: Optional[int] = None):
+        """
+        Initialize the registry
+
+        Args:
+            max_pool_connections: botocore connection pool size per client (defaults to config)
+        """
+        self.max_pool_connections = max_pool_connections or config.AWS_MAX_POOL_CONNECTIONS
+        self._lock = threading.Lock()
+        self._sessions: Dict[Optional[str], boto3.Session] = {}
+        self._clients: Dict[Tuple[str, str, Optional[str]], Any] = {}
+        self._client_stats: Dict[Tuple[str, str, Optional[str]], _ClientStats] = {}
+        self.hits = 0
+        self.creations = 0
+
+    def get_session(
+        self,
+        aws_access_key_id: Optional[str] = None,
+        aws_secret_access_key: Optional[str] = None,
+        aws_session_token: Optional[str] = None
+    ) -> boto3.Session:
+        """Return the cached boto3 session for a set of credentials"""
+        with self._lock:
+            return self._get_session_locked(aws_access_key_id, aws_secret_access_key, aws_session_token)
+
+    def _get_session_locked(self, aws_access_key_id, aws_secret_access_key, aws_session_token) -> boto3.Session:
+        session = self._sessions.get(aws_access_key_id)
+        if session is None:
+            session = boto3.Session(
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                aws_session_token=aws_session_token
+            )
+            self._sessions[aws_access_key_id] = session
+        return session
+
+    def get_client(
+        self,
+        service_name: str,
+        region_name: Optional[str] = None,
+        aws_access_key_id: Optional[str] = None,
+        aws_secret_access_key: Optional[str] = None,
+        aws_session_token: Optional[str] = None
+    ):
+        """
+        Return a shared boto3 client, creating it on first use
+
+        Args:
+            service_name: AWS service (e.g. 'cloudwatch', 'ec2', 'ssm', 'bedrock-runtime')
+            region_name: AWS region (defaults to config)
+            aws_access_key_id: Explicit credentials; omitted means the default chain
+
+        Returns:
+            boto3 client
+        """
+        region_name = region_name or config.AWS_REGION
+        key = (service_name, region_name, aws_access_key_id)
+
+        client = self._clients.get(key)
+        if client is not None:
+            with self._lock:
+                self.hits += 1
+            return client
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+
+            session = self._get_session_locked(aws_access_key_id, aws_secret_access_key, aws_session_token)
+            client = session.client(
+                service_name,
+                region_name=region_name,
+                config=BotocoreConfig(
+                    max_pool_connections=self.max_pool_connections,
+                    **SERVICE_CONFIG.get(service_name, {})
+                )
+            )
+
+            stats = _ClientStats(self.max_pool_connections)
+            client.meta.events.register('before-call', stats.on_call_start)
+            client.meta.events.register('after-call', stats.on_call_end)
+            client.meta.events.register('after-call-error', stats.on_call_end)
+
+            self._clients[key] = client
+            self._client_stats[key] = stats
+            self.creations += 1
+            return client
+
+    def stats(self) -> Dict[str, Any]:
+        """Report cache hits, client creations and per-client pool pressure"""
+        with self._lock:
+            clients = {
+                f"{service}:{region}": stats.to_dict()
+                for (service, region, _), stats in self._client_stats.items()
+            }
+            return {
+                "hits": self.hits,
+                "creations": self.creations,
+                "sessions": len(self._sessions),
+                "max_pool_connections": self.max_pool_connections,
+                "clients": clients
+            }
+
+    def clear(self):
+        """Drop all cached sessions and clients"""
+        with self._lock:
+            self._sessions.clear()
+            self._clients.clear()
+            self._client_stats.clear()
+
+
+registry = ClientRegistry()
+
+
+def get_client(service_name: str, region_name: Optional[str] = None, **credentials):
+    """Return a shared boto3 client from the process-wide registry"""
+    return registry.get_client(service_name, region_name=region_name, **credentials)
+
+
+def get_session(**credentials) -> boto3.Session:
+    """Return the shared boto3 session from the process-wide registry"""
+    return registry.get_session(**credentials)
@@ -1,9 +1,26 @@
 """Bedrock integration package"""
 from .bedrock_model import BedrockModel
-from .streaming import StreamingHandler
+from .streaming import StreamingHandler, aiter_in_thread, model_stream
+from .async_client import AsyncBedrockClient, BedrockAsyncError, get_async_client
+from .response_cache import ResponseCache, response_cache
+from .coalescing import InFlightCalls, inflight_calls
+from .resilience import BedrockResilience, CircuitBreaker, ModelUnavailableError, bedrock_resilience
 
 __all__ = [
     'BedrockModel',
     'StreamingHandler',
+    'aiter_in_thread',
+    'model_stream',
+    'AsyncBedrockClient',
+    'BedrockAsyncError',
+    'get_async_client',
+    'ResponseCache',
+    'response_cache',
+    'BedrockResilience',
+    'CircuitBreaker',
+    'ModelUnavailableError',
+    'bedrock_resilience',
+    'InFlightCalls',
+    'inflight_calls',
 ]
 
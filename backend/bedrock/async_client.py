@@ -0,0 +1,206 @@
+"""Async Bedrock runtime client backed by a pooled HTTP connection"""
+import asyncio
+import base64
+import json
+import weakref
+from typing import Dict, Any, AsyncIterator, Optional
+from urllib.parse import quote
+
+import httpx
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.eventstream import EventStreamBuffer
+from config import config
+from aws_clients import get_session
+
+
+class BedrockAsyncError(Exception):
+    """Raised when the Bedrock runtime returns an error response"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, error_type: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.error_type = error_type
+
+
+class AsyncBedrockClient:
+    """
+    Minimal async client for the Bedrock runtime InvokeModel APIs.
+
+    Requests are SigV4-signed with botocore and sent over a shared httpx
+    connection pool, so many model calls can be in flight on one event loop
+    without holding a thread each. Pointing `endpoint_url` at a local
+    stand-in server makes the client usable offline.
+    """
+
+    def __init__(
+        self,
+        region: Optional[str] = None,
+        endpoint_url: Optional[str] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        timeout: Optional[float] = None,
+        credentials=None
+    ):
+        """
+        Initialize the async client
+
+        Args:
+            region: AWS region (defaults to config)
+            endpoint_url: Override the Bedrock runtime endpoint (defaults to config)
+            max_connections: Upper bound on open connections in the pool
+            max_keepalive_connections: Idle connections kept alive for reuse
+            keepalive_expiry: Seconds an idle connection is kept before closing
+            timeout: Per-request timeout in seconds
+            credentials: botocore credentials used for signing (resolved lazily if omitted)
+        """
+        self.region = region or config.AWS_REGION
+        self.endpoint_url = (
+            endpoint_url
+            or config.BEDROCK_ENDPOINT_URL
+            or f"https://bedrock-runtime.{self.region}.amazonaws.com"
+        ).rstrip('/')
+        self.limits = httpx.Limits(
+            max_connections=max_connections or config.BEDROCK_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive_connections or config.BEDROCK_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=keepalive_expiry if keepalive_expiry is not None else config.BEDROCK_KEEPALIVE_EXPIRY
+        )
+        self.timeout = timeout if timeout is not None else config.BEDROCK_REQUEST_TIMEOUT
+        self._credentials = credentials
+
+        # httpx pools are bound to the loop they were opened on, so keep one per loop
+        self._pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+    def _get_pool(self) -> httpx.AsyncClient:
+        """Return the connection pool for the running event loop"""
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None or pool.is_closed:
+            pool = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                http2=False
+            )
+            self._pools[loop] = pool
+        return pool
+
+    def _get_credentials(self):
+        """Resolve AWS credentials once; None means requests go out unsigned"""
+        if self._credentials is None:
+            session_credentials = get_session().get_credentials()
+            self._credentials = session_credentials or False
+        return self._credentials or None
+
+    def _signed_headers(self, url: str, payload: bytes, accept: str) -> Dict[str, str]:
+        """Build request headers, adding a SigV4 signature when credentials exist"""
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": accept
+        }
+
+        credentials = self._get_credentials()
+        if credentials is None:
+            return headers
+
+        aws_request = AWSRequest(method="POST", url=url, data=payload, headers=headers)
+        SigV4Auth(credentials.get_frozen_credentials(), "bedrock", self.region).add_auth(aws_request)
+        return dict(aws_request.headers.items())
+
+    def _url(self, model_id: str, operation: str) -> str:
+        return f"{self.endpoint_url}/model/{quote(model_id, safe='')}/{operation}"
+
+    async def invoke_model(self, model_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Call InvokeModel and return the decoded JSON response body
+
+        Args:
+            model_id: Bedrock model identifier
+            body: Anthropic messages request body
+
+        Returns:
+            Parsed response body
+        """
+        url = self._url(model_id, "invoke")
+        payload = json.dumps(body).encode()
+        headers = self._signed_headers(url, payload, "application/json")
+
+        response = await self._get_pool().post(url, content=payload, headers=headers)
+        if response.status_code >= 400:
+            raise self._error_from_response(response.status_code, response.headers, response.content)
+
+        return response.json()
+
+    async def invoke_model_stream(self, model_id: str, body: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Call InvokeModelWithResponseStream and yield decoded model chunks
+
+        Args:
+            model_id: Bedrock model identifier
+            body: Anthropic messages request body
+
+        Yields:
+            Each chunk payload as a dict (Anthropic streaming event)
+        """
+        url = self._url(model_id, "invoke-with-response-stream")
+        payload = json.dumps(body).encode()
+        headers = self._signed_headers(url, payload, "application/vnd.amazon.eventstream")
+
+        async with self._get_pool().stream("POST", url, content=payload, headers=headers) as response:
+            if response.status_code >= 400:
+                content = await response.aread()
+                raise self._error_from_response(response.status_code, response.headers, content)
+
+            buffer = EventStreamBuffer()
+            async for data in response.aiter_bytes():
+                buffer.add_data(data)
+                for message in buffer:
+                    headers = message.headers
+                    if headers.get(':message-type') in ('exception', 'error'):
+                        raise self._error_from_event(message)
+                    if headers.get(':event-type') != 'chunk':
+                        continue
+
+                    event = json.loads(message.payload)
+                    yield json.loads(base64.b64decode(event['bytes']))
+
+    def _error_from_response(self, status_code: int, headers, content: bytes) -> BedrockAsyncError:
+        """Convert an HTTP error response into a BedrockAsyncError"""
+        error_type = headers.get('x-amzn-errortype', '').split(':')[0] or None
+        try:
+            message = json.loads(content).get('message', '')
+        except (ValueError, AttributeError):
+            message = content.decode(errors='replace')
+        return BedrockAsyncError(
+            f"{error_type or 'HTTPError'} ({status_code}): {message}",
+            status_code=status_code,
+            error_type=error_type
+        )
+
+    def _error_from_event(self, message) -> BedrockAsyncError:
+        """Convert a mid-stream exception frame into a BedrockAsyncError"""
+        headers = message.headers
+        # Stream frames name errors in lower camel case ("throttlingException")
+        error_type = headers.get(':exception-type') or headers.get(':error-code') or None
+        if error_type:
+            error_type = error_type[:1].upper() + error_type[1:]
+        status_code = message.to_response_dict()['status_code']
+        return self._error_from_response(status_code, {'x-amzn-errortype': error_type or ''}, message.payload)
+
+    async def aclose(self):
+        """Close the pool belonging to the running event loop"""
+        loop = asyncio.get_running_loop()
+        pool = self._pools.pop(loop, None)
+        if pool is not None:
+            await pool.aclose()
+
+
+_shared_client: Optional[AsyncBedrockClient] = None
+
+
+def get_async_client() -> AsyncBedrockClient:
+    """Return the process-wide async Bedrock client"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = AsyncBedrockClient()
+    return _shared_client
@@ -1,20 +1,60 @@
 """Bedrock Model Integration using Anthropic SDK"""
-import boto3
+import asyncio
 import json
-from typing import Dict, Any, Iterator, Optional
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional
 from config import config
+from aws_clients import get_client
+from .async_client import get_async_client
+from .response_cache import response_cache, response_cache_key, cached_response
+from .resilience import ModelUnavailableError, bedrock_resilience
+from .coalescing import inflight_calls, shared_response
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return len(text) // 4
+
+def normalize_usage(usage: Dict[str, Any]) -> Dict[str, Any]:
+    """Usage dict that always reports prompt cache reads/writes alongside token counts"""
+    return {
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_read_input_tokens": 0,
+        "cache_creation_input_tokens": 0,
+        **{key: value for key, value in usage.items() if value is not None}
+    }
+
+def collect_stream_usage(chunk: Dict[str, Any], usage: Dict[str, Any]):
+    """Accumulate usage from streaming chunks (message_start, then message_delta)"""
+    event_type = chunk.get('type')
+    if event_type == 'message_start':
+        usage.update(chunk.get('message', {}).get('usage', {}))
+    elif event_type == 'message_delta':
+        usage.update(chunk.get('usage', {}))
+
+_FALLBACK_TEXT = (
+    "[Fallback] The model is temporarily unavailable ({reason}), so no AI analysis "
+    "was produced. Please retry shortly."
+)
+
+_MOCK_STREAM_TOKENS = [
+    "Analyzing", " your", " request", "...\n\n",
+    "Based", " on", " the", " prompt", ",",
+    " I", " will", " route", " this", " to",
+    " the", " appropriate", " agent", ".\n"
+]
 
 class BedrockModel:
     """
     Wrapper for Amazon Bedrock with Claude Sonnet 4 support.
-    Supports both direct invocation and streaming.
+    Supports both direct invocation and streaming, with blocking (boto3)
+    and async (pooled HTTP) variants of each.
     """
     
     def __init__(
         self,
         model_id: str = None,
         temperature: float = None,
-        max_tokens: int = 2048
+        max_tokens: int = None
     ):
         """
         Initialize Bedrock model
@@ -22,45 +62,32 @@ class BedrockModel:
         Args:
             model_id: Bedrock model identifier (defaults to config)
             temperature: Sampling temperature (defaults to config)
-            max_tokens: Maximum tokens to generate
+            max_tokens: Default maximum tokens to generate; calls may override it (defaults to config)
         """
         self.model_id = model_id or config.BEDROCK_MODEL_ID
         self.temperature = temperature if temperature is not None else config.BEDROCK_TEMPERATURE
-        self.max_tokens = max_tokens
+        self.max_tokens = max_tokens or config.BEDROCK_MAX_TOKENS
         
-        # Initialize Bedrock runtime client
+        # Bedrock runtime client comes from the shared registry
         if not config.MOCK_MODE:
-            self.client = boto3.client(
-                'bedrock-runtime',
-                region_name=config.AWS_REGION
-            )
+            self.client = get_client('bedrock-runtime')
         else:
             self.client = None
+        
+        # Async path shares one connection pool across all model instances
+        self.async_client = get_async_client() if not config.MOCK_MODE else None
     
-    def invoke(
+    def _build_body(
         self,
         prompt: str,
         system: Optional[str] = None,
-        tools: Optional[list] = None
+        tools: Optional[list] = None,
+        max_tokens: Optional[int] = None
     ) -> Dict[str, Any]:
-        """
-        Invoke Bedrock model with a prompt (non-streaming)
-        
-        Args:
-            prompt: User prompt
-            system: System prompt/instructions
-            tools: Tool definitions for function calling
-        
-        Returns:
-            Model response with content and metadata
-        """
-        if config.MOCK_MODE or not self.client:
-            return self._mock_invoke(prompt, system)
-        
-        # Build request body for Claude models
+        """Build the Anthropic messages request body"""
         body = {
             "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": self.max_tokens,
+            "max_tokens": max_tokens or self.max_tokens,
             "temperature": self.temperature,
             "messages": [
                 {
@@ -70,43 +97,164 @@ class BedrockModel:
             ]
         }
         
-        if system:
-            body["system"] = system
+        # Prompt caching: mark stable prefixes (tools, then system) so
+        # Bedrock reuses them across calls. Anthropic caches the prefix up
+        # to each breakpoint, and only once it reaches a minimum size.
+        caching = config.BEDROCK_PROMPT_CACHING
+        prefix_tokens = estimate_tokens(json.dumps(tools)) if tools else 0
         
         if tools:
             body["tools"] = tools
+            if caching and prefix_tokens >= config.BEDROCK_PROMPT_CACHE_MIN_TOKENS:
+                body["tools"] = tools[:-1] + [{**tools[-1], "cache_control": {"type": "ephemeral"}}]
+        
+        if system:
+            body["system"] = system
+            prefix_tokens += estimate_tokens(system)
+            if caching and prefix_tokens >= config.BEDROCK_PROMPT_CACHE_MIN_TOKENS:
+                body["system"] = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
         
         # Add guardrails if configured
         if config.BEDROCK_GUARDRAIL_ID:
             body["guardrailIdentifier"] = config.BEDROCK_GUARDRAIL_ID
             body["guardrailVersion"] = config.BEDROCK_GUARDRAIL_VERSION
         
-        try:
+        return body
+    
+    def _parse_response(self, response_body: Dict[str, Any]) -> Dict[str, Any]:
+        """Convert a raw InvokeModel response body into the model result dict"""
+        return {
+            "content": response_body.get('content', [{}])[0].get('text', ''),
+            "stop_reason": response_body.get('stop_reason'),
+            "usage": normalize_usage(response_body.get('usage', {})),
+            "model": self.model_id
+        }
+    
+    def _request_key(
+        self,
+        prompt: str,
+        system: Optional[str],
+        tools: Optional[list],
+        max_tokens: Optional[int] = None
+    ) -> str:
+        """Hash identifying a request, used for caching and in-flight deduplication"""
+        return response_cache_key(
+            self.model_id, system, prompt, tools, self.temperature, max_tokens or self.max_tokens
+        )
+    
+    def _cache_key(
+        self,
+        prompt: str,
+        system: Optional[str],
+        tools: Optional[list],
+        use_cache: bool,
+        max_tokens: Optional[int] = None
+    ) -> Optional[str]:
+        """Response cache key for a call, or None when caching is bypassed"""
+        if not use_cache or not config.BEDROCK_CACHE_ENABLED:
+            return None
+        return self._request_key(prompt, system, tools, max_tokens)
+    
+    def _with_cache_status(self, result: Dict[str, Any], key: Optional[str]) -> Dict[str, Any]:
+        """Report in usage whether the response cache was missed or bypassed"""
+        return {**result, "usage": {**result["usage"], "response_cache": "miss" if key else "bypass"}}
+    
+    def _parse_stream_chunk(self, chunk: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Convert one Anthropic streaming chunk into a stream event (or None)"""
+        event_type = chunk.get('type')
+        
+        if event_type == 'content_block_delta':
+            delta = chunk.get('delta', {})
+            if delta.get('type') == 'text_delta':
+                return {
+                    "type": "token",
+                    "content": delta.get('text', '')
+                }
+        
+        elif event_type == 'content_block_start':
+            content_block = chunk.get('content_block', {})
+            if content_block.get('type') == 'tool_use':
+                return {
+                    "type": "tool_use_start",
+                    "tool_id": content_block.get('id'),
+                    "tool_name": content_block.get('name')
+                }
+        
+        elif event_type == 'message_stop':
+            return {
+                "type": "complete",
+                "stop_reason": chunk.get('stop_reason', 'end_turn')
+            }
+        
+        return None
+    
+    def invoke(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        tools: Optional[list] = None,
+        use_cache: bool = True,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Invoke Bedrock model with a prompt (non-streaming)
+        
+        Args:
+            prompt: User prompt
+            system: System prompt/instructions
+            tools: Tool definitions for function calling
+            use_cache: Serve/store identical requests from the response cache
+            max_tokens: Output token limit for this call (defaults to the model's)
+        
+        Returns:
+            Model response with content and metadata; usage["response_cache"]
+            is "hit", "miss" or "bypass"
+        """
+        if config.MOCK_MODE or not self.client:
+            return self._mock_invoke(prompt, system)
+        
+        key = self._cache_key(prompt, system, tools, use_cache, max_tokens)
+        if key:
+            cached = response_cache.get(key)
+            if cached:
+                return cached_response(*cached)
+        
+        body = self._build_body(prompt, system, tools, max_tokens)
+        
+        def request() -> Dict[str, Any]:
             response = self.client.invoke_model(
                 modelId=self.model_id,
                 body=json.dumps(body),
                 contentType='application/json',
                 accept='application/json'
             )
+            return json.loads(response['body'].read())
+        
+        def call() -> Dict[str, Any]:
+            try:
+                response_body = bedrock_resilience.call(request)
+            except ModelUnavailableError as e:
+                print(f"Bedrock invocation error ({e.reason}): {e}")
+                return self._fallback_invoke(prompt, system, e)
             
-            response_body = json.loads(response['body'].read())
-            
-            return {
-                "content": response_body.get('content', [{}])[0].get('text', ''),
-                "stop_reason": response_body.get('stop_reason'),
-                "usage": response_body.get('usage', {}),
-                "model": self.model_id
-            }
+            result = self._parse_response(response_body)
+            if key:
+                response_cache.put(key, result)
+            return self._with_cache_status(result, key)
         
-        except Exception as e:
-            print(f"Bedrock invocation error: {e}")
-            return self._mock_invoke(prompt, system)
+        if not config.BEDROCK_DEDUP_ENABLED:
+            return call()
+        
+        # Identical calls already in flight (any thread or loop) are joined, not repeated
+        result, shared = inflight_calls.run(key or self._request_key(prompt, system, tools, max_tokens), call)
+        return shared_response(result) if shared else result
     
     def invoke_stream(
         self,
         prompt: str,
         system: Optional[str] = None,
-        tools: Optional[list] = None
+        tools: Optional[list] = None,
+        max_tokens: Optional[int] = None
     ) -> Iterator[Dict[str, Any]]:
         """
         Stream tokens from Bedrock model
@@ -115,87 +263,182 @@ class BedrockModel:
             prompt: User prompt
             system: System prompt/instructions
             tools: Tool definitions for function calling
+            max_tokens: Output token limit for this call (defaults to the model's)
         
         Yields:
             Dict with token data: {"type": "token", "content": str}
             Dict with tool calls: {"type": "tool_use", "tool": dict}
-            Dict with completion: {"type": "complete", "stop_reason": str}
+            Dict with completion: {"type": "complete", "stop_reason": str, "usage": dict}
         """
         if config.MOCK_MODE or not self.client:
             yield from self._mock_stream(prompt, system)
             return
         
-        # Build request body
-        body = {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": self.max_tokens,
-            "temperature": self.temperature,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        }
-        
-        if system:
-            body["system"] = system
-        
-        if tools:
-            body["tools"] = tools
-        
-        # Add guardrails if configured
-        if config.BEDROCK_GUARDRAIL_ID:
-            body["guardrailIdentifier"] = config.BEDROCK_GUARDRAIL_ID
-            body["guardrailVersion"] = config.BEDROCK_GUARDRAIL_VERSION
+        body = self._build_body(prompt, system, tools, max_tokens)
         
-        try:
+        def open_stream() -> Iterator[Dict[str, Any]]:
             response = self.client.invoke_model_with_response_stream(
                 modelId=self.model_id,
                 body=json.dumps(body),
                 contentType='application/json',
                 accept='application/json'
             )
-            
-            # Process streaming response
             for event in response['body']:
-                chunk = json.loads(event['chunk']['bytes'].decode())
-                
-                event_type = chunk.get('type')
-                
-                if event_type == 'content_block_delta':
-                    delta = chunk.get('delta', {})
-                    if delta.get('type') == 'text_delta':
-                        yield {
-                            "type": "token",
-                            "content": delta.get('text', '')
-                        }
-                
-                elif event_type == 'content_block_start':
-                    content_block = chunk.get('content_block', {})
-                    if content_block.get('type') == 'tool_use':
-                        yield {
-                            "type": "tool_use_start",
-                            "tool_id": content_block.get('id'),
-                            "tool_name": content_block.get('name')
-                        }
-                
-                elif event_type == 'message_stop':
-                    yield {
-                        "type": "complete",
-                        "stop_reason": chunk.get('stop_reason', 'end_turn')
-                    }
-        
-        except Exception as e:
-            print(f"Bedrock streaming error: {e}")
-            yield from self._mock_stream(prompt, system)
+                yield json.loads(event['chunk']['bytes'].decode())
+        
+        usage: Dict[str, Any] = {}
+        streamed = False
+        try:
+            for chunk in bedrock_resilience.stream(open_stream):
+                collect_stream_usage(chunk, usage)
+                stream_event = self._parse_stream_chunk(chunk)
+                if stream_event:
+                    if stream_event["type"] == "complete":
+                        stream_event["usage"] = normalize_usage(usage)
+                    streamed = True
+                    yield stream_event
+        
+        except ModelUnavailableError as e:
+            print(f"Bedrock streaming error ({e.reason}): {e}")
+            yield from self._fallback_events(e, streamed)
+    
+    async def ainvoke(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        tools: Optional[list] = None,
+        use_cache: bool = True,
+        max_tokens: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Invoke Bedrock model without blocking the event loop
+        
+        Args:
+            prompt: User prompt
+            system: System prompt/instructions
+            tools: Tool definitions for function calling
+            use_cache: Serve/store identical requests from the response cache
+            max_tokens: Output token limit for this call (defaults to the model's)
+        
+        Returns:
+            Model response with content and metadata (same shape as invoke)
+        """
+        if config.MOCK_MODE or not self.async_client:
+            return self._mock_invoke(prompt, system)
+        
+        key = self._cache_key(prompt, system, tools, use_cache, max_tokens)
+        if key:
+            cached = await response_cache.aget(key)
+            if cached:
+                return cached_response(*cached)
+        
+        body = self._build_body(prompt, system, tools, max_tokens)
+        
+        async def call() -> Dict[str, Any]:
+            try:
+                response_body = await bedrock_resilience.acall(
+                    lambda: self.async_client.invoke_model(self.model_id, body)
+                )
+            except ModelUnavailableError as e:
+                print(f"Bedrock async invocation error ({e.reason}): {e}")
+                return self._fallback_invoke(prompt, system, e)
+            
+            result = self._parse_response(response_body)
+            if key:
+                await response_cache.aput(key, result)
+            return self._with_cache_status(result, key)
+        
+        if not config.BEDROCK_DEDUP_ENABLED:
+            return await call()
+        
+        result, shared = await inflight_calls.arun(key or self._request_key(prompt, system, tools, max_tokens), call)
+        return shared_response(result) if shared else result
+    
+    async def ainvoke_stream(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        tools: Optional[list] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream tokens from Bedrock model without blocking the event loop
+        
+        Args:
+            prompt: User prompt
+            system: System prompt/instructions
+            tools: Tool definitions for function calling
+            max_tokens: Output token limit for this call (defaults to the model's)
+        
+        Yields:
+            Same events as invoke_stream
+        """
+        if config.MOCK_MODE or not self.async_client:
+            async for event in self._amock_stream(prompt, system):
+                yield event
+            return
+        
+        body = self._build_body(prompt, system, tools, max_tokens)
+        
+        usage: Dict[str, Any] = {}
+        streamed = False
+        try:
+            async for chunk in bedrock_resilience.astream(
+                lambda: self.async_client.invoke_model_stream(self.model_id, body)
+            ):
+                collect_stream_usage(chunk, usage)
+                stream_event = self._parse_stream_chunk(chunk)
+                if stream_event:
+                    if stream_event["type"] == "complete":
+                        stream_event["usage"] = normalize_usage(usage)
+                    streamed = True
+                    yield stream_event
+        
+        except ModelUnavailableError as e:
+            print(f"Bedrock async streaming error ({e.reason}): {e}")
+            for event in self._fallback_events(e, streamed):
+                yield event
+    
+    def _fallback_invoke(self, prompt: str, system: Optional[str], error: ModelUnavailableError) -> Dict[str, Any]:
+        """Flagged stand-in response for a failed call (or raise, per BEDROCK_FALLBACK)"""
+        if config.BEDROCK_FALLBACK == "error":
+            raise error
+        return {
+            "content": _FALLBACK_TEXT.format(reason=error.reason),
+            "stop_reason": "fallback",
+            "usage": normalize_usage({}),
+            "model": self.model_id,
+            "fallback": {"reason": error.reason, "error": str(error)}
+        }
+    
+    def _fallback_events(self, error: ModelUnavailableError, streamed: bool) -> List[Dict[str, Any]]:
+        """
+        Stream events standing in for a failed stream (or raise, per
+        BEDROCK_FALLBACK). Output already delivered is not padded.
+        """
+        if config.BEDROCK_FALLBACK == "error":
+            raise error
+        events = [{
+            "type": "fallback",
+            "reason": error.reason,
+            "message": f"Bedrock unavailable ({error.reason}): {error}"
+        }]
+        if not streamed:
+            events.append({"type": "token", "content": _FALLBACK_TEXT.format(reason=error.reason)})
+        events.append({
+            "type": "complete",
+            "stop_reason": "fallback",
+            "usage": normalize_usage({}),
+            "fallback": {"reason": error.reason, "error": str(error)}
+        })
+        return events
     
     def _mock_invoke(self, prompt: str, system: Optional[str] = None) -> Dict[str, Any]:
         """Mock invocation for development/testing"""
         return {
             "content": f"[Mock Mode] Processed prompt: {prompt[:100]}...",
             "stop_reason": "end_turn",
-            "usage": {"input_tokens": 50, "output_tokens": 100},
+            "usage": normalize_usage({"input_tokens": 50, "output_tokens": 100}),
             "model": self.model_id
         }
     
@@ -203,16 +446,17 @@ class BedrockModel:
         """Mock streaming for development/testing"""
         import time
         
-        tokens = [
-            "Analyzing", " your", " request", "...\n\n",
-            "Based", " on", " the", " prompt", ",",
-            " I", " will", " route", " this", " to",
-            " the", " appropriate", " agent", ".\n"
-        ]
-        
-        for token in tokens:
+        for token in _MOCK_STREAM_TOKENS:
             yield {"type": "token", "content": token}
             time.sleep(0.05)  # Simulate streaming delay
         
         yield {"type": "complete", "stop_reason": "end_turn"}
+    
+    async def _amock_stream(self, prompt: str, system: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async mock streaming for development/testing"""
+        for token in _MOCK_STREAM_TOKENS:
+            yield {"type": "token", "content": token}
+            await asyncio.sleep(0.05)  # Simulate streaming delay
+        
+        yield {"type": "complete", "stop_reason": "end_turn"}
 
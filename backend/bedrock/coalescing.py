@@ -0,0 +1,123 @@
+"""In-flight deduplication of identical concurrent model calls"""
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Result handed to followers when the leading call was abandoned (cancelled
+# or interrupted) rather than failed: they make the call themselves
+_RERUN = object()
+
+
+class InFlightCalls:
+    """
+    Shares one pending call among identical concurrent requests.
+
+    The first caller for a key (the leader) runs the call; callers arriving
+    while it is pending wait for its result or error instead of issuing
+    their own. Futures are thread-safe, so waiters may sit on other event
+    loops or threads than the leader.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, concurrent.futures.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def run(self, key: str, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """
+        Run a blocking call, or wait for the identical one in flight
+
+        Returns:
+            (result, shared) where shared is True if another caller's call was reused
+        """
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            result = future.result()
+            if result is not _RERUN:
+                return result, True
+
+        try:
+            result = fn()
+        except Exception as e:
+            self._settle(key, future, error=e)
+            raise
+        except BaseException:
+            self._settle(key, future)
+            raise
+        self._settle(key, future, result)
+        return result, False
+
+    async def arun(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Awaitable run(); waiting does not block the event loop"""
+        while True:
+            future, leader = self._join(key)
+            if leader:
+                break
+            # Shielded: a waiter being cancelled must not cancel the shared call
+            result = await asyncio.shield(asyncio.wrap_future(future))
+            if result is not _RERUN:
+                return result, True
+
+        try:
+            result = await fn()
+        except Exception as e:
+            self._settle(key, future, error=e)
+            raise
+        except BaseException:
+            self._settle(key, future)
+            raise
+        self._settle(key, future, result)
+        return result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced
+            }
+
+    def _join(self, key: str) -> Tuple[concurrent.futures.Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = concurrent.futures.Future()
+            self._calls[key] = future
+            self.leaders += 1
+            return future, True
+
+    def _settle(self, key: str, future: concurrent.futures.Future, result: Any = _RERUN, error: BaseException = None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+inflight_calls = InFlightCalls()
+
+
+def shared_response(value: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of a response obtained by joining another caller's call: no tokens
+    were spent for this caller, and the call's usage is kept under `shared_usage`
+    """
+    return {
+        **value,
+        "usage": {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "coalesced": True,
+            "shared_usage": value.get("usage", {})
+        }
+    }
@@ -0,0 +1,375 @@
+"""Client-side rate limiting, retries and circuit breaking for Bedrock calls"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, Optional, Tuple, TypeVar
+
+import httpx
+from botocore.exceptions import ClientError, ConnectionError as BotocoreConnectionError, ReadTimeoutError
+from config import config
+from .async_client import BedrockAsyncError
+
+T = TypeVar("T")
+
+# Error codes worth retrying after a pause; anything else (validation,
+# access denied, unknown model) fails the same way every time
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class ModelUnavailableError(Exception):
+    """Raised when a Bedrock call is shed, throttled out or fails for good"""
+
+    def __init__(self, message: str, reason: str, cause: Optional[BaseException] = None):
+        """
+        Args:
+            message: Human readable description
+            reason: "circuit_open", "throttled" or "error"
+            cause: Underlying exception, if any
+        """
+        super().__init__(message)
+        self.reason = reason
+        self.cause = cause
+
+
+def error_code(error: BaseException) -> Optional[str]:
+    """Bedrock error code of an exception from either client, if it has one"""
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code")
+    if isinstance(error, BedrockAsyncError):
+        return error.error_type
+    return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """True for throttling, transient server errors and network failures"""
+    if error_code(error) in RETRYABLE_ERROR_CODES:
+        return True
+    if isinstance(error, BedrockAsyncError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    if isinstance(error, ClientError):
+        return error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TransportError, BotocoreConnectionError, ReadTimeoutError))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests per second, bursts up to `burst`.
+
+    reserve() always succeeds and returns how long the caller must wait
+    for its token, so waiting can be a sleep or an await.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token; returns seconds until it is actually available"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class CircuitBreaker:
+    """
+    Opens when the error rate over the last `window` seconds crosses
+    `threshold` (after at least `min_calls` calls), rejecting calls for
+    `cooldown` seconds. Then a single probe call is let through: success
+    closes the circuit, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold: float, window: float, min_calls: int, cooldown: float):
+        self.threshold = threshold
+        self.window = window
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+
+        self.state = self.CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go out now"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    self.rejected += 1
+                    return False
+                self._probing = True
+            return True
+
+    def release(self):
+        """Forget an allowed call whose outcome is unknown (cancelled or abandoned)"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def record(self, success: bool):
+        """Record the outcome of an allowed call"""
+        with self._lock:
+            now = time.monotonic()
+
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+                if success:
+                    self.state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._trip(now)
+                return
+
+            self._outcomes.append((now, success))
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._outcomes.popleft()
+
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.threshold:
+                self._trip(now)
+
+    def _trip(self, now: float):
+        self.state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.trips += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_calls": len(self._outcomes),
+                "recent_failures": sum(1 for _, ok in self._outcomes if not ok),
+                "trips": self.trips,
+                "rejected": self.rejected
+            }
+
+
+class BedrockResilience:
+    """
+    Wraps Bedrock calls with rate limiting, retries and a circuit breaker.
+
+    Each attempt first passes the breaker, then waits for a token-bucket
+    slot. Retryable failures are retried with full-jitter exponential
+    backoff; other failures and exhausted retries raise
+    ModelUnavailableError. Only retryable failures (throttling, 5xx,
+    transport errors) count toward the breaker's error rate. Streams are
+    only retried before their first chunk, since delivered output cannot
+    be taken back.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        base_delay: Optional[float] = None,
+        max_delay: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        """
+        Args:
+            rate: Requests per second allowed to Bedrock; 0 disables limiting (defaults to config)
+            burst: Requests allowed back to back (defaults to config)
+            max_retries: Retries after the first attempt (defaults to config)
+            base_delay: Backoff before the first retry, in seconds (defaults to config)
+            max_delay: Backoff cap in seconds (defaults to config)
+            breaker: Circuit breaker (defaults to one built from config)
+        """
+        self.bucket = TokenBucket(
+            rate if rate is not None else config.BEDROCK_RATE_LIMIT,
+            burst or config.BEDROCK_RATE_BURST
+        )
+        self.max_retries = max_retries if max_retries is not None else config.BEDROCK_MAX_RETRIES
+        self.base_delay = base_delay if base_delay is not None else config.BEDROCK_RETRY_BASE_DELAY
+        self.max_delay = max_delay if max_delay is not None else config.BEDROCK_RETRY_MAX_DELAY
+        self.breaker = breaker or CircuitBreaker(
+            threshold=config.BEDROCK_BREAKER_ERROR_RATE,
+            window=config.BEDROCK_BREAKER_WINDOW,
+            min_calls=config.BEDROCK_BREAKER_MIN_CALLS,
+            cooldown=config.BEDROCK_BREAKER_COOLDOWN
+        )
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """Run a blocking call under the policy"""
+        attempt = 0
+        while True:
+            wait = self._admit()
+            try:
+                time.sleep(wait)
+                result = fn()
+            except Exception as e:
+                delay = self._failed(e, attempt)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record(True)
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run an async call under the policy without blocking the loop"""
+        attempt = 0
+        while True:
+            wait = self._admit()
+            try:
+                await asyncio.sleep(wait)
+                result = await fn()
+            except Exception as e:
+                delay = self._failed(e, attempt)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record(True)
+            return result
+
+    def stream(self, open_stream: Callable[[], Iterator[T]]) -> Iterator[T]:
+        """Iterate a blocking stream under the policy"""
+        attempt = 0
+        while True:
+            wait = self._admit()
+            started = False
+            try:
+                time.sleep(wait)
+                for item in open_stream():
+                    started = True
+                    yield item
+            except Exception as e:
+                if started:
+                    self._record_error(e)
+                    self._give_up(e)
+                delay = self._failed(e, attempt)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # Consumer stopped early (or was cancelled)
+                self.breaker.release()
+                raise
+            self.breaker.record(True)
+            return
+
+    async def astream(self, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Iterate an async stream under the policy"""
+        attempt = 0
+        while True:
+            wait = self._admit()
+            started = False
+            try:
+                await asyncio.sleep(wait)
+                async for item in open_stream():
+                    started = True
+                    yield item
+            except Exception as e:
+                if started:
+                    self._record_error(e)
+                    self._give_up(e)
+                delay = self._failed(e, attempt)
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # Consumer stopped early (or was cancelled)
+                self.breaker.release()
+                raise
+            self.breaker.record(True)
+            return
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "calls": self.calls,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttled": self.throttled,
+                "rate_limit": self.bucket.rate,
+                "max_retries": self.max_retries
+            }
+        stats["breaker"] = self.breaker.stats()
+        return stats
+
+    def _admit(self) -> float:
+        """Check the breaker and reserve a rate-limit slot; returns seconds to wait"""
+        if not self.breaker.allow():
+            raise ModelUnavailableError("Bedrock circuit breaker is open; call shed", "circuit_open")
+        with self._lock:
+            self.calls += 1
+        return self.bucket.reserve()
+
+    def _failed(self, error: Exception, attempt: int) -> float:
+        """Record a failed attempt; returns the backoff before retrying or raises"""
+        self._record_error(error)
+        throttled = error_code(error) in ("ThrottlingException", "TooManyRequestsException")
+        with self._lock:
+            if throttled:
+                self.throttled += 1
+
+        if not is_retryable(error) or attempt >= self.max_retries:
+            self._give_up(error)
+
+        with self._lock:
+            self.retries += 1
+        return self.backoff(attempt)
+
+    def _record_error(self, error: Exception):
+        """Count a failure toward the breaker only if it reflects service health"""
+        if is_retryable(error):
+            self.breaker.record(False)
+        else:
+            # A rejected request (bad input, no access) says nothing about the service
+            self.breaker.release()
+
+    def _give_up(self, error: Exception):
+        with self._lock:
+            self.failures += 1
+        reason = "throttled" if error_code(error) in ("ThrottlingException", "TooManyRequestsException") else "error"
+        raise ModelUnavailableError(str(error), reason, error) from error
+
+
+bedrock_resilience = BedrockResilience()
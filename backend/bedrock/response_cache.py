@@ -0,0 +1,274 @@
+"""Exact-match cache for non-streaming Bedrock responses"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from config import config
+
+
+def _normalize_text(text: Optional[str]) -> str:
+    """Collapse whitespace so formatting-only differences share a key"""
+    return " ".join((text or "").split())
+
+
+def response_cache_key(
+    model_id: str,
+    system: Optional[str],
+    prompt: str,
+    tools: Optional[list],
+    temperature: float,
+    max_tokens: int
+) -> str:
+    """Hash of everything that shapes a model response"""
+    material = json.dumps(
+        {
+            "model_id": model_id,
+            "system": _normalize_text(system),
+            "prompt": _normalize_text(prompt),
+            "tools": tools or [],
+            "temperature": round(float(temperature), 4),
+            "max_tokens": max_tokens
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("value", "size", "created_at", "expires_at")
+
+    def __init__(self, value: Dict[str, Any], size: int, created_at: float, expires_at: float):
+        self.value = value
+        self.size = size
+        self.created_at = created_at
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    """
+    Two-tier TTL cache for model responses keyed by response_cache_key().
+
+    The memory tier is LRU-bounded by entry count and approximate bytes.
+    When `db_path` is set, entries are also written to a SQLite file so
+    they survive restarts and are shared between worker processes; memory
+    misses fall through to it and promote what they find.
+    """
+
+    PRUNE_EVERY = 100  # disk writes between expiry/size sweeps
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        db_path: Optional[str] = None,
+        disk_max_entries: Optional[int] = None
+    ):
+        """
+        Initialize the cache (the disk tier is opened on first use)
+
+        Args:
+            ttl: Seconds a response stays valid (defaults to config)
+            max_entries: Memory tier entry cap (defaults to config)
+            max_bytes: Memory tier cap in bytes of serialized responses (defaults to config)
+            db_path: SQLite file for the disk tier; empty disables it (defaults to config)
+            disk_max_entries: Disk tier entry cap (defaults to config)
+        """
+        self.ttl = ttl if ttl is not None else config.BEDROCK_CACHE_TTL
+        self.max_entries = max_entries or config.BEDROCK_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or config.BEDROCK_CACHE_MAX_BYTES
+        self.db_path = db_path if db_path is not None else config.BEDROCK_CACHE_DB_PATH
+        self.disk_max_entries = disk_max_entries or config.BEDROCK_CACHE_DISK_MAX_ENTRIES
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._local = threading.local()
+        self._disk_lock = threading.Lock()
+        self._disk_ready = False
+        self._disk_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def disk_enabled(self) -> bool:
+        return bool(self.db_path)
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (response, age_seconds) for a live entry, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= now:
+                self._remove_locked(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value, now - entry.created_at
+
+        if self.disk_enabled:
+            row = self._connection().execute(
+                "SELECT data, created_at, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+            if row:
+                value = json.loads(zlib.decompress(row[0]))
+                self._put_memory(key, value, row[1], row[2])
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value, now - row[1]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """Store a response in both tiers"""
+        created_at = time.time()
+        expires_at = created_at + self.ttl
+        self._put_memory(key, value, created_at, expires_at)
+
+        if self.disk_enabled:
+            data = zlib.compress(json.dumps(value, default=str).encode("utf-8"))
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, data, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, data, created_at, expires_at)
+                )
+            with self._lock:
+                self._disk_writes += 1
+                prune = self._disk_writes % self.PRUNE_EVERY == 0
+            if prune:
+                self.prune()
+
+    async def aget(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """get() that keeps disk reads off the event loop"""
+        if self.disk_enabled:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def aput(self, key: str, value: Dict[str, Any]):
+        """put() that keeps disk writes off the event loop"""
+        if self.disk_enabled:
+            await asyncio.to_thread(self.put, key, value)
+        else:
+            self.put(key, value)
+
+    def prune(self) -> int:
+        """Delete expired disk entries and trim to disk_max_entries; returns entries removed"""
+        if not self.disk_enabled:
+            return 0
+        conn = self._connection()
+        with conn:
+            expired = conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),)).rowcount
+            trimmed = conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                " SELECT key FROM responses ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,)
+            ).rowcount
+        return expired + trimmed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.disk_enabled:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+        if self.disk_enabled:
+            stats["disk_entries"] = self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return stats
+
+    def _put_memory(self, key: str, value: Dict[str, Any], created_at: float, expires_at: float):
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._remove_locked(key)
+            self._entries[key] = _Entry(value, size, created_at, expires_at)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove_locked(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shareable across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+
+        with self._disk_lock:
+            if not self._disk_ready:
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if not self._disk_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    " key TEXT PRIMARY KEY,"
+                    " data BLOB NOT NULL,"
+                    " created_at REAL NOT NULL,"
+                    " expires_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)")
+                conn.commit()
+                self._disk_ready = True
+
+        self._local.conn = conn
+        return conn
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(value: Dict[str, Any], age_seconds: float) -> Dict[str, Any]:
+    """
+    Copy of a cached response whose usage reports the hit: no tokens were
+    spent, and the original call's usage is kept under `cached_usage`
+    """
+    return {
+        **value,
+        "usage": {
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "response_cache": "hit",
+            "cache_age_seconds": round(age_seconds, 2),
+            "cached_usage": value.get("usage", {})
+        }
+    }
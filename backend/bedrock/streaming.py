@@ -1,6 +1,81 @@
 """Streaming handler for Bedrock responses"""
-from typing import Iterator, Dict, Any, Callable
+from typing import Iterator, AsyncIterator, Dict, Any, Callable, Optional
 import asyncio
+import threading
+
+_STREAM_END = object()
+
+async def aiter_in_thread(
+    iterator_factory: Callable[[], Iterator[Dict[str, Any]]],
+    max_buffer: int = 256
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Consume a blocking iterator on a worker thread and yield its items on the loop
+    
+    Items are forwarded through a bounded asyncio.Queue, so a slow consumer
+    applies backpressure to the producer thread instead of buffering without
+    limit. Exceptions raised by the iterator are re-raised in the consumer.
+    
+    Args:
+        iterator_factory: Callable returning the blocking iterator (called on the worker thread)
+        max_buffer: Maximum items buffered between producer and consumer
+    
+    Yields:
+        Items from the iterator, in order
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_buffer)
+    cancelled = threading.Event()
+    
+    def produce():
+        try:
+            for item in iterator_factory():
+                if cancelled.is_set():
+                    break
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+            end = _STREAM_END
+        except BaseException as e:
+            end = e
+        if not cancelled.is_set():
+            asyncio.run_coroutine_threadsafe(queue.put(end), loop).result()
+    
+    loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        # Unblock a producer waiting on a full queue
+        while not queue.empty():
+            queue.get_nowait()
+
+def model_stream(
+    model,
+    prompt: str,
+    system: Optional[str] = None,
+    max_tokens: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream model events without blocking the loop
+    
+    Models with ainvoke_stream are streamed natively; a model that only has
+    a blocking invoke_stream is read on a worker thread via aiter_in_thread.
+    
+    Args:
+        model: Bedrock model (or stand-in) to stream from
+        prompt: User prompt
+        system: Optional system prompt
+        max_tokens: Output token limit for the call (defaults to the model's)
+    """
+    if hasattr(model, "ainvoke_stream"):
+        return model.ainvoke_stream(prompt=prompt, system=system, max_tokens=max_tokens)
+    
+    return aiter_in_thread(lambda: model.invoke_stream(prompt=prompt, system=system, max_tokens=max_tokens))
 
 class StreamingHandler:
     """
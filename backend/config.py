@@ -9,12 +9,95 @@ class Config:
     AWS_REGION: str = os.getenv("AWS_REGION", "us-east-1")
     AWS_ACCESS_KEY_ID: Optional[str] = os.getenv("AWS_ACCESS_KEY_ID")
     AWS_SECRET_ACCESS_KEY: Optional[str] = os.getenv("AWS_SECRET_ACCESS_KEY")
+    AWS_MAX_POOL_CONNECTIONS: int = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "50"))
     
     # Bedrock
     BEDROCK_MODEL_ID: str = os.getenv("BEDROCK_MODEL_ID", "anthropic.claude-sonnet-4-20250514-v1:0")
     BEDROCK_TEMPERATURE: float = float(os.getenv("BEDROCK_TEMPERATURE", "0.3"))
+    BEDROCK_MAX_TOKENS: int = int(os.getenv("BEDROCK_MAX_TOKENS", "2048"))  # default output limit per call
+    BEDROCK_MODEL_MAX_OUTPUT_TOKENS: int = int(os.getenv("BEDROCK_MODEL_MAX_OUTPUT_TOKENS", "64000"))  # hard output limit of BEDROCK_MODEL_ID
     BEDROCK_GUARDRAIL_ID: Optional[str] = os.getenv("BEDROCK_GUARDRAIL_ID")
     BEDROCK_GUARDRAIL_VERSION: str = os.getenv("BEDROCK_GUARDRAIL_VERSION", "DRAFT")
+    BEDROCK_ENDPOINT_URL: Optional[str] = os.getenv("BEDROCK_ENDPOINT_URL")
+    BEDROCK_MAX_CONNECTIONS: int = int(os.getenv("BEDROCK_MAX_CONNECTIONS", "64"))
+    BEDROCK_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("BEDROCK_MAX_KEEPALIVE_CONNECTIONS", "32"))
+    BEDROCK_KEEPALIVE_EXPIRY: float = float(os.getenv("BEDROCK_KEEPALIVE_EXPIRY", "60"))
+    BEDROCK_REQUEST_TIMEOUT: float = float(os.getenv("BEDROCK_REQUEST_TIMEOUT", "120"))
+    BEDROCK_PROMPT_CACHING: bool = os.getenv("BEDROCK_PROMPT_CACHING", "true").lower() == "true"
+    BEDROCK_PROMPT_CACHE_MIN_TOKENS: int = int(os.getenv("BEDROCK_PROMPT_CACHE_MIN_TOKENS", "1024"))
+    
+    # Bedrock resilience
+    BEDROCK_RATE_LIMIT: float = float(os.getenv("BEDROCK_RATE_LIMIT", "10"))  # requests/second, 0 = unlimited
+    BEDROCK_RATE_BURST: int = int(os.getenv("BEDROCK_RATE_BURST", "20"))
+    BEDROCK_MAX_RETRIES: int = int(os.getenv("BEDROCK_MAX_RETRIES", "3"))
+    BEDROCK_RETRY_BASE_DELAY: float = float(os.getenv("BEDROCK_RETRY_BASE_DELAY", "0.5"))
+    BEDROCK_RETRY_MAX_DELAY: float = float(os.getenv("BEDROCK_RETRY_MAX_DELAY", "8"))
+    BEDROCK_BREAKER_ERROR_RATE: float = float(os.getenv("BEDROCK_BREAKER_ERROR_RATE", "0.5"))
+    BEDROCK_BREAKER_WINDOW: float = float(os.getenv("BEDROCK_BREAKER_WINDOW", "60"))
+    BEDROCK_BREAKER_MIN_CALLS: int = int(os.getenv("BEDROCK_BREAKER_MIN_CALLS", "10"))
+    BEDROCK_BREAKER_COOLDOWN: float = float(os.getenv("BEDROCK_BREAKER_COOLDOWN", "30"))
+    BEDROCK_FALLBACK: str = os.getenv("BEDROCK_FALLBACK", "message")  # "message" or "error"
+    
+    # Agents
+    INCIDENT_TOOL_CONCURRENCY: int = int(os.getenv("INCIDENT_TOOL_CONCURRENCY", "8"))
+    INCIDENT_TOOL_TIMEOUT: float = float(os.getenv("INCIDENT_TOOL_TIMEOUT", "10"))
+    INCIDENT_BATCH_WINDOW_MS: float = float(os.getenv("INCIDENT_BATCH_WINDOW_MS", "0"))  # 0 = no batching
+    INCIDENT_BATCH_MAX: int = int(os.getenv("INCIDENT_BATCH_MAX", "8"))
+    INCIDENT_PROMPT_TOKEN_BUDGET: int = int(os.getenv("INCIDENT_PROMPT_TOKEN_BUDGET", "3000"))  # estimated input tokens
+    INCIDENT_PROMPT_TOP_INSTANCES: int = int(os.getenv("INCIDENT_PROMPT_TOP_INSTANCES", "10"))
+    INCIDENT_ANALYSIS_MAX_TOKENS: int = int(os.getenv("INCIDENT_ANALYSIS_MAX_TOKENS", "1024"))
+    GENERAL_QUERY_MAX_TOKENS: int = int(os.getenv("GENERAL_QUERY_MAX_TOKENS", "1024"))
+    
+    # Fleet health sweep (monitoring agent)
+    FLEET_CLIENT_IDS: str = os.getenv("FLEET_CLIENT_IDS", "")  # comma-separated; empty = discover from ClientId tags
+    FLEET_SWEEP_CONCURRENCY: int = int(os.getenv("FLEET_SWEEP_CONCURRENCY", "4"))
+    FLEET_SWEEP_CLIENTS_PER_BATCH: int = int(os.getenv("FLEET_SWEEP_CLIENTS_PER_BATCH", "25"))
+    FLEET_SWEEP_METRICS: str = os.getenv("FLEET_SWEEP_METRICS", "CPUUtilization,MemoryUtilization")
+    INSTANCE_UTILIZATION_THRESHOLD: float = float(os.getenv("INSTANCE_UTILIZATION_THRESHOLD", "90"))  # percent
+    INSTANCE_TOP_OFFENDERS: int = int(os.getenv("INSTANCE_TOP_OFFENDERS", "5"))
+    
+    # Tool result cache
+    TOOL_CACHE_ENABLED: bool = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+    TOOL_CACHE_TTL_INVENTORY: float = float(os.getenv("TOOL_CACHE_TTL_INVENTORY", "30"))
+    TOOL_CACHE_TTL_METRICS: float = float(os.getenv("TOOL_CACHE_TTL_METRICS", "60"))
+    TOOL_CACHE_MAX_ENTRIES: int = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "2048"))
+    TOOL_CACHE_MAX_BYTES: int = int(os.getenv("TOOL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+    
+    # Bedrock response cache (non-streaming calls)
+    BEDROCK_CACHE_ENABLED: bool = os.getenv("BEDROCK_CACHE_ENABLED", "true").lower() == "true"
+    BEDROCK_CACHE_TTL: float = float(os.getenv("BEDROCK_CACHE_TTL", "300"))
+    BEDROCK_CACHE_MAX_ENTRIES: int = int(os.getenv("BEDROCK_CACHE_MAX_ENTRIES", "512"))
+    BEDROCK_CACHE_MAX_BYTES: int = int(os.getenv("BEDROCK_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+    BEDROCK_CACHE_DB_PATH: str = os.getenv("BEDROCK_CACHE_DB_PATH", "")  # empty: memory tier only
+    BEDROCK_CACHE_DISK_MAX_ENTRIES: int = int(os.getenv("BEDROCK_CACHE_DISK_MAX_ENTRIES", "10000"))
+    BEDROCK_DEDUP_ENABLED: bool = os.getenv("BEDROCK_DEDUP_ENABLED", "true").lower() == "true"
+    
+    # Remediation jobs
+    REMEDIATION_POLL_INTERVAL: float = float(os.getenv("REMEDIATION_POLL_INTERVAL", "1"))
+    REMEDIATION_MAX_POLL_INTERVAL: float = float(os.getenv("REMEDIATION_MAX_POLL_INTERVAL", "15"))
+    REMEDIATION_JOB_TIMEOUT: float = float(os.getenv("REMEDIATION_JOB_TIMEOUT", "900"))
+    REMEDIATION_MAX_JOBS: int = int(os.getenv("REMEDIATION_MAX_JOBS", "1000"))
+    
+    # Sessions
+    SESSION_STORE: str = os.getenv("SESSION_STORE", "memory").lower()  # "memory" or "sqlite"
+    SESSION_TTL: float = float(os.getenv("SESSION_TTL", "3600"))
+    SESSION_MAX_ENTRIES: int = int(os.getenv("SESSION_MAX_ENTRIES", "10000"))
+    SESSION_MAX_BYTES: int = int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+    SESSION_DB_PATH: str = os.getenv("SESSION_DB_PATH", "data/sessions.db")
+    SESSION_COMPRESSION_LEVEL: int = int(os.getenv("SESSION_COMPRESSION_LEVEL", "6"))
+    
+    # Async invocations (POST /api/agent/invoke?mode=async)
+    INVOKE_WORKERS: int = int(os.getenv("INVOKE_WORKERS", "4"))
+    INVOKE_MAX_QUEUE: int = int(os.getenv("INVOKE_MAX_QUEUE", "100"))
+    INVOKE_LONG_POLL_MAX: float = float(os.getenv("INVOKE_LONG_POLL_MAX", "30"))
+    INVOKE_RETRY_AFTER: int = int(os.getenv("INVOKE_RETRY_AFTER", "1"))
+    
+    # WebSocket streaming
+    WS_FLUSH_INTERVAL_MS: float = float(os.getenv("WS_FLUSH_INTERVAL_MS", "25"))
+    WS_FLUSH_BYTES: int = int(os.getenv("WS_FLUSH_BYTES", "1024"))
+    WS_MAX_QUEUED_EVENTS: int = int(os.getenv("WS_MAX_QUEUED_EVENTS", "256"))
+    WS_MAX_REQUESTS_PER_CONNECTION: int = int(os.getenv("WS_MAX_REQUESTS_PER_CONNECTION", "8"))
+    BROADCAST_RETENTION: float = float(os.getenv("BROADCAST_RETENTION", "300"))
     
     # AgentCore Memory
     AGENTCORE_MEMORY_ID: Optional[str] = os.getenv("AGENTCORE_MEMORY_ID")
@@ -27,6 +110,7 @@ class Config:
     # API
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
     API_PORT: int = int(os.getenv("API_PORT", "8080"))
+    SERVER_MODE: str = os.getenv("SERVER_MODE", "flask").lower()  # "flask" (dev server) or "asgi"
     CORS_ORIGINS: list[str] = os.getenv(
         "CORS_ORIGINS", 
         "http://localhost:3000,http://localhost:3001,http://localhost:3002,https://deft-vacherin-809e6c.netlify.app"
@@ -49,6 +49,15 @@ async def test_bedrock_model():
     
     print(f"\n   Full response: {''.join(full_response)}")
     
+    # Test async invocation
+    print(f"\n4. Testing async invocation (pooled connections)...")
+    responses = await asyncio.gather(*[
+        model.ainvoke(prompt=f"Reply with the number {i}.", system="Be concise.")
+        for i in range(5)
+    ])
+    print(f"   Concurrent responses: {len(responses)}")
+    print(f"   First response: {responses[0]['content'][:100]}")
+    
     print("\n✅ Bedrock model tests completed successfully!")
 
 async def test_orchestrator():
@@ -1,11 +1,36 @@
 """Tools package for RMM agents"""
-from .cloudwatch_tools import analyze_cloudwatch_metrics
-from .inventory_tools import query_client_inventory
-from .remediation_tools import execute_remediation_action
+from .cloudwatch_tools import (
+    analyze_cloudwatch_metrics,
+    analyze_cloudwatch_metrics_batch,
+    analyze_instance_metrics,
+    top_offenders,
+)
+from .inventory_tools import (
+    query_client_inventory,
+    iter_client_inventory,
+    iter_fleet_inventory,
+    fleet_client_ids,
+    check_instance_status,
+)
+from .remediation_tools import execute_remediation_action, execute_bulk_remediation
+from .remediation_jobs import RemediationJobTracker, remediation_jobs
+from .result_cache import ToolResultCache, tool_cache
 
 __all__ = [
     'analyze_cloudwatch_metrics',
+    'analyze_cloudwatch_metrics_batch',
+    'analyze_instance_metrics',
+    'top_offenders',
     'query_client_inventory',
+    'iter_client_inventory',
+    'iter_fleet_inventory',
+    'fleet_client_ids',
+    'check_instance_status',
     'execute_remediation_action',
+    'execute_bulk_remediation',
+    'RemediationJobTracker',
+    'remediation_jobs',
+    'ToolResultCache',
+    'tool_cache',
 ]
 
@@ -1,20 +1,45 @@
 """CloudWatch integration tools for RMM agents"""
-import boto3
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Iterable, List, Optional
+import heapq
 import random
+import time
 from config import config
+from aws_clients import get_client
+from .result_cache import cached_tool, tool_cache, with_cache_metadata
+
+# GetMetricData accepts at most 500 queries per request
+MAX_METRIC_DATA_QUERIES = 500
+
+HOURS_MAP = {"1h": 1, "24h": 24, "7d": 168, "30d": 720}
+
+# Per-instance series period for each time range (about 12-30 points per series)
+INSTANCE_PERIOD_MAP = {"1h": 300, "24h": 3600, "7d": 21600, "30d": 86400}
+
+# CloudWatch units of the AWS/EC2 metrics the agents query; GetMetricData
+# returns values without one, so batched results take it from here
+METRIC_UNITS = {
+    "CPUUtilization": "Percent",
+    "MemoryUtilization": "Percent",
+    "NetworkIn": "Bytes",
+    "NetworkOut": "Bytes",
+    "DiskReadOps": "Count",
+    "DiskWriteOps": "Count",
+    "DiskReadBytes": "Bytes",
+    "DiskWriteBytes": "Bytes",
+    "StatusCheckFailed": "Count",
+}
+
+_MOCK_METRIC_RANGES = {
+    "CPUUtilization": (40, 95),
+    "NetworkIn": (1000000, 50000000),
+    "DiskReadOps": (10, 500),
+    "MemoryUtilization": (50, 85),
+}
 
 def _get_mock_metrics(client_id: str, metric_name: str, time_range: str) -> Dict[str, Any]:
     """Generate mock CloudWatch metrics for demo"""
-    base_values = {
-        "CPUUtilization": (40, 95),
-        "NetworkIn": (1000000, 50000000),
-        "DiskReadOps": (10, 500),
-        "MemoryUtilization": (50, 85),
-    }
-    
-    min_val, max_val = base_values.get(metric_name, (10, 100))
+    min_val, max_val = _MOCK_METRIC_RANGES.get(metric_name, (10, 100))
     current_value = random.uniform(min_val, max_val)
     avg_value = (min_val + max_val) / 2
     
@@ -36,6 +61,38 @@ def _get_mock_metrics(client_id: str, metric_name: str, time_range: str) -> Dict
         "unit": "Percent" if "Utilization" in metric_name else "Bytes"
     }
 
+def _summarize_metric(
+    client_id: str,
+    metric_name: str,
+    time_range: str,
+    latest_average: float,
+    averages: List[float],
+    maximums: List[float],
+    minimums: List[float],
+    unit: str
+) -> Dict[str, Any]:
+    """Build the per-metric result dict from raw statistic series"""
+    avg_value = sum(averages) / len(averages)
+    max_value = max(maximums)
+    
+    is_anomaly = latest_average > (max_value * 0.9)
+    
+    return {
+        "metric_name": metric_name,
+        "client_id": client_id,
+        "time_range": time_range,
+        "current_value": round(latest_average, 2),
+        "average": round(avg_value, 2),
+        "maximum": round(max_value, 2),
+        "minimum": min(minimums),
+        "anomaly_detected": is_anomaly,
+        "severity": "critical" if is_anomaly else "normal",
+        "recommendation": f"High {metric_name} detected" if is_anomaly else "Operating normally",
+        "data_points": len(averages),
+        "unit": unit
+    }
+
+@cached_tool("analyze_cloudwatch_metrics")
 def analyze_cloudwatch_metrics(
     client_id: str,
     metric_name: str,
@@ -56,11 +113,10 @@ def analyze_cloudwatch_metrics(
         return _get_mock_metrics(client_id, metric_name, time_range)
     
     try:
-        cloudwatch = boto3.client('cloudwatch', region_name=config.AWS_REGION)
+        cloudwatch = get_client('cloudwatch')
         
         # Parse time range
-        hours_map = {"1h": 1, "24h": 24, "7d": 168, "30d": 720}
-        hours = hours_map.get(time_range, 1)
+        hours = HOURS_MAP.get(time_range, 1)
         
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(hours=hours)
@@ -82,25 +138,377 @@ def analyze_cloudwatch_metrics(
             return {"error": "No data available", "client_id": client_id}
         
         latest = sorted(datapoints, key=lambda x: x['Timestamp'], reverse=True)[0]
-        avg_value = sum(d['Average'] for d in datapoints) / len(datapoints)
-        max_value = max(d['Maximum'] for d in datapoints)
         
-        is_anomaly = latest['Average'] > (max_value * 0.9)
+        return _summarize_metric(
+            client_id=client_id,
+            metric_name=metric_name,
+            time_range=time_range,
+            latest_average=latest['Average'],
+            averages=[d['Average'] for d in datapoints],
+            maximums=[d['Maximum'] for d in datapoints],
+            minimums=[d['Minimum'] for d in datapoints],
+            unit=latest.get('Unit', 'None')
+        )
+    except Exception as e:
+        return {"error": str(e), "client_id": client_id, "fallback_mode": "mock"}
+
+
+def analyze_cloudwatch_metrics_batch(
+    client_ids: List[str],
+    metric_names: List[str],
+    time_range: str = "1h",
+    use_cache: bool = True
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Retrieve and analyze several metrics for several clients with GetMetricData
+    
+    Queries are packed up to MAX_METRIC_DATA_QUERIES per request and each
+    request is paginated with NextToken, so a whole client is usually
+    covered by a single API call. Results share cache entries with
+    analyze_cloudwatch_metrics; only uncached (client, metric) pairs are
+    fetched, and pairs a concurrent call is already fetching are waited for.
+    
+    Args:
+        client_ids: MSP client identifiers
+        metric_names: CloudWatch metrics to analyze for every client
+        time_range: Time range for analysis (1h, 24h, 7d, 30d)
+        use_cache: Set False to bypass the tool result cache
+    
+    Returns:
+        Dictionary of client_id -> list of per-metric results (same shape as
+        analyze_cloudwatch_metrics), in metric_names order
+    """
+    pairs = [(client_id, metric_name) for client_id in client_ids for metric_name in metric_names]
+    
+    if config.TOOL_CACHE_ENABLED and use_cache:
+        # Pairs another caller is already fetching are waited for, not fetched twice
+        loaded = tool_cache.get_or_load_many(
+            {pair: _metric_cache_key(pair[0], pair[1], time_range) for pair in pairs},
+            lambda missing: _fetch_metric_batch(missing, time_range),
+            tool_cache.ttl_for("analyze_cloudwatch_metrics"),
+            client_ids={pair: (pair[0],) for pair in pairs}
+        )
+        results = {pair: with_cache_metadata(*loaded[pair]) for pair in pairs}
+    else:
+        results = _fetch_metric_batch(pairs, time_range) if pairs else {}
+    
+    return {
+        client_id: [results[(client_id, metric_name)] for metric_name in metric_names]
+        for client_id in client_ids
+    }
+
+def _metric_cache_key(client_id: str, metric_name: str, time_range: str):
+    return tool_cache.make_key(
+        "analyze_cloudwatch_metrics",
+        client_id=client_id,
+        metric_name=metric_name,
+        time_range=time_range
+    )
+
+def _fetch_metric_batch(pairs: List[tuple], time_range: str) -> Dict[tuple, Dict[str, Any]]:
+    """Fetch (client_id, metric_name) pairs with as few GetMetricData calls as possible"""
+    if config.MOCK_MODE:
+        return {
+            (client_id, metric_name): _get_mock_metrics(client_id, metric_name, time_range)
+            for client_id, metric_name in pairs
+        }
+    
+    try:
+        cloudwatch = get_client('cloudwatch')
+        
+        hours = HOURS_MAP.get(time_range, 1)
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(hours=hours)
+        
+        # One query per (client, metric, statistic); ids must start with a lowercase letter
+        statistics = ['Average', 'Maximum', 'Minimum']
+        queries = []
+        for index, (client_id, metric_name) in enumerate(pairs):
+            for stat in statistics:
+                query_id = f"q{index}_{stat.lower()}"
+                queries.append({
+                    'Id': query_id,
+                    'MetricStat': {
+                        'Metric': {
+                            'Namespace': 'AWS/EC2',
+                            'MetricName': metric_name,
+                            'Dimensions': [{'Name': 'ClientId', 'Value': client_id}]
+                        },
+                        'Period': 3600,
+                        'Stat': stat
+                    },
+                    'ReturnData': True
+                })
+                if metric_name in METRIC_UNITS:
+                    queries[-1]['MetricStat']['Unit'] = METRIC_UNITS[metric_name]
+        
+        series = _get_metric_data(cloudwatch, queries, start_time, end_time)
+        
+        results = {}
+        for index, (client_id, metric_name) in enumerate(pairs):
+            averages = series[f"q{index}_average"]
+            if not averages:
+                results[(client_id, metric_name)] = {
+                    "error": "No data available",
+                    "client_id": client_id,
+                    "metric_name": metric_name
+                }
+                continue
+            
+            results[(client_id, metric_name)] = _summarize_metric(
+                client_id=client_id,
+                metric_name=metric_name,
+                time_range=time_range,
+                latest_average=averages[max(averages)],
+                averages=list(averages.values()),
+                maximums=list(series[f"q{index}_maximum"].values()) or list(averages.values()),
+                minimums=list(series[f"q{index}_minimum"].values()) or list(averages.values()),
+                unit=METRIC_UNITS.get(metric_name, 'None')
+            )
         
+        return results
+    except Exception as e:
         return {
-            "metric_name": metric_name,
-            "client_id": client_id,
-            "time_range": time_range,
-            "current_value": round(latest['Average'], 2),
-            "average": round(avg_value, 2),
-            "maximum": round(max_value, 2),
-            "minimum": min(d['Minimum'] for d in datapoints),
-            "anomaly_detected": is_anomaly,
-            "severity": "critical" if is_anomaly else "normal",
-            "recommendation": f"High {metric_name} detected" if is_anomaly else "Operating normally",
-            "data_points": len(datapoints),
-            "unit": latest.get('Unit', 'None')
+            (client_id, metric_name): {
+                "error": str(e),
+                "client_id": client_id,
+                "metric_name": metric_name,
+                "fallback_mode": "mock"
+            }
+            for client_id, metric_name in pairs
         }
+
+def _get_metric_data(
+    cloudwatch,
+    queries: List[Dict[str, Any]],
+    start_time: datetime,
+    end_time: datetime
+) -> Dict[str, Dict[Any, float]]:
+    """
+    Run GetMetricData queries, MAX_METRIC_DATA_QUERIES per request, following NextToken
+    
+    Returns:
+        Dictionary of query id -> {timestamp: value}
+    """
+    series: Dict[str, Dict[Any, float]] = {query['Id']: {} for query in queries}
+    for offset in range(0, len(queries), MAX_METRIC_DATA_QUERIES):
+        request = {
+            'MetricDataQueries': queries[offset:offset + MAX_METRIC_DATA_QUERIES],
+            'StartTime': start_time,
+            'EndTime': end_time,
+            'ScanBy': 'TimestampDescending'
+        }
+        while True:
+            response = cloudwatch.get_metric_data(**request)
+            for item in response.get('MetricDataResults', []):
+                series[item['Id']].update(zip(item.get('Timestamps', []), item.get('Values', [])))
+            
+            next_token = response.get('NextToken')
+            if not next_token:
+                break
+            request['NextToken'] = next_token
+    return series
+
+def _get_mock_series(instance_id: str, metric_name: str, time_range: str) -> Dict[str, Any]:
+    """Generate a mock per-instance series; a few instances run hot"""
+    period = INSTANCE_PERIOD_MAP.get(time_range, 300)
+    points = HOURS_MAP.get(time_range, 1) * 3600 // period
+    min_val, max_val = _MOCK_METRIC_RANGES.get(metric_name, (10, 100))
+    
+    level = random.uniform(min_val, max_val * 0.8)
+    if random.random() < 0.1:
+        level = random.uniform(max_val * 0.9, max_val)
+    
+    last = int(time.time()) // period * period
+    return {
+        "timestamps": [
+            datetime.fromtimestamp(last - (points - 1 - index) * period, timezone.utc).isoformat()
+            for index in range(points)
+        ],
+        "values": [
+            round(min(max(level + random.uniform(-0.1, 0.1) * (max_val - min_val), 0.0), float(max_val)), 2)
+            for _ in range(points)
+        ]
+    }
+
+def _instance_series_key(instance_id: str, metric_name: str, time_range: str):
+    return tool_cache.make_key(
+        "analyze_instance_metrics",
+        instance_id=instance_id,
+        metric_name=metric_name,
+        time_range=time_range
+    )
+
+def _fetch_instance_series(pairs: List[tuple], time_range: str) -> Dict[tuple, Dict[str, Any]]:
+    """Fetch (instance_id, metric_name) series, oldest point first, with as few GetMetricData calls as possible"""
+    if config.MOCK_MODE:
+        return {pair: _get_mock_series(pair[0], pair[1], time_range) for pair in pairs}
+    
+    try:
+        cloudwatch = get_client('cloudwatch')
+        
+        end_time = datetime.utcnow()
+        start_time = end_time - timedelta(hours=HOURS_MAP.get(time_range, 1))
+        period = INSTANCE_PERIOD_MAP.get(time_range, 300)
+        
+        # One Average query per (instance, metric)
+        queries = [
+            {
+                'Id': f"i{index}",
+                'MetricStat': {
+                    'Metric': {
+                        'Namespace': 'AWS/EC2',
+                        'MetricName': metric_name,
+                        'Dimensions': [{'Name': 'InstanceId', 'Value': instance_id}]
+                    },
+                    'Period': period,
+                    'Stat': 'Average'
+                },
+                'ReturnData': True
+            }
+            for index, (instance_id, metric_name) in enumerate(pairs)
+        ]
+        series = _get_metric_data(cloudwatch, queries, start_time, end_time)
+        
+        results = {}
+        for index, pair in enumerate(pairs):
+            points = sorted(series[f"i{index}"].items())
+            if not points:
+                results[pair] = {"error": "No data available"}
+                continue
+            results[pair] = {
+                "timestamps": [timestamp.isoformat() for timestamp, _ in points],
+                "values": [round(value, 2) for _, value in points]
+            }
+        return results
     except Exception as e:
-        return {"error": str(e), "client_id": client_id, "fallback_mode": "mock"}
+        return {pair: {"error": str(e), "fallback_mode": "mock"} for pair in pairs}
+
+def analyze_instance_metrics(
+    instance_ids: List[str],
+    metric_names: List[str],
+    time_range: str = "1h",
+    owners: Optional[Dict[str, str]] = None,
+    use_cache: bool = True
+) -> Dict[str, Any]:
+    """
+    Retrieve per-instance metric series (InstanceId dimension) as columns
+    
+    Every (instance, metric) series is one GetMetricData query; queries are
+    packed MAX_METRIC_DATA_QUERIES per request. Series are cached one by one
+    (sharing the metrics TTL), so overlapping requests only fetch what is
+    missing and concurrent ones never fetch the same series twice.
+    
+    Args:
+        instance_ids: Instances to analyze (rows)
+        metric_names: CloudWatch metrics to retrieve
+        time_range: Time range for analysis (1h, 24h, 7d, 30d)
+        owners: instance_id -> client_id, so tool_cache.invalidate_client drops their series
+        use_cache: Set False to bypass the tool result cache
+    
+    Returns:
+        Columnar result:
+            "instance_ids": row labels
+            "timestamps": shared ascending time axis (ISO 8601)
+            "values": {metric: [[value or None per timestamp] per instance]}
+            "latest" / "average" / "maximum": {metric: [value or None per instance]}
+            "missing": [{"instance_id", "metric_name", "error"}] for series without data
+    """
+    pairs = [(instance_id, metric_name) for instance_id in instance_ids for metric_name in metric_names]
+    
+    if config.TOOL_CACHE_ENABLED and use_cache:
+        owners = owners or {}
+        # Series another caller is already fetching are waited for, not fetched twice
+        loaded = tool_cache.get_or_load_many(
+            {pair: _instance_series_key(pair[0], pair[1], time_range) for pair in pairs},
+            lambda missing: _fetch_instance_series(missing, time_range),
+            tool_cache.ttl_for("analyze_instance_metrics"),
+            client_ids={pair: (owners[pair[0]],) if owners.get(pair[0]) else () for pair in pairs}
+        )
+        series = {pair: value for pair, (value, _, _) in loaded.items()}
+        fetched = sum(1 for _, hit, _ in loaded.values() if not hit)
+    else:
+        series = _fetch_instance_series(pairs, time_range) if pairs else {}
+        fetched = len(series)
+    
+    # One shared time axis; each series is scattered onto it
+    timestamps = sorted({timestamp for value in series.values() for timestamp in value.get("timestamps", [])})
+    position = {timestamp: index for index, timestamp in enumerate(timestamps)}
+    
+    result: Dict[str, Any] = {
+        "instance_ids": list(instance_ids),
+        "metric_names": list(metric_names),
+        "time_range": time_range,
+        "period": INSTANCE_PERIOD_MAP.get(time_range, 300),
+        "timestamps": timestamps,
+        "values": {},
+        "latest": {},
+        "average": {},
+        "maximum": {},
+        "missing": [],
+        "cache": {"hits": len(series) - fetched, "misses": fetched}
+    }
+    
+    for metric_name in metric_names:
+        rows, latest, average, maximum = [], [], [], []
+        for instance_id in instance_ids:
+            value = series[(instance_id, metric_name)]
+            row: List[Optional[float]] = [None] * len(timestamps)
+            if "error" in value:
+                result["missing"].append({"instance_id": instance_id, "metric_name": metric_name, "error": value["error"]})
+                latest.append(None)
+                average.append(None)
+                maximum.append(None)
+            else:
+                for timestamp, point in zip(value["timestamps"], value["values"]):
+                    row[position[timestamp]] = point
+                latest.append(value["values"][-1])
+                average.append(round(sum(value["values"]) / len(value["values"]), 2))
+                maximum.append(max(value["values"]))
+            rows.append(row)
+        
+        result["values"][metric_name] = rows
+        result["latest"][metric_name] = latest
+        result["average"][metric_name] = average
+        result["maximum"][metric_name] = maximum
+    
+    return result
 
+def top_offenders(
+    result: Dict[str, Any],
+    metric_name: str,
+    k: int = 5,
+    by: str = "maximum",
+    instance_ids: Optional[Iterable[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    The k instances with the highest value of a metric, in O(n log k)
+    
+    Args:
+        result: Columnar result from analyze_instance_metrics
+        metric_name: Metric to rank by
+        k: Number of instances to return
+        by: Column to rank on ("maximum", "average" or "latest")
+        instance_ids: Restrict the ranking to these instances (default all rows)
+    
+    Returns:
+        List of {"instance_id", "metric_name", "latest", "average", "maximum"}, highest first
+    """
+    column = result[by][metric_name]
+    if instance_ids is None:
+        rows: Iterable[int] = range(len(column))
+    else:
+        index = {instance_id: row for row, instance_id in enumerate(result["instance_ids"])}
+        rows = (index[instance_id] for instance_id in instance_ids if instance_id in index)
+    
+    ranked = heapq.nlargest(k, (row for row in rows if column[row] is not None), key=column.__getitem__)
+    return [
+        {
+            "instance_id": result["instance_ids"][row],
+            "metric_name": metric_name,
+            "latest": result["latest"][metric_name][row],
+            "average": result["average"][metric_name][row],
+            "maximum": result["maximum"][metric_name][row]
+        }
+        for row in ranked
+    ]
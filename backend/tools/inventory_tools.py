@@ -1,8 +1,10 @@
 """Inventory management tools for RMM agents"""
-import boto3
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
 import random
+import jmespath
 from config import config
+from aws_clients import get_client
+from .result_cache import cached_tool
 
 def _get_mock_inventory(client_id: str, filter_by: Optional[str] = None) -> Dict[str, Any]:
     """Generate mock inventory data for demo"""
@@ -43,9 +45,160 @@ def _get_mock_inventory(client_id: str, filter_by: Optional[str] = None) -> Dict
         "retrieved_at": "2025-10-24T12:00:00Z"
     }
 
+# Fields kept per instance; everything else in the DescribeInstances payload is dropped per page
+INSTANCE_PROJECTION = jmespath.compile(
+    "Reservations[].Instances[].{InstanceId: InstanceId, InstanceType: InstanceType, "
+    "State: State.Name, AvailabilityZone: Placement.AvailabilityZone, "
+    "CoreCount: CpuOptions.CoreCount, LaunchTime: LaunchTime, Tags: Tags}"
+)
+
+def _inventory_filters(client_id: str, filter_by: Optional[str]) -> List[Dict[str, Any]]:
+    """Server-side DescribeInstances filters for a client"""
+    filters = [{'Name': 'tag:ClientId', 'Values': [client_id]}]
+    if filter_by:
+        filters.append({'Name': 'instance-state-name', 'Values': [filter_by]})
+    return filters
+
+def _project_instance(instance: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a projected DescribeInstances record into an inventory entry"""
+    tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags') or []}
+    
+    return {
+        "instance_id": instance['InstanceId'],
+        "name": tags.get('Name', 'unnamed'),
+        "type": instance['InstanceType'],
+        "status": instance['State'],
+        "availability_zone": instance['AvailabilityZone'],
+        "cpu_count": instance.get('CoreCount') or 0,
+        "memory_gb": 0,  # Not directly available in API
+        "launch_time": instance['LaunchTime'].isoformat(),
+        "tags": tags
+    }
+
+def iter_client_inventory(
+    client_id: str,
+    filter_by: Optional[str] = None,
+    page_size: int = 1000
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Stream EC2 inventory for a client one DescribeInstances page at a time
+    
+    Follows NextToken until the fleet is exhausted, filtering server-side by
+    ClientId tag and state and keeping only the projected fields, so memory
+    use is bounded by one page regardless of fleet size.
+    
+    Args:
+        client_id: MSP client identifier
+        filter_by: Optional state filter (e.g., 'running', 'stopped')
+        page_size: Instances requested per page (5-1000)
+    
+    Yields:
+        Lists of inventory entries, one list per page
+    """
+    if config.MOCK_MODE:
+        yield _get_mock_inventory(client_id, filter_by)["instances"]
+        return
+    
+    ec2 = get_client('ec2')
+    paginator = ec2.get_paginator('describe_instances')
+    pages = paginator.paginate(
+        Filters=_inventory_filters(client_id, filter_by),
+        PaginationConfig={'PageSize': page_size}
+    )
+    
+    for page in pages:
+        yield [_project_instance(instance) for instance in INSTANCE_PROJECTION.search(page) or []]
+
+def fleet_client_ids() -> List[str]:
+    """Configured fleet clients (FLEET_CLIENT_IDS); empty means discover them from ClientId tags"""
+    client_ids = [client_id.strip() for client_id in config.FLEET_CLIENT_IDS.split(",") if client_id.strip()]
+    if not client_ids and config.MOCK_MODE:
+        return ["demo-client-001", "demo-client-002", "demo-client-003"]
+    return client_ids
+
+def iter_fleet_inventory(
+    client_ids: Optional[List[str]] = None,
+    filter_by: Optional[str] = "running",
+    page_size: int = 1000
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Stream EC2 inventory for many clients in one paginated pass
+    
+    Every entry carries its client in tags["ClientId"]. Without client_ids,
+    every instance with a ClientId tag is included.
+    
+    Args:
+        client_ids: MSP client identifiers (None for every tagged client)
+        filter_by: Optional state filter (default 'running')
+        page_size: Instances requested per page (5-1000)
+    
+    Yields:
+        Lists of inventory entries, one list per page
+    """
+    if config.MOCK_MODE:
+        for client_id in client_ids or fleet_client_ids():
+            yield _get_mock_inventory(client_id, filter_by)["instances"]
+        return
+    
+    filters = (
+        [{'Name': 'tag:ClientId', 'Values': client_ids}]
+        if client_ids else [{'Name': 'tag-key', 'Values': ['ClientId']}]
+    )
+    if filter_by:
+        filters.append({'Name': 'instance-state-name', 'Values': [filter_by]})
+    
+    ec2 = get_client('ec2')
+    pages = ec2.get_paginator('describe_instances').paginate(
+        Filters=filters,
+        PaginationConfig={'PageSize': page_size}
+    )
+    
+    for page in pages:
+        yield [_project_instance(instance) for instance in INSTANCE_PROJECTION.search(page) or []]
+
+# DescribeInstanceStatus accepts at most this many instance ids per call
+MAX_STATUS_INSTANCE_IDS = 100
+
+def check_instance_status(instance_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    EC2 status checks for many instances, batched per DescribeInstanceStatus call
+    
+    Args:
+        instance_ids: Instances to check
+    
+    Returns:
+        Dictionary of instance_id -> {"instance_status", "system_status", "healthy"};
+        instances with no status reported are left out
+    """
+    if config.MOCK_MODE:
+        statuses = {}
+        for instance_id in instance_ids:
+            status = random.choice(["ok"] * 19 + ["impaired"])
+            statuses[instance_id] = {"instance_status": status, "system_status": "ok", "healthy": status == "ok"}
+        return statuses
+    
+    ec2 = get_client('ec2')
+    statuses = {}
+    for offset in range(0, len(instance_ids), MAX_STATUS_INSTANCE_IDS):
+        response = ec2.describe_instance_status(
+            InstanceIds=instance_ids[offset:offset + MAX_STATUS_INSTANCE_IDS]
+        )
+        for status in response.get('InstanceStatuses', []):
+            instance_status = status.get('InstanceStatus', {}).get('Status')
+            system_status = status.get('SystemStatus', {}).get('Status')
+            statuses[status['InstanceId']] = {
+                "instance_status": instance_status,
+                "system_status": system_status,
+                # "initializing" and "insufficient-data" are not failures
+                "healthy": "impaired" not in (instance_status, system_status)
+            }
+    return statuses
+
+@cached_tool("query_client_inventory")
 def query_client_inventory(
     client_id: str,
-    filter_by: Optional[str] = None
+    filter_by: Optional[str] = None,
+    include_instances: bool = True
 ) -> Dict[str, Any]:
     """
     Query EC2 inventory for a specific MSP client
@@ -53,48 +206,36 @@ def query_client_inventory(
     Args:
         client_id: MSP client identifier
         filter_by: Optional filter (e.g., 'running', 'stopped')
+        include_instances: Set False to return only the counters (constant memory)
     
     Returns:
         Dictionary with instance inventory data
     """
-    if config.MOCK_MODE:
-        return _get_mock_inventory(client_id, filter_by)
-    
     try:
-        ec2 = boto3.client('ec2', region_name=config.AWS_REGION)
-        
-        filters = [{'Name': 'tag:ClientId', 'Values': [client_id]}]
-        if filter_by:
-            filters.append({'Name': 'instance-state-name', 'Values': [filter_by]})
+        instances = [] if include_instances else None
+        total = running = stopped = 0
         
-        response = ec2.describe_instances(Filters=filters)
+        # Single pass over all pages for the counters
+        for page in iter_client_inventory(client_id, filter_by):
+            for instance in page:
+                total += 1
+                if instance["status"] == "running":
+                    running += 1
+                elif instance["status"] == "stopped":
+                    stopped += 1
+            if instances is not None:
+                instances.extend(page)
         
-        instances = []
-        for reservation in response.get('Reservations', []):
-            for instance in reservation.get('Instances', []):
-                tags = {tag['Key']: tag['Value'] for tag in instance.get('Tags', [])}
-                
-                instances.append({
-                    "instance_id": instance['InstanceId'],
-                    "name": tags.get('Name', 'unnamed'),
-                    "type": instance['InstanceType'],
-                    "status": instance['State']['Name'],
-                    "availability_zone": instance['Placement']['AvailabilityZone'],
-                    "cpu_count": instance.get('CpuOptions', {}).get('CoreCount', 0),
-                    "memory_gb": 0,  # Not directly available in API
-                    "launch_time": instance['LaunchTime'].isoformat(),
-                    "tags": tags
-                })
-        
-        return {
+        result = {
             "client_id": client_id,
-            "total_instances": len(instances),
-            "running_instances": sum(1 for i in instances if i["status"] == "running"),
-            "stopped_instances": sum(1 for i in instances if i["status"] == "stopped"),
-            "instances": instances,
+            "total_instances": total,
+            "running_instances": running,
+            "stopped_instances": stopped,
             "filter_applied": filter_by or "none",
             "retrieved_at": "2025-10-24T12:00:00Z"
         }
+        if instances is not None:
+            result["instances"] = instances
+        return result
     except Exception as e:
         return {"error": str(e), "client_id": client_id, "fallback_mode": "mock"}
-
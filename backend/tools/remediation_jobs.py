@@ -0,0 +1,484 @@
+"""Background tracking of SSM remediation jobs"""
+import copy
+import heapq
+import itertools
+import random
+import threading
+import time
+import uuid
+import queue
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Any, Callable, Iterator, List, Optional
+from config import config
+from aws_clients import get_client
+from .result_cache import tool_cache
+from .remediation_tools import build_ssm_command, mock_remediation_result
+
+# SSM command invocation status -> job status
+SSM_STATUS_MAP = {
+    "Pending": "pending",
+    "InProgress": "in_progress",
+    "Delayed": "in_progress",
+    "Cancelling": "in_progress",
+    "Success": "success",
+    "Cancelled": "cancelled",
+    "TimedOut": "timed_out",
+    "Failed": "failed",
+}
+
+TERMINAL_STATUSES = {"success", "failed", "cancelled", "timed_out", "skipped"}
+ERROR_STATUSES = {"failed", "cancelled", "timed_out"}
+
+# SendCommand accepts at most 50 explicit instance IDs per call
+SSM_MAX_INSTANCE_IDS = 50
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+class RemediationJobTracker:
+    """
+    Tracks remediation jobs from submission to completion.
+
+    `submit` records a job and returns at once; a single daemon thread
+    dispatches SSM commands and then polls `list_command_invocations`
+    with exponential backoff until every target instance reaches a terminal
+    status. Large target lists are split into SSM-sized batches that are
+    released as concurrency allows and stopped once the error budget is
+    spent. Listeners registered with `subscribe` receive a snapshot on
+    every state change (used to push updates over WebSocket).
+    """
+
+    def __init__(
+        self,
+        poll_interval: Optional[float] = None,
+        max_poll_interval: Optional[float] = None,
+        job_timeout: Optional[float] = None,
+        max_jobs: Optional[int] = None
+    ):
+        """
+        Initialize the tracker
+
+        Args:
+            poll_interval: First status poll delay in seconds (defaults to config)
+            max_poll_interval: Backoff ceiling in seconds (defaults to config)
+            job_timeout: Seconds before an unfinished job is marked timed_out (defaults to config)
+            max_jobs: Number of jobs retained for status queries (defaults to config)
+        """
+        self.poll_interval = poll_interval or config.REMEDIATION_POLL_INTERVAL
+        self.max_poll_interval = max_poll_interval or config.REMEDIATION_MAX_POLL_INTERVAL
+        self.job_timeout = job_timeout or config.REMEDIATION_JOB_TIMEOUT
+        self.max_jobs = max_jobs or config.REMEDIATION_MAX_JOBS
+
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._schedule: List[tuple] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(
+        self,
+        client_id: str,
+        instance_ids: Optional[List[str]],
+        action_type: str,
+        parameters: Optional[Dict[str, Any]] = None,
+        targets: Optional[List[Dict[str, Any]]] = None,
+        batch_size: int = SSM_MAX_INSTANCE_IDS,
+        max_concurrency: Optional[int] = None,
+        max_errors: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Queue a remediation job and return its snapshot immediately
+
+        Args:
+            client_id: MSP client identifier
+            instance_ids: EC2 instance IDs to target
+            action_type: Type of remediation (restart_service, clear_cache, etc.)
+            parameters: Action-specific parameters
+            targets: SSM tag targets (e.g. [{"Key": "tag:Application", "Values": ["WebServer"]}])
+                used instead of instance_ids
+            batch_size: Instance IDs per SendCommand call (capped at 50)
+            max_concurrency: Max instances running the command at once
+            max_errors: Failed instances tolerated before remaining batches are skipped
+
+        Returns:
+            Job snapshot with job_id and status 'queued' ('success' right
+            away when there is no instance to target)
+        """
+        parameters = parameters or {}
+        instance_ids = list(instance_ids or [])
+        document_name, command_params = build_ssm_command(action_type, parameters)
+        batch_size = max(1, min(batch_size, SSM_MAX_INSTANCE_IDS))
+
+        if targets and config.MOCK_MODE:
+            # No SSM to resolve tags against; target the client's running mock fleet
+            from .inventory_tools import query_client_inventory
+            inventory = query_client_inventory(client_id, filter_by="running")
+            instance_ids = [instance["instance_id"] for instance in inventory.get("instances", [])]
+            targets = None
+
+        job = {
+            "job_id": f"rem-{uuid.uuid4().hex[:12]}",
+            "client_id": client_id,
+            "action_type": action_type,
+            "parameters": parameters,
+            "document_name": document_name,
+            "commands_executed": command_params["commands"],
+            "targets": targets,
+            "max_concurrency": max_concurrency,
+            "max_errors": max_errors,
+            "command_id": None,
+            "command_ids": [],
+            "status": "queued",
+            "instances": {
+                instance_id: {"status": "queued"} for instance_id in instance_ids
+            },
+            "progress": {},
+            "submitted_at": _now(),
+            "updated_at": _now(),
+            "completed_at": None,
+            "error": None,
+        }
+        job["_state"] = {
+            "submitted": time.monotonic(),
+            "interval": self.poll_interval,
+            "batches": deque(
+                instance_ids[offset:offset + batch_size]
+                for offset in range(0, len(instance_ids), batch_size)
+            ),
+            "targets_pending": bool(targets),
+            "commands": [],
+            "command_statuses": {},
+            "mock_due": {},
+        }
+        job["progress"] = self._progress(job)
+        if not job["_state"]["batches"] and not targets:
+            # Nothing to send (e.g. tag targets matched no running instance)
+            job["status"] = "success"
+            job["completed_at"] = job["updated_at"]
+
+        with self._condition:
+            self._jobs[job["job_id"]] = job
+            self._trim_locked()
+            if job["status"] not in TERMINAL_STATUSES:
+                self._schedule_locked(job["job_id"], 0)
+                self._ensure_thread_locked()
+            snapshot = self._snapshot_locked(job)
+
+        self._notify(snapshot, list(job["instances"]))
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a snapshot of a job, or None if unknown"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            return self._snapshot_locked(job) if job else None
+
+    def subscribe(self, listener: Callable[[Dict[str, Any]], None]) -> Callable[[], None]:
+        """
+        Register a callback for job updates
+
+        Each snapshot passed to the listener carries `changed_instances`,
+        the instance IDs whose status changed in that update.
+
+        Returns:
+            Function that removes the listener
+        """
+        with self._condition:
+            self._listeners.append(listener)
+
+        def unsubscribe():
+            with self._condition:
+                if listener in self._listeners:
+                    self._listeners.remove(listener)
+
+        return unsubscribe
+
+    def iter_instance_results(self, job_id: str, timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield per-instance results as each instance finishes
+
+        Args:
+            job_id: Job to follow
+            timeout: Give up after this many seconds without an update
+
+        Yields:
+            {"instance_id": str, "status": str, ...} once per finished instance
+        """
+        updates = queue.Queue()
+        unsubscribe = self.subscribe(lambda job: updates.put(job) if job["job_id"] == job_id else None)
+        reported = set()
+
+        try:
+            job = self.get(job_id)
+            while job is not None:
+                for instance_id, result in job["instances"].items():
+                    if instance_id not in reported and result["status"] in TERMINAL_STATUSES:
+                        reported.add(instance_id)
+                        yield {"instance_id": instance_id, **result}
+                if job["status"] in TERMINAL_STATUSES:
+                    return
+                job = updates.get(timeout=timeout)
+        except queue.Empty:
+            return
+        finally:
+            unsubscribe()
+
+    # Poller
+
+    def _ensure_thread_locked(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="remediation-poller", daemon=True)
+            self._thread.start()
+
+    def _schedule_locked(self, job_id: str, delay: float):
+        heapq.heappush(self._schedule, (time.monotonic() + delay, next(self._sequence), job_id))
+        self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._schedule or self._schedule[0][0] > time.monotonic():
+                    timeout = self._schedule[0][0] - time.monotonic() if self._schedule else None
+                    self._condition.wait(timeout)
+                _, _, job_id = heapq.heappop(self._schedule)
+                job = self._jobs.get(job_id)
+
+            if job is None or job["status"] in TERMINAL_STATUSES:
+                continue
+
+            try:
+                if self._dispatch_batches(job):
+                    # New work started: go back to quick polling
+                    job["_state"]["interval"] = self.poll_interval
+                if job["_state"]["commands"]:
+                    self._poll(job)
+            except Exception as e:
+                self._update(job, status="failed", error=str(e))
+
+            with self._condition:
+                state = job["_state"]
+                finished = job["status"] in TERMINAL_STATUSES
+                expired = time.monotonic() - state["submitted"] > self.job_timeout
+                if not finished and not expired:
+                    self._schedule_locked(job_id, state["interval"])
+                    state["interval"] = min(state["interval"] * 2, self.max_poll_interval)
+
+            if not finished and expired:
+                self._update(job, status="timed_out", error="Job exceeded REMEDIATION_JOB_TIMEOUT")
+
+    def _dispatch_batches(self, job: Dict[str, Any]) -> bool:
+        """Release queued batches within the concurrency and error budgets"""
+        state = job["_state"]
+        dispatched = False
+
+        if state["targets_pending"]:
+            command_id = self._send_command(job, Targets=job["targets"])
+            state["targets_pending"] = False
+            state["commands"].append(command_id)
+            self._update(job, status="in_progress", command_id=command_id)
+            return True
+
+        while state["batches"]:
+            statuses = [instance["status"] for instance in job["instances"].values()]
+            errors = sum(1 for s in statuses if s in ERROR_STATUSES)
+            if job["max_errors"] is not None and errors > job["max_errors"]:
+                skipped = [instance_id for batch in state["batches"] for instance_id in batch]
+                state["batches"].clear()
+                self._update(
+                    job,
+                    error=f"Error budget exceeded ({errors} > {job['max_errors']}); remaining batches skipped",
+                    instance_results={instance_id: {"status": "skipped"} for instance_id in skipped}
+                )
+                break
+
+            in_flight = sum(1 for s in statuses if s in ("pending", "in_progress"))
+            batch = state["batches"][0]
+            if job["max_concurrency"] and in_flight and in_flight + len(batch) > job["max_concurrency"]:
+                break
+
+            state["batches"].popleft()
+            if config.MOCK_MODE:
+                # Simulated run time is tracked by the scheduler instead of sleeping
+                command_id = f"exec-{random.randint(100000, 999999)}"
+                now = time.monotonic()
+                for instance_id in batch:
+                    state["mock_due"][instance_id] = now + random.uniform(0.5, 2.0)
+            else:
+                command_id = self._send_command(job, InstanceIds=batch)
+
+            state["commands"].append(command_id)
+            self._update(
+                job,
+                status="in_progress",
+                command_id=command_id,
+                instance_results={
+                    instance_id: {"status": "in_progress" if config.MOCK_MODE else "pending", "command_id": command_id}
+                    for instance_id in batch
+                }
+            )
+            dispatched = True
+
+        return dispatched
+
+    def _send_command(self, job: Dict[str, Any], **target) -> str:
+        """Call SSM SendCommand for one batch (or tag target) of the job"""
+        request = {
+            "DocumentName": job["document_name"],
+            "Parameters": {"commands": job["commands_executed"]},
+            "Comment": f"RMM Agent remediation for {job['client_id']}",
+            **target
+        }
+        if job["max_concurrency"]:
+            request["MaxConcurrency"] = str(job["max_concurrency"])
+        if job["max_errors"] is not None:
+            request["MaxErrors"] = str(job["max_errors"])
+
+        response = get_client('ssm').send_command(**request)
+        return response['Command']['CommandId']
+
+    def _poll(self, job: Dict[str, Any]):
+        """Refresh per-instance status from SSM"""
+        state = job["_state"]
+
+        if config.MOCK_MODE:
+            now = time.monotonic()
+            outcome = mock_remediation_result(job["action_type"], job["parameters"])
+            finished = [instance_id for instance_id, due in state["mock_due"].items() if due <= now]
+            for instance_id in finished:
+                del state["mock_due"][instance_id]
+            if finished:
+                self._update(job, instance_results={
+                    instance_id: {
+                        "status": outcome["status"],
+                        "message": outcome["message"],
+                        "commands_executed": outcome["commands_executed"],
+                    }
+                    for instance_id in finished
+                })
+            if state["mock_due"]:
+                state["interval"] = max(0.1, min(state["mock_due"].values()) - now) / 2
+            return
+
+        ssm = get_client('ssm')
+        paginator = ssm.get_paginator('list_command_invocations')
+        results = {}
+        for command_id in state["commands"]:
+            if state["command_statuses"].get(command_id) in TERMINAL_STATUSES:
+                continue
+
+            command_results = {}
+            for page in paginator.paginate(CommandId=command_id):
+                for invocation in page.get('CommandInvocations', []):
+                    command_results[invocation['InstanceId']] = {
+                        "status": SSM_STATUS_MAP.get(invocation.get('Status'), "in_progress"),
+                        "message": invocation.get('StatusDetails', ''),
+                        "command_id": command_id,
+                    }
+            results.update(command_results)
+
+            if job["targets"]:
+                commands = ssm.list_commands(CommandId=command_id).get('Commands', [])
+                if commands:
+                    state["command_statuses"][command_id] = SSM_STATUS_MAP.get(commands[0].get('Status'), "in_progress")
+            elif command_results and all(r["status"] in TERMINAL_STATUSES for r in command_results.values()):
+                # Finished batches are not polled again
+                state["command_statuses"][command_id] = "success"
+
+        self._update(job, instance_results=results)
+
+    def _is_complete(self, job: Dict[str, Any]) -> bool:
+        state = job["_state"]
+        if state["batches"] or state["targets_pending"]:
+            return False
+        if any(instance["status"] not in TERMINAL_STATUSES for instance in job["instances"].values()):
+            return False
+        if job["targets"]:
+            # Tag targets resolve server-side; rely on the command's own status
+            return all(
+                state["command_statuses"].get(command_id) in TERMINAL_STATUSES
+                for command_id in state["commands"]
+            )
+        return True
+
+    def _progress(self, job: Dict[str, Any]) -> Dict[str, int]:
+        counts = {"total": len(job["instances"]), "completed": 0, "succeeded": 0, "failed": 0, "skipped": 0}
+        for instance in job["instances"].values():
+            status = instance["status"]
+            if status in TERMINAL_STATUSES:
+                counts["completed"] += 1
+            if status == "success":
+                counts["succeeded"] += 1
+            elif status in ERROR_STATUSES:
+                counts["failed"] += 1
+            elif status == "skipped":
+                counts["skipped"] += 1
+        return counts
+
+    def _update(
+        self,
+        job: Dict[str, Any],
+        status: Optional[str] = None,
+        command_id: Optional[str] = None,
+        error: Optional[str] = None,
+        instance_results: Optional[Dict[str, Dict[str, Any]]] = None
+    ):
+        """Apply a state change, derive the job status and notify listeners"""
+        changed = []
+        with self._condition:
+            if command_id:
+                job["command_id"] = job["command_id"] or command_id
+                job["command_ids"].append(command_id)
+            if error:
+                job["error"] = error
+            for instance_id, result in (instance_results or {}).items():
+                current = job["instances"].setdefault(instance_id, {})
+                if current.get("status") != result.get("status"):
+                    changed.append(instance_id)
+                current.update(result)
+
+            if status:
+                job["status"] = status
+            if job["status"] not in TERMINAL_STATUSES and self._is_complete(job):
+                statuses = [instance["status"] for instance in job["instances"].values()]
+                job["status"] = "success" if statuses and all(s == "success" for s in statuses) else "failed"
+            job["progress"] = self._progress(job)
+            job["updated_at"] = _now()
+
+            completed = job["status"] in TERMINAL_STATUSES and job["completed_at"] is None
+            if completed:
+                job["completed_at"] = job["updated_at"]
+            snapshot = self._snapshot_locked(job)
+
+        if completed:
+            # Cached inventory/metrics for this client are stale once a fix runs
+            tool_cache.invalidate_client(job["client_id"])
+        self._notify(snapshot, changed)
+
+    def _notify(self, snapshot: Dict[str, Any], changed: List[str]):
+        snapshot = {**snapshot, "changed_instances": changed}
+        with self._condition:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                print(f"Remediation job listener error: {e}")
+
+    def _snapshot_locked(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        return copy.deepcopy({k: v for k, v in job.items() if not k.startswith('_')})
+
+    def _trim_locked(self):
+        """Forget the oldest finished jobs once over the retention limit"""
+        if len(self._jobs) <= self.max_jobs:
+            return
+        for job_id in [j for j, job in self._jobs.items() if job["status"] in TERMINAL_STATUSES]:
+            if len(self._jobs) <= self.max_jobs:
+                break
+            del self._jobs[job_id]
+
+
+remediation_jobs = RemediationJobTracker()
@@ -1,21 +1,29 @@
 """Remediation execution tools for RMM agents"""
-import boto3
-from typing import Dict, Any
-import random
-import time
-from config import config
+from typing import Dict, Any, List, Optional, Tuple
 
-def _execute_mock_remediation(
-    client_id: str,
-    instance_id: str,
-    action_type: str,
-    parameters: Dict[str, Any]
-) -> Dict[str, Any]:
-    """Execute mock remediation for demo"""
-    # Simulate execution time
-    execution_time = random.uniform(0.5, 2.0)
-    time.sleep(execution_time)
+# Map action types to SSM documents
+DOCUMENT_MAP = {
+    "restart_service": "AWS-RestartEC2Instance",
+    "clear_cache": "AWS-RunShellScript",
+    "increase_memory": "AWS-RunShellScript",
+    "update_package": "AWS-RunPatchBaseline"
+}
+
+def build_ssm_command(action_type: str, parameters: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+    """Return (document_name, command parameters) for a remediation action"""
+    document_name = DOCUMENT_MAP.get(action_type, "AWS-RunShellScript")
     
+    command_params = {
+        "commands": [
+            f"# Executing {action_type}",
+            f"# Parameters: {parameters}"
+        ]
+    }
+    
+    return document_name, command_params
+
+def mock_remediation_result(action_type: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """Outcome of a mock remediation for demo (no delay; jobs simulate timing)"""
     action_templates = {
         "restart_service": {
             "status": "success",
@@ -47,24 +55,11 @@ def _execute_mock_remediation(
         }
     }
     
-    result = action_templates.get(action_type, {
+    return action_templates.get(action_type, {
         "status": "success",
         "message": f"Action '{action_type}' executed",
         "commands_executed": ["generic command"]
     })
-    
-    return {
-        "client_id": client_id,
-        "instance_id": instance_id,
-        "action_type": action_type,
-        "execution_id": f"exec-{random.randint(100000, 999999)}",
-        "status": result["status"],
-        "message": result["message"],
-        "commands_executed": result["commands_executed"],
-        "execution_time_seconds": round(execution_time, 2),
-        "executed_at": "2025-10-24T12:00:00Z",
-        "parameters": parameters
-    }
 
 def execute_remediation_action(
     client_id: str,
@@ -73,7 +68,13 @@ def execute_remediation_action(
     parameters: Dict[str, Any] = None
 ) -> Dict[str, Any]:
     """
-    Execute a remediation action via AWS Systems Manager (SSM)
+    Submit a remediation action via AWS Systems Manager (SSM)
+    
+    The command is dispatched and tracked by a background job poller, so
+    this returns immediately with a job snapshot. Poll
+    `remediation_jobs.get(job_id)` (or GET /api/agent/remediation/<job_id>)
+    for progress; cached inventory/metrics for the client are invalidated
+    once the command completes.
     
     Args:
         client_id: MSP client identifier
@@ -82,64 +83,68 @@ def execute_remediation_action(
         parameters: Action-specific parameters
     
     Returns:
-        Dictionary with execution results and status
+        Dictionary with the job id and its current status
     """
-    if parameters is None:
-        parameters = {}
+    from .remediation_jobs import remediation_jobs
     
-    if config.MOCK_MODE:
-        return _execute_mock_remediation(client_id, instance_id, action_type, parameters)
-    
-    try:
-        ssm = boto3.client('ssm', region_name=config.AWS_REGION)
-        
-        # Map action types to SSM documents
-        document_map = {
-            "restart_service": "AWS-RestartEC2Instance",
-            "clear_cache": "AWS-RunShellScript",
-            "increase_memory": "AWS-RunShellScript",
-            "update_package": "AWS-RunPatchBaseline"
-        }
-        
-        document_name = document_map.get(action_type, "AWS-RunShellScript")
-        
-        # Build SSM command
-        command_params = {
-            "commands": [
-                f"# Executing {action_type}",
-                f"# Parameters: {parameters}"
-            ]
-        }
-        
-        response = ssm.send_command(
-            InstanceIds=[instance_id],
-            DocumentName=document_name,
-            Parameters=command_params,
-            Comment=f"RMM Agent remediation for {client_id}"
-        )
-        
-        command_id = response['Command']['CommandId']
-        
-        # Wait for command completion (simplified)
-        time.sleep(2)
-        
-        return {
-            "client_id": client_id,
-            "instance_id": instance_id,
-            "action_type": action_type,
-            "execution_id": command_id,
-            "status": "success",
-            "message": f"Remediation action '{action_type}' initiated",
-            "commands_executed": command_params["commands"],
-            "execution_time_seconds": 2.0,
-            "executed_at": "2025-10-24T12:00:00Z",
-            "parameters": parameters
-        }
-    except Exception as e:
-        return {
-            "error": str(e),
-            "client_id": client_id,
-            "instance_id": instance_id,
-            "fallback_mode": "mock"
-        }
+    return remediation_jobs.submit(
+        client_id=client_id,
+        instance_ids=[instance_id],
+        action_type=action_type,
+        parameters=parameters or {}
+    )
 
+def execute_bulk_remediation(
+    client_id: str,
+    action_type: str,
+    parameters: Dict[str, Any] = None,
+    instance_ids: Optional[List[str]] = None,
+    tags: Optional[Dict[str, List[str]]] = None,
+    batch_size: int = 50,
+    max_concurrency: Optional[int] = None,
+    max_errors: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Submit one remediation action to many instances of a client
+    
+    Explicit instance IDs are split into SendCommand-sized batches (max 50)
+    released as `max_concurrency` allows; once more than `max_errors`
+    instances fail, remaining batches are skipped. Tag targets are sent as a
+    single SSM command and always scoped to the client's ClientId tag.
+    Per-instance results arrive incrementally via
+    `remediation_jobs.iter_instance_results(job_id)` or job updates.
+    
+    Args:
+        client_id: MSP client identifier
+        action_type: Type of remediation (restart_service, clear_cache, etc.)
+        parameters: Action-specific parameters
+        instance_ids: EC2 instance IDs to target
+        tags: Tag filters used instead of instance_ids (e.g. {"Application": ["WebServer"]})
+        batch_size: Instance IDs per SendCommand call
+        max_concurrency: Max instances running the command at once
+        max_errors: Failed instances tolerated before the rollout stops
+    
+    Returns:
+        Dictionary with the job id and its current status
+    """
+    from .remediation_jobs import remediation_jobs
+    
+    if not instance_ids and not tags:
+        return {"error": "Either instance_ids or tags is required", "client_id": client_id}
+    
+    targets = None
+    if tags and not instance_ids:
+        targets = [{"Key": "tag:ClientId", "Values": [client_id]}] + [
+            {"Key": f"tag:{key}", "Values": list(values)} for key, values in tags.items()
+        ]
+    
+    return remediation_jobs.submit(
+        client_id=client_id,
+        instance_ids=instance_ids,
+        action_type=action_type,
+        parameters=parameters or {},
+        targets=targets,
+        batch_size=batch_size,
+        max_concurrency=max_concurrency,
+        max_errors=max_errors
+    )
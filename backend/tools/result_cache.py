@@ -0,0 +1,350 @@
+"""TTL + LRU cache for tool results with single-flight loading"""
+import functools
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Hashable, List, Optional, Set, Tuple
+from config import config
+
+
+class _Entry:
+    __slots__ = ("value", "size", "created_at", "expires_at", "client_ids")
+
+    def __init__(self, value: Dict[str, Any], size: int, ttl: float, client_ids: Tuple[str, ...]):
+        self.value = value
+        self.size = size
+        self.created_at = time.monotonic()
+        self.expires_at = self.created_at + ttl
+        self.client_ids = client_ids
+
+
+class _Flight:
+    """A load in progress that concurrent callers for the same key wait on"""
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class ToolResultCache:
+    """
+    Bounded cache for tool results keyed by (tool, client_id, args).
+
+    Entries expire after a per-tool TTL and are evicted least-recently-used
+    once either the entry count or the approximate byte size exceeds its cap.
+    Concurrent misses for one key share a single upstream call. Every
+    client has a generation, bumped by invalidate_client; a load that was
+    already running when its client was invalidated is returned to its
+    callers but not cached.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = 30.0
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Maximum number of cached results (defaults to config)
+            max_bytes: Approximate memory cap in bytes of serialized results (defaults to config)
+            ttls: Per-tool TTL in seconds
+            default_ttl: TTL for tools not listed in ttls
+        """
+        self.max_entries = max_entries or config.TOOL_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or config.TOOL_CACHE_MAX_BYTES
+        self.ttls = ttls if ttls is not None else {
+            "query_client_inventory": config.TOOL_CACHE_TTL_INVENTORY,
+            "analyze_cloudwatch_metrics": config.TOOL_CACHE_TTL_METRICS,
+            "analyze_instance_metrics": config.TOOL_CACHE_TTL_METRICS,
+        }
+        self.default_ttl = default_ttl
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._by_client: Dict[str, Set[Hashable]] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(tool_name: str, **arguments) -> Hashable:
+        """Build the cache key for a tool invocation"""
+        return (tool_name,) + tuple(sorted(arguments.items()))
+
+    def ttl_for(self, tool_name: str) -> float:
+        return self.ttls.get(tool_name, self.default_ttl)
+
+    def get(self, key: Hashable) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (value, age_seconds) for a live entry, or None"""
+        with self._lock:
+            entry = self._get_locked(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry.value, time.monotonic() - entry.created_at
+
+    def put(
+        self,
+        key: Hashable,
+        value: Dict[str, Any],
+        ttl: float,
+        client_ids: Tuple[str, ...] = (),
+        generation: Optional[Tuple[int, ...]] = None
+    ):
+        """
+        Store a result, evicting old entries to stay within bounds
+
+        Args:
+            generation: Client generations taken before the value was loaded;
+                the value is dropped if one of the clients was invalidated since
+        """
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self._generation_locked(client_ids):
+                return
+            self._remove_locked(key)
+            self._entries[key] = _Entry(value, size, ttl, client_ids)
+            self._bytes += size
+            for client_id in client_ids:
+                self._by_client.setdefault(client_id, set()).add(key)
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove_locked(oldest_key)
+                self.evictions += 1
+
+    def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Dict[str, Any]],
+        ttl: float,
+        client_ids: Tuple[str, ...] = ()
+    ) -> Tuple[Dict[str, Any], bool, float]:
+        """
+        Return a cached value or load it, coalescing concurrent misses
+
+        Returns:
+            (value, cache_hit, age_seconds)
+        """
+        with self._lock:
+            entry = self._get_locked(key)
+            if entry is not None:
+                self.hits += 1
+                return entry.value, True, time.monotonic() - entry.created_at
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.misses += 1
+                generation = self._generation_locked(client_ids)
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True, 0.0
+
+        try:
+            value = loader()
+            flight.value = value
+            # Never cache error payloads; the next caller should retry upstream
+            if "error" not in value:
+                self.put(key, value, ttl, client_ids, generation)
+            return value, False, 0.0
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def get_or_load_many(
+        self,
+        keys: Dict[Hashable, Hashable],
+        loader: Callable[[List[Hashable]], Dict[Hashable, Dict[str, Any]]],
+        ttl: float,
+        client_ids: Optional[Dict[Hashable, Tuple[str, ...]]] = None
+    ) -> Dict[Hashable, Tuple[Dict[str, Any], bool, float]]:
+        """
+        Batched get_or_load: cached items are returned, items another caller
+        is already loading are waited for, and the rest are loaded together
+        with one loader call
+
+        Args:
+            keys: item -> cache key
+            loader: Loads a list of items, returning item -> value
+            ttl: TTL for loaded values
+            client_ids: item -> clients its entry is indexed under
+
+        Returns:
+            item -> (value, cache_hit, age_seconds)
+        """
+        client_ids = client_ids or {}
+        results: Dict[Hashable, Tuple[Dict[str, Any], bool, float]] = {}
+        leading: Dict[Hashable, _Flight] = {}
+        waiting: Dict[Hashable, _Flight] = {}
+        generations: Dict[Hashable, Tuple[int, ...]] = {}
+
+        with self._lock:
+            for item, key in keys.items():
+                entry = self._get_locked(key)
+                if entry is not None:
+                    self.hits += 1
+                    results[item] = (entry.value, True, time.monotonic() - entry.created_at)
+                elif key in self._flights:
+                    self.coalesced += 1
+                    waiting[item] = self._flights[key]
+                else:
+                    self.misses += 1
+                    leading[item] = self._flights[key] = _Flight()
+                    generations[item] = self._generation_locked(client_ids.get(item, ()))
+
+        if leading:
+            try:
+                loaded = loader(list(leading))
+                for item, flight in leading.items():
+                    value = loaded[item]
+                    flight.value = value
+                    # Never cache error payloads; the next caller should retry upstream
+                    if "error" not in value:
+                        self.put(keys[item], value, ttl, client_ids.get(item, ()), generations[item])
+                    results[item] = (value, False, 0.0)
+            except BaseException as e:
+                for flight in leading.values():
+                    flight.error = e
+                raise
+            finally:
+                with self._lock:
+                    for item in leading:
+                        self._flights.pop(keys[item], None)
+                for flight in leading.values():
+                    flight.done.set()
+
+        for item, flight in waiting.items():
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            results[item] = (flight.value, True, 0.0)
+
+        return results
+
+    def invalidate_client(self, client_id: str) -> int:
+        """Drop every cached result for a client; returns the number removed"""
+        with self._lock:
+            self._generations[client_id] = self._generations.get(client_id, 0) + 1
+            keys = list(self._by_client.get(client_id, ()))
+            for key in keys:
+                self._remove_locked(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._by_client.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions
+            }
+
+    def _generation_locked(self, client_ids: Tuple[str, ...]) -> Tuple[int, ...]:
+        return (self._epoch,) + tuple(self._generations.get(client_id, 0) for client_id in client_ids)
+
+    def _get_locked(self, key: Hashable) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            self._remove_locked(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove_locked(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry.size
+        for client_id in entry.client_ids:
+            keys = self._by_client.get(client_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_client[client_id]
+
+
+tool_cache = ToolResultCache()
+
+
+def with_cache_metadata(value: Dict[str, Any], hit: bool, age_seconds: float) -> Dict[str, Any]:
+    """Return a shallow copy of a tool result annotated with cache metadata"""
+    return {
+        **value,
+        "cache": {"hit": hit, "age_seconds": round(age_seconds, 2)}
+    }
+
+
+def cached_tool(tool_name: str):
+    """
+    Decorator caching a tool's result keyed by its bound arguments.
+
+    The wrapped tool must take `client_id` as an argument; entries are
+    indexed by it so `tool_cache.invalidate_client` can drop them. Callers
+    can pass `use_cache=False` to force an upstream call.
+    """
+    def decorator(func: Callable[..., Dict[str, Any]]):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, use_cache: bool = True, **kwargs):
+            if not config.TOOL_CACHE_ENABLED or not use_cache:
+                return func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = ToolResultCache.make_key(tool_name, **bound.arguments)
+            client_id = bound.arguments["client_id"]
+
+            value, hit, age = tool_cache.get_or_load(
+                key,
+                lambda: func(*args, **kwargs),
+                tool_cache.ttl_for(tool_name),
+                client_ids=(client_id,)
+            )
+            return with_cache_metadata(value, hit, age)
+
+        return wrapper
+
+    return decorator